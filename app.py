@@ -1,6 +1,36 @@
+import datetime
+import functools
+import io
+import logging
+import threading
+import time
+import uuid
+from array import array
+
 import streamlit as st
-import mysql.connector as cs
-import pandas as pd
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+from database import (
+    AccountStore, AnswerKeyCache, DraftStore, ExamSweeper, ExamWindowError, PasswordHasher, Profiler, QuestionBank,
+    QuestionCache, SessionTokens, SubmissionQueue, TestCreationError,
+    add_bank_questions, clear_schedule, create_pool, create_random_test, create_reporting_router, create_state,
+    create_tests, deep_sizeof, ensure_schema, find_tests, finish_exam, get_item_analysis, get_schedules,
+    get_score_summary, get_tag_counts, set_schedule, start_exam, student_window
+)
+from database.bank import MAX_OPTIONS, MIN_OPTIONS
+from database.config import (
+    AUTOSAVE_INTERVAL, CATALOG_PAGE_SIZE, EXAM_GRACE, EXAM_SWEEP_INTERVAL, HASH_WORKERS, PASSWORD_HASH, PBKDF2_ITERATIONS, POOL_SIZE, POOL_TIMEOUT,
+    PROFILE_JSON_LOG, PROFILE_PROMETHEUS_PATH, PROFILING, QUESTION_CACHE_BYTES, QUESTION_CACHE_ENTRIES,
+    REDIS_URL, RESULTS_PAGE_SIZE, SCRYPT_N, SESSION_TTL, SHARED_CACHE_TTL, STATE_BACKEND, STATE_PATH,
+    SUBMISSION_BATCH_SIZE, SUBMISSION_QUEUE_PATH
+)
+from database.export import export_csv_file
+from database.importer import detect_format, import_questions
+
+logger = logging.getLogger(__name__)
+
+# Name of the cookie that holds the login token
+SESSION_COOKIE = "quiz_session"
 
 # Set page configuration
 st.set_page_config(
@@ -10,64 +40,192 @@ st.set_page_config(
 )
 
 
-# Database connection function
+# Query and page timings shared by all sessions, shown on the Diagnostics page
+@st.cache_resource
+def get_profiler():
+    return Profiler(prometheus_path=PROFILE_PROMETHEUS_PATH, json_log_path=PROFILE_JSON_LOG)
+
+
+# Session tokens and live attempt progress, kept in this process or, with a shared backend, across app processes
+@st.cache_resource
+def get_state():
+    return create_state(STATE_BACKEND, path=STATE_PATH, url=REDIS_URL)
+
+
+def get_shared_cache():
+    # Test data is only worth copying into the state backend when other processes can read it
+    state = get_state()
+    return state if state.shared else None
+
+
+# Database connection pool shared by all sessions; each helper checks out its own connection
+@st.cache_resource
+def get_pool():
+    pool = create_pool(size=POOL_SIZE, timeout=POOL_TIMEOUT, profiler=get_profiler() if PROFILING else None)
+    ensure_schema(pool)
+    return pool
+
+
+# Teacher reporting gets its own capped connections, on a read replica when one is configured and fresh,
+# so results views cannot slow down exam logins and submissions
+@st.cache_resource
+def get_reporting_pool():
+    get_pool()  # the primary's schema, including the replica heartbeat table, must exist first
+    return create_reporting_router(profiler=get_profiler() if PROFILING else None).start()
+
+
+# Answer keys are shared by all sessions and scored with NumPy, keyed by test id and version
+@st.cache_resource
+def get_answer_keys():
+    return AnswerKeyCache(get_pool(), shared=get_shared_cache(), shared_ttl=SHARED_CACHE_TTL)
+
+
+# Submissions are acknowledged from a local durable queue and written to MySQL in batches
+@st.cache_resource
+def get_submission_queue():
+    return SubmissionQueue(get_pool(), SUBMISSION_QUEUE_PATH, batch_size=SUBMISSION_BATCH_SIZE).start()
+
+
+# Question sets are loaded from MySQL once per test version and shared by all sessions
 @st.cache_resource
-def get_connection():
+def get_question_cache():
+    return QuestionCache(get_pool(), max_entries=QUESTION_CACHE_ENTRIES, max_bytes=QUESTION_CACHE_BYTES,
+                         shared=get_shared_cache(), shared_ttl=SHARED_CACHE_TTL)
+
+
+# Randomized tests' question pools, loaded once per test version and shared by all sessions
+@st.cache_resource
+def get_question_bank():
+    return QuestionBank(get_pool(), shared=get_shared_cache(), shared_ttl=SHARED_CACHE_TTL)
+
+
+# Autosaved attempts are buffered and written in batches, so a refresh or reconnect can resume
+@st.cache_resource
+def get_draft_store():
+    return DraftStore(get_pool(), flush_interval=AUTOSAVE_INTERVAL).start()
+
+
+# Timed attempts left open past their deadline are submitted from their drafts in the background
+@st.cache_resource
+def get_exam_sweeper():
+    return ExamSweeper(
+        get_pool(), get_submission_queue(), get_answer_keys(), get_question_bank(), get_draft_store(),
+        interval=EXAM_SWEEP_INTERVAL, grace=EXAM_GRACE
+    ).start()
+
+
+# Connections, the schema check and the background workers are set up off the first page view, so the
+# login form paints without waiting for the database; a page that needs them first simply waits for them
+@st.cache_resource
+def start_warm_up():
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    add_script_run_ctx(thread, get_script_run_ctx())
+    thread.start()
+    return thread
+
+
+def warm_up():
     try:
-        conn = cs.connect(host='localhost', user='root', password='charan', database='quiz')
-        if conn.is_connected():
-            return conn
+        get_exam_sweeper()
     except Exception as e:
-        st.error(f"Database connection error: {e}")
-        return None
+        # Not cached, so the first page that needs the database retries and reports the error
+        logger.warning("Warm-up failed: %s", e)
 
 
-# Initialize session state variables if they don't exist
-if 'logged_in' not in st.session_state:
-    st.session_state.logged_in = False
-if 'username' not in st.session_state:
-    st.session_state.username = ""
-if 'user_type' not in st.session_state:
-    st.session_state.user_type = ""
-if 'current_page' not in st.session_state:
-    st.session_state.current_page = "home"
-if 'selected_test' not in st.session_state:
-    st.session_state.selected_test = None
-if 'current_question' not in st.session_state:
-    st.session_state.current_question = 0
-if 'test_questions' not in st.session_state:
-    st.session_state.test_questions = []
-if 'answers' not in st.session_state:
-    st.session_state.answers = []
+# Password hashing runs on a small shared thread pool; hashes are upgraded at login when settings change
+@st.cache_resource
+def get_accounts():
+    hasher = PasswordHasher(PASSWORD_HASH, scrypt_n=SCRYPT_N, pbkdf2_iterations=PBKDF2_ITERATIONS, workers=HASH_WORKERS)
+    return AccountStore(get_pool(), hasher)
 
 
-# Helper functions
-def check_table_exists(table_name):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SHOW TABLES")
-    tables = [table[0] for table in cursor.fetchall()]
-    cursor.close()
-    return table_name in tables
+# Verified logins, so a page refresh restores the session without checking the password again
+@st.cache_resource
+def get_session_tokens():
+    return SessionTokens(get_state(), ttl=SESSION_TTL)
+
+
+# Profiling decorators: data helpers are counted per rerun to spot N+1 patterns, pages are timed
+def traced(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = get_profiler()
+        profiler.count_call(func.__name__)
+        with profiler.span(f"helper:{func.__name__}"):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def profiled_page(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with get_profiler().span(f"render:{func.__name__}"):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def profiled_fragment(func):
+    # A fragment rerun skips main(), so it is recorded as a rerun of its own; inside a full rerun it is part of that
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = get_profiler()
+        if profiler.in_rerun():
+            return func(*args, **kwargs)
+        with profiler.rerun(f"fragment:{func.__name__}") as rerun:
+            result = func(*args, **kwargs)
+            rerun.state_bytes = deep_sizeof(st.session_state.to_dict())
+            return result
+    return wrapper
+
+
+def init_session_state():
+    # Built on every rerun, so each session gets its own lists and sets
+    defaults = {
+        "logged_in": False,
+        "username": "",
+        "user_type": "",
+        "session_token": None,
+        "current_page": "home",
+        "selected_test": None,
+        "selected_test_id": None,
+        "selected_test_version": None,
+        "current_question": 0,
+        "answers": array("b"),
+        "submission_key": None,
+        "attempted_tests": set(),
+        "tests_in_progress": set(),
+        "page_cursors": {},
+        "deadline": None,
+    }
+    for key, value in defaults.items():
+        if key not in st.session_state:
+            st.session_state[key] = value
 
 
+# Helper functions
+@traced
 def get_available_tests():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM tests_available")
-    tests = cursor.fetchall()
-    cursor.close()
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT test_id, test_name, version FROM tests ORDER BY test_id")
+        tests = cursor.fetchall()
+        cursor.close()
     return tests
 
 
-def get_test_results(test_name):
-    conn = get_connection()
-    cursor = conn.cursor()
-    test_ans_table = f"{test_name.lower()}_ans"
-
-    if check_table_exists(test_ans_table):
+@traced
+def get_test_results(test_id, limit=None, after=None):
+    with get_reporting_pool().connection() as conn:
+        cursor = conn.cursor()
         try:
-            cursor.execute(f"SELECT std_nm, marks FROM {test_ans_table}")
+            if limit is None:
+                cursor.execute("SELECT student, marks FROM attempts WHERE test_id = %s ORDER BY student", (test_id,))
+            else:
+                # Keyset pagination on the (test_id, student) index: no rows are skipped over, however deep the page
+                cursor.execute(
+                    "SELECT student, marks FROM attempts WHERE test_id = %s AND student > %s ORDER BY student LIMIT %s",
+                    (test_id, after or "", limit)
+                )
             results = cursor.fetchall()
             cursor.close()
             return results
@@ -75,20 +233,50 @@ def get_test_results(test_name):
             st.error(f"Error fetching test results: {e}")
             cursor.close()
             return []
-    else:
+
+
+@traced
+def search_tests(query="", after=None, limit=CATALOG_PAGE_SIZE):
+    return find_tests(get_reporting_pool(), query, after, limit)
+
+
+@traced
+def get_question_page(test_id, after=None, limit=CATALOG_PAGE_SIZE):
+    with get_reporting_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT q_no, quest, o1, o2, o3, o4, correct_ansr FROM questions "
+            "WHERE test_id = %s AND q_no > %s ORDER BY q_no LIMIT %s",
+            (test_id, after or 0, limit)
+        )
+        questions = cursor.fetchall()
         cursor.close()
-        return []
+    return questions
 
 
-def user_already_answered_test(username, test_name):
-    conn = get_connection()
-    cursor = conn.cursor()
-    # Use the sanitized version of the test name for the _ans table
-    test_ans_table = f"{test_name.lower()}_ans"
+@traced
+def get_exam_schedules():
+    try:
+        return get_schedules(get_pool())
+    except Exception as e:
+        st.error(f"Error loading test schedules: {e}")
+        return {}
+
 
-    if check_table_exists(test_ans_table):
+def format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M")
+
+
+def time_is_up():
+    return st.session_state.deadline is not None and time.time() >= st.session_state.deadline
+
+
+@traced
+def user_already_answered_test(username, test_id):
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
         try:
-            cursor.execute(f"SELECT std_nm FROM {test_ans_table} WHERE std_nm = %s", (username,))
+            cursor.execute("SELECT 1 FROM attempts WHERE test_id = %s AND student = %s", (test_id, username))
             result = cursor.fetchone()
             cursor.close()
             return result is not None
@@ -96,173 +284,290 @@ def user_already_answered_test(username, test_name):
             st.error(f"Error checking test answers: {e}")
             cursor.close()
             return False
-    else:
+
+
+@traced
+def get_attempted_tests(username):
+    # One indexed query for the student's status across every test, loaded once at login
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT test_id FROM attempts WHERE student = %s", (username,))
+        attempted = {row[0] for row in cursor.fetchall()}
         cursor.close()
-        return False
+    return attempted
 
 
-def authenticate_user(username, password, user_type):
-    conn = get_connection()
-    cursor = conn.cursor()
+@traced
+def get_tests_in_progress(username):
+    try:
+        return get_draft_store().in_progress(username)
+    except Exception as e:
+        st.error(f"Error loading saved attempts: {e}")
+        return set()
+
 
+def progress_key(test_id, username):
+    return f"attempt:{test_id}:{username}"
+
+
+@traced
+def load_saved_attempt(username, test_id, version, questions):
+    # Returns (submission_key, current_question, answers) of a saved attempt, or None
+    # Live progress in the state backend is never older than the batched draft, so it is tried first
+    progress = get_state().get(progress_key(test_id, username))
+    if progress is not None and progress[0] == version:
+        submission_key, current_question, answers = progress[1:]
+        answers = array("b", bytes(answers)[:len(questions)].ljust(len(questions), b"\0"))
+        return submission_key, min(current_question, len(questions) - 1), answers
+
+    try:
+        draft = get_draft_store().load(test_id, username)
+    except Exception as e:
+        st.error(f"Error loading saved attempt: {e}")
+        return None
+    if draft is None:
+        return None
+    if draft.version != version:
+        # The test was edited since, so the saved answers no longer line up
+        get_draft_store().discard(test_id, username)
+        get_state().delete(progress_key(test_id, username))
+        return None
+
+    positions = {q[0]: i for i, q in enumerate(questions)}
+    answers = array("b", bytes(len(questions)))
+    for q_no, answer in draft.responses.items():
+        if q_no in positions:
+            answers[positions[q_no]] = answer
+    return draft.submission_key, min(draft.current_question, len(questions) - 1), answers
+
+
+def autosave(responses=None):
+    get_state().set(
+        progress_key(st.session_state.selected_test_id, st.session_state.username),
+        (st.session_state.selected_test_version, st.session_state.submission_key,
+         st.session_state.current_question, st.session_state.answers.tobytes()),
+        SESSION_TTL
+    )
+    get_draft_store().save(
+        st.session_state.selected_test_id,
+        st.session_state.username,
+        st.session_state.selected_test_version,
+        st.session_state.submission_key,
+        st.session_state.current_question,
+        responses
+    )
+
+
+@traced
+def authenticate_user(username, password, user_type):
     if user_type == "teacher":
         if username == "admin" and password == 2022:
             return True
         return False
     else:  # student
-        cursor.execute("SELECT * FROM accounts WHERE name = %s AND pass = %s", (username, password))
-        result = cursor.fetchone()
-        cursor.close()
-        return result is not None
+        return get_accounts().authenticate(username, str(password))
 
 
+@traced
 def create_account(username, password):
-    conn = get_connection()
-    cursor = conn.cursor()
-
-    # Check if account already exists
-    cursor.execute("SELECT * FROM accounts WHERE name = %s AND pass = %s", (username, password))
-    if cursor.fetchone():
-        cursor.close()
-        return False, "Account already exists"
-
-    # Create new account
     try:
-        cursor.execute("INSERT INTO accounts (name, pass) VALUES (%s, %s)", (username, password))
-        conn.commit()
-        cursor.close()
+        if not get_accounts().register(username, str(password)):
+            return False, "Account already exists"
         return True, "Account created successfully"
     except Exception as e:
-        conn.rollback()
-        cursor.close()
         return False, f"Error creating account: {e}"
 
 
-def get_test_questions(test_name):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT * FROM {test_name} ORDER BY Q_no")
-    questions = cursor.fetchall()
-    cursor.close()
-    return questions
+def log_in(username, user_type, token=None):
+    st.session_state.logged_in = True
+    st.session_state.username = username
+    st.session_state.user_type = user_type
+    if user_type == "student":
+        st.session_state.attempted_tests = get_attempted_tests(username)
+        st.session_state.tests_in_progress = get_tests_in_progress(username)
+    # The token goes into a cookie (see render_session_cookie) so a refresh or reconnect skips the login form
+    st.session_state.session_token = token or get_session_tokens().issue(username, user_type)
 
 
-def submit_test_answers(username, test_name, answers, questions):
-    conn = get_connection()
-    cursor = conn.cursor()
-    # Use the sanitized version of the test name for the _ans table
-    test_ans_table = f"{test_name.lower()}_ans"
+def restore_session():
+    # Tokens used to travel in the URL; links that still carry one are not honoured
+    if "session" in st.query_params:
+        del st.query_params["session"]
+    token = st.session_state.session_token or st.context.cookies.get(SESSION_COOKIE)
+    if not token:
+        return
+    verified = get_session_tokens().verify(token)
+    if verified is None:
+        st.session_state.session_token = None
+    elif not st.session_state.logged_in:
+        log_in(*verified, token=token)
+
+
+def render_session_cookie():
+    # Cookies never show up in history, shared links, Referer headers or proxy logs, unlike the query string.
+    # Streamlit can only read cookies, so the browser sets it; an empty value clears a stale one after logout
+    token = st.session_state.session_token if st.session_state.logged_in else ""
+    if token or st.context.cookies.get(SESSION_COOKIE):
+        st.html(
+            f"<script>document.cookie = '{SESSION_COOKIE}={token}; Path=/; SameSite=Strict"
+            f"{'' if token else '; Max-Age=0'}' + (location.protocol === 'https:' ? '; Secure' : '');</script>",
+            unsafe_allow_javascript=True
+        )
+
+
+@traced
+def get_test_questions(test_id, version, include_answers=False):
+    # Students only ever receive the question text and options, never the correct answer
+    question_set = get_question_cache().get(test_id, version)
+    return question_set.rows if include_answers else question_set.student_rows
+
+
+@traced
+def get_student_paper(username, test_id, version):
+    # Randomized tests give every student their own reproducible paper; fixed tests return None
+    blueprint = get_question_bank().get(test_id, version)
+    return blueprint.assemble(username) if blueprint is not None else None
+
+
+@traced
+def get_attempt_questions():
+    # An attempt keeps only its test id, version and answers; the question rows come from the shared caches.
+    # None means the test was changed since the attempt started, so its answers no longer line up
+    test_id = st.session_state.selected_test_id
+    version = st.session_state.selected_test_version
+    paper = get_student_paper(st.session_state.username, test_id, version)
+    if paper is not None:
+        return paper.student_rows if paper.version == version else None
+    question_set = get_question_cache().get(test_id, version)
+    return question_set.student_rows if question_set.version == version else None
+
+
+@traced
+def get_question_count(test_id, version):
+    blueprint = get_question_bank().get(test_id, version)
+    return blueprint.total if blueprint is not None else len(get_test_questions(test_id, version))
+
+
+@traced
+def submit_test_answers(username, test_id, version, answers, submission_key):
+    # Calculate score against the cached answer key, or the student's own paper for randomized tests
+    answer_key = get_student_paper(username, test_id, version)
+    if answer_key is None:
+        answer_key = get_answer_keys().get(test_id, version)
+    if answer_key.version != version:
+        # The test changed since the attempt started, so the answers no longer line up with its questions
+        st.error("This test was changed while you were taking it, so your answers could not be scored; "
+                 "please start it again from Available Tests")
+        return None
+    score = answer_key.score(answers)
+    total = len(answer_key)
 
-    # Calculate score
-    score = 0
-    for i, question in enumerate(questions):
-        if i < len(answers) and answers[i] == question[6]:  # Check if answer matches correct_ansr
-            score += 1
+    # Queue the attempt durably; the background writer records it in MySQL
+    responses = answer_key.responses(answers)
+    try:
+        get_submission_queue().submit(submission_key, test_id, username, score, total, responses)
+    except Exception as e:
+        st.error(f"Error recording test score: {e}")
+    else:
+        get_draft_store().discard(test_id, username)
+        get_state().delete(progress_key(test_id, username))
+    return score, total
 
-    # Create answer table if it doesn't exist
-    if not check_table_exists(test_ans_table):
-        try:
-            cursor.execute(f"CREATE TABLE {test_ans_table} (std_nm CHAR(100), marks INT)")
-        except Exception as e:
-            st.error(f"Error creating answer table: {e}")
-            conn.rollback()
-            cursor.close()
-            return 0, len(questions)
 
-    # Insert score
+@traced
+def create_new_test(test_name, questions_data):
     try:
-        cursor.execute(f"INSERT INTO {test_ans_table} (std_nm, marks) VALUES (%s, %s)", (username, score))
-        conn.commit()
+        create_tests(get_pool(), [(test_name, questions_data)])
+    except TestCreationError as e:
+        return False, str(e)
     except Exception as e:
-        st.error(f"Error recording test score: {e}")
-        conn.rollback()
+        return False, f"Error creating test: {e}"
+    return True, "Test created successfully"
 
-    cursor.close()
-    return score, len(questions)
 
+@traced
+def import_question_file(uploaded_file, test_name, tags, skip_invalid):
+    # Returns (report, error message); the file is streamed rather than read into memory first
+    try:
+        report = import_questions(
+            get_pool(),
+            io.TextIOWrapper(uploaded_file, encoding="utf-8-sig", newline=""),
+            detect_format(uploaded_file.name),
+            test_name=test_name,
+            tags=tags.split(","),
+            skip_invalid=skip_invalid
+        )
+    except (TestCreationError, ValueError) as e:
+        return None, str(e)
+    except Exception as e:
+        return None, f"Error importing questions: {e}"
+    return report, None
 
-def create_new_test(test_name, questions_data):
-    conn = get_connection()
-    cursor = conn.cursor()
 
+@traced
+def save_exam_schedule(test_id, opens_at, closes_at, duration, stagger):
     try:
-        # Sanitize test name for MySQL (remove special characters and spaces)
-        sanitized_test_name = ''.join(e for e in test_name if e.isalnum() or e == '_')
+        set_schedule(get_pool(), test_id, opens_at, closes_at, duration, stagger)
+    except TestCreationError as e:
+        return False, str(e)
+    except Exception as e:
+        return False, f"Error saving schedule: {e}"
+    return True, "Schedule saved"
 
-        # Ensure the name starts with a letter
-        if not sanitized_test_name[0].isalpha():
-            sanitized_test_name = 'test_' + sanitized_test_name
 
-        # Check if test name is empty after sanitization
-        if not sanitized_test_name:
-            return False, "Test name must contain at least one letter or number"
+@traced
+def remove_exam_schedule(test_id):
+    try:
+        clear_schedule(get_pool(), test_id)
+    except Exception as e:
+        return False, f"Error removing schedule: {e}"
+    return True, "Schedule removed"
 
-        # Check if test name already exists
-        if check_table_exists(sanitized_test_name):
-            cursor.close()
-            return False, "Test name already exists"
-
-        # Get next serial number
-        cursor.execute("SELECT COUNT(*) FROM tests_available")
-        serial_no = cursor.fetchone()[0] + 1
-
-        # Add to available tests (store original name for display but use sanitized for table)
-        cursor.execute("INSERT INTO tests_available (s_no, test_name) VALUES (%s, %s)",
-                       (serial_no, sanitized_test_name))
-
-        # Create test table
-        create_table_sql = f"""
-            CREATE TABLE {sanitized_test_name} (
-                Q_no INT, 
-                quest VARCHAR(200), 
-                o1 VARCHAR(150), 
-                o2 VARCHAR(150), 
-                o3 VARCHAR(150), 
-                o4 VARCHAR(150), 
-                correct_ansr INT
-            )
-        """
-        cursor.execute(create_table_sql)
-
-        # Insert questions
-        for i, q in enumerate(questions_data):
-            cursor.execute(
-                f"INSERT INTO {sanitized_test_name} (Q_no, quest, o1, o2, o3, o4, correct_ansr) VALUES (%s, %s, %s, %s, %s, %s, %s)",
-                (i + 1, q['question'], q['options'][0], q['options'][1], q['options'][2], q['options'][3], q['correct'])
-            )
 
-        conn.commit()
-        cursor.close()
+@traced
+def add_question_to_bank(question_data):
+    try:
+        add_bank_questions(get_pool(), [question_data])
+    except TestCreationError as e:
+        return False, str(e)
+    except Exception as e:
+        return False, f"Error adding question: {e}"
+    return True, "Question added to the bank"
 
-        # If test name was sanitized, inform the user
-        if sanitized_test_name != test_name:
-            return True, f"Test created successfully as '{sanitized_test_name}' (original name was modified to meet database requirements)"
-        else:
-            return True, "Test created successfully"
 
+@traced
+def create_new_random_test(test_name, sections):
+    try:
+        create_random_test(get_pool(), test_name, sections)
+    except TestCreationError as e:
+        return False, str(e)
     except Exception as e:
-        conn.rollback()
-        cursor.close()
         return False, f"Error creating test: {e}"
+    return True, "Randomized test created successfully"
 
 
 # UI Components
+@profiled_page
 def render_header():
     col1, col2 = st.columns([3, 1])
     with col1:
         st.title("📝 Quiz Management System")
     with col2:
+        render_session_cookie()
         if st.session_state.logged_in:
             st.write(f"Logged in as: **{st.session_state.username}** ({st.session_state.user_type})")
             if st.button("Logout"):
+                if st.session_state.session_token:
+                    get_session_tokens().revoke(st.session_state.session_token)
                 for key in st.session_state.keys():
                     del st.session_state[key]
                 st.rerun()
 
 
+@profiled_page
 def render_navigation():
     if st.session_state.logged_in:
-        cols = st.columns(4)
+        cols = st.columns(5)
         with cols[0]:
             if st.button("Home", use_container_width=True):
                 st.session_state.current_page = "home"
@@ -283,8 +588,17 @@ def render_navigation():
                 if st.button("View Tests & Results", use_container_width=True):
                     st.session_state.current_page = "view_tests"
                     st.rerun()
+            with cols[3]:
+                if st.button("Question Bank", use_container_width=True):
+                    st.session_state.current_page = "question_bank"
+                    st.rerun()
+            with cols[4]:
+                if st.button("Diagnostics", use_container_width=True):
+                    st.session_state.current_page = "diagnostics"
+                    st.rerun()
 
 
+@profiled_page
 def render_home_page():
     st.header("Welcome to Quiz Management System")
     st.write("This system allows teachers to create tests and students to take them.")
@@ -308,9 +622,7 @@ def render_home_page():
                         try:
                             password_num = int(password)
                             if authenticate_user(username, password_num, user_type):
-                                st.session_state.logged_in = True
-                                st.session_state.username = username
-                                st.session_state.user_type = user_type
+                                log_in(username, user_type)
                                 st.success(f"Logged in successfully as {user_type}")
                                 st.rerun()
                             else:
@@ -334,9 +646,7 @@ def render_home_page():
                             success, message = create_account(new_username, password_num)
                             if success:
                                 st.success(message)
-                                st.session_state.logged_in = True
-                                st.session_state.username = new_username
-                                st.session_state.user_type = "student"
+                                log_in(new_username, "student")
                                 st.rerun()
                             else:
                                 st.error(message)
@@ -345,10 +655,13 @@ def render_home_page():
     else:
         if st.session_state.user_type == "student":
             st.info("Navigate to Available Tests to take quizzes")
+            if st.session_state.tests_in_progress - st.session_state.attempted_tests:
+                st.warning("You have unfinished tests; your answers were saved and you can resume them from Available Tests")
         else:
             st.info("Navigate to Create Test to make new quizzes or View Tests to see existing ones")
 
 
+@profiled_page
 def render_tests_page():
     st.header("Available Tests")
 
@@ -357,98 +670,207 @@ def render_tests_page():
         st.warning("No tests available")
         return
 
-    test_options = [f"{test[0]}. {test[1]}" for test in tests]
+    # Only list tests the student has not answered yet
+    attempted = st.session_state.attempted_tests
+    tests = [test for test in tests if test[0] not in attempted]
+    if not tests:
+        st.success("You have answered every available test")
+        return
+
+    in_progress = st.session_state.tests_in_progress
+    schedules = get_exam_schedules()
+    test_options = [
+        f"{test[0]}. {test[1]}" + (" (timed)" if test[0] in schedules else "") +
+        (" (in progress)" if test[0] in in_progress else "")
+        for test in tests
+    ]
     selected_test_index = st.selectbox("Select a test to take:", range(len(test_options)),
                                        format_func=lambda i: test_options[i])
 
     if selected_test_index is not None:
-        selected_test = tests[selected_test_index][1]
-
-        # Check if user already answered this test
-        if user_already_answered_test(st.session_state.username, selected_test):
-            st.warning(f"You have already answered the test: {selected_test}")
-        else:
-            if st.button(f"Take Test: {selected_test}"):
+        selected_test_id, selected_test, selected_version = tests[selected_test_index]
+
+        schedule = schedules.get(selected_test_id)
+        window_closed = False
+        if schedule is not None:
+            # Each student's window is shifted by their own stagger offset
+            opens_at, closes_at = student_window(schedule, st.session_state.username)
+            st.info(f"Timed test: {schedule.duration // 60} minutes, to be started between "
+                    f"{format_time(opens_at)} and {format_time(closes_at)}")
+            window_closed = not opens_at <= time.time() < closes_at and selected_test_id not in in_progress
+
+        action = "Resume Test" if selected_test_id in in_progress else "Take Test"
+        if st.button(f"{action}: {selected_test}", disabled=window_closed):
+            # Re-check on the server in case the test was answered from another session
+            if user_already_answered_test(st.session_state.username, selected_test_id):
+                attempted.add(selected_test_id)
+                st.warning(f"You have already answered the test: {selected_test}")
+            else:
+                deadline = None
+                if schedule is not None:
+                    # The deadline is fixed on the server when the student first starts, and survives refreshes
+                    try:
+                        deadline = start_exam(get_pool(), schedule, st.session_state.username).deadline
+                    except ExamWindowError as e:
+                        st.warning(str(e))
+                        return
+                    except Exception as e:
+                        st.error(f"Error starting timed test: {e}")
+                        return
+                    if time.time() >= deadline:
+                        st.warning("Your time for this test is up; your saved answers will be submitted automatically")
+                        return
+                st.session_state.deadline = deadline
                 st.session_state.selected_test = selected_test
-                st.session_state.test_questions = get_test_questions(selected_test)
-                st.session_state.current_question = 0
-                st.session_state.answers = []
+                st.session_state.selected_test_id = selected_test_id
+                st.session_state.selected_test_version = selected_version
+                paper = get_student_paper(st.session_state.username, selected_test_id, selected_version)
+                if paper is not None:
+                    questions = paper.student_rows
+                else:
+                    questions = get_test_questions(selected_test_id, selected_version)
+                saved = load_saved_attempt(st.session_state.username, selected_test_id, selected_version, questions)
+                if saved:
+                    # Pick up where the student left off, keeping the same idempotency key
+                    (st.session_state.submission_key, st.session_state.current_question,
+                     st.session_state.answers) = saved
+                else:
+                    st.session_state.current_question = 0
+                    # One byte per question, 0 until answered
+                    st.session_state.answers = array("b", bytes(len(questions)))
+                    # Idempotency key for this attempt, so a repeated submit is recorded only once
+                    st.session_state.submission_key = uuid.uuid4().hex
                 st.session_state.current_page = "take_test"
                 st.rerun()
 
 
+@profiled_page
 def render_take_test_page():
-    if not st.session_state.selected_test or not st.session_state.test_questions:
+    if not st.session_state.selected_test or not st.session_state.answers:
         st.error("No test selected")
         return
 
     st.header(f"Taking Test: {st.session_state.selected_test}")
+    if st.session_state.deadline is not None and not time_is_up():
+        render_exam_timer()
+    render_question_panel()
 
-    questions = st.session_state.test_questions
+
+# Reruns by itself without touching the database; once time is up the whole page reruns, which submits the test
+@st.fragment(run_every=15)
+@profiled_fragment
+def render_exam_timer():
+    remaining = st.session_state.deadline - time.time()
+    if remaining <= 0:
+        st.rerun()
+    st.info(f"Time left: about {int(remaining // 60) + 1} minutes (ends at "
+            f"{datetime.datetime.fromtimestamp(st.session_state.deadline).strftime('%H:%M:%S')})")
+
+
+def go_to_question(index):
+    if time_is_up():
+        return
+    st.session_state.current_question = index
+    autosave()
+
+
+def record_answer(position, widget_key):
+    # Answers given after the deadline are ignored
+    if time_is_up():
+        return
+    questions = get_attempt_questions()
+    if questions is None:
+        return
+    answer = st.session_state[widget_key] or 0
+    st.session_state.answers[position] = answer
+    autosave({questions[position][0]: answer})
+
+
+# Only this panel reruns while moving between questions; the header,
+# navigation and session setup run again only on submit
+@st.fragment
+@profiled_fragment
+@profiled_page
+def render_question_panel():
+    if time_is_up():
+        finish_test(timed_out=True)
+
+    questions = get_attempt_questions()
+    if questions is None:
+        st.error("This test was changed while you were taking it; please start it again from Available Tests")
+        return
+    answers = st.session_state.answers
     current_q = st.session_state.current_question
 
     # Display progress
-    progress_text = f"Question {current_q + 1} of {len(questions)}"
+    answered = sum(1 for answer in answers if answer)
     st.progress((current_q + 1) / len(questions))
-    st.write(progress_text)
+    st.write(f"Question {current_q + 1} of {len(questions)} ({answered} answered)")
 
     # Display current question
+    # q[0] is only the storage key: the question number for fixed tests, the bank question id for randomized ones
     q = questions[current_q]
-    st.subheader(f"Q{q[0]}: {q[1]}")
+    st.subheader(f"Q{current_q + 1}: {q[1]}")
 
-    options = [q[2], q[3], q[4], q[5]]
-    selected_option = st.radio("Select your answer:", range(1, 5),
-                               format_func=lambda i: f"{i}. {options[i - 1]}")
+    options = q[2:]
+    widget_key = f"answer_{st.session_state.submission_key}_{current_q}"
+    st.radio("Select your answer:", range(1, len(options) + 1),
+             index=answers[current_q] - 1 if answers[current_q] else None,
+             format_func=lambda i: f"{i}. {options[i - 1]}",
+             key=widget_key, on_change=record_answer, args=(current_q, widget_key))
 
     col1, col2 = st.columns(2)
 
     with col1:
-        if st.button("Previous") and current_q > 0:
-            if len(st.session_state.answers) > current_q:
-                # Save current answer before moving
-                st.session_state.answers[current_q] = selected_option
-            st.session_state.current_question -= 1
-            st.rerun()
+        st.button("Previous", disabled=current_q == 0, on_click=go_to_question, args=(current_q - 1,))
 
     with col2:
         if current_q < len(questions) - 1:
-            next_button = st.button("Next")
-            if next_button:
-                # Save answer
-                if len(st.session_state.answers) <= current_q:
-                    st.session_state.answers.append(selected_option)
-                else:
-                    st.session_state.answers[current_q] = selected_option
-                st.session_state.current_question += 1
-                st.rerun()
+            st.button("Next", on_click=go_to_question, args=(current_q + 1,))
         else:
+            if answered < len(questions):
+                st.warning(f"Unanswered questions: {len(questions) - answered}")
             if st.button("Submit Test"):
-                # Save final answer
-                if len(st.session_state.answers) <= current_q:
-                    st.session_state.answers.append(selected_option)
-                else:
-                    st.session_state.answers[current_q] = selected_option
-
-                # Submit test
-                score, total = submit_test_answers(
-                    st.session_state.username,
-                    st.session_state.selected_test,
-                    st.session_state.answers,
-                    st.session_state.test_questions
-                )
-
-                st.session_state.current_page = "test_results"
-                st.session_state.test_score = score
-                st.session_state.test_total = total
-                st.rerun()
-
-
+                finish_test()
+
+
+def finish_test(timed_out=False):
+    result = submit_test_answers(
+        st.session_state.username,
+        st.session_state.selected_test_id,
+        st.session_state.selected_test_version,
+        st.session_state.answers,
+        st.session_state.submission_key
+    )
+    if result is None:
+        return
+    score, total = result
+    if st.session_state.deadline is not None:
+        try:
+            finish_exam(get_pool(), st.session_state.selected_test_id, st.session_state.username)
+        except Exception:
+            # Harmless: the sweeper skips attempts that were already recorded
+            pass
+        st.session_state.deadline = None
+    st.session_state.attempted_tests.add(st.session_state.selected_test_id)
+    st.session_state.tests_in_progress.discard(st.session_state.selected_test_id)
+
+    st.session_state.current_page = "test_results"
+    st.session_state.test_score = score
+    st.session_state.test_total = total
+    st.session_state.test_timed_out = timed_out
+    st.rerun()
+
+
+@profiled_page
 def render_test_results_page():
     st.header("Test Results")
     st.subheader(f"Test: {st.session_state.selected_test}")
 
     score = st.session_state.test_score
     total = st.session_state.test_total
+    if st.session_state.get("test_timed_out"):
+        st.warning("Time was up, so your answers were submitted automatically")
 
     st.markdown(f"""
     ### Your Score: {score}/{total}
@@ -460,52 +882,133 @@ def render_test_results_page():
         st.rerun()
 
 
+@profiled_page
 def render_create_test_page():
+    import pandas as pd
+
     st.header("Create New Test")
 
-    # Help information for test naming
-    st.info(
-        "📌 Test names can only contain letters, numbers, and underscores. Special characters and spaces will be automatically removed.")
-
-    with st.form("create_test_form"):
-        test_name = st.text_input("Test Name")
-        sanitized_preview = ''.join(e for e in test_name if e.isalnum() or e == '_')
-        if sanitized_preview and not sanitized_preview[0].isalpha():
-            sanitized_preview = 'test_' + sanitized_preview
-
-        if test_name and test_name != sanitized_preview:
-            st.warning(f"Your test name will be stored as: '{sanitized_preview}'")
-
-        num_questions = st.number_input("Number of Questions", min_value=1, max_value=50, value=5)
-
-        # Generate dynamic form for questions
-        questions_data = []
-        for i in range(int(num_questions)):
-            st.subheader(f"Question {i + 1}")
-            question = st.text_input(f"Question {i + 1}", key=f"q_{i}")
-            options = [
-                st.text_input(f"Option 1", key=f"q_{i}_o1"),
-                st.text_input(f"Option 2", key=f"q_{i}_o2"),
-                st.text_input(f"Option 3", key=f"q_{i}_o3"),
-                st.text_input(f"Option 4", key=f"q_{i}_o4")
-            ]
-            correct = st.selectbox(f"Correct Answer", [1, 2, 3, 4], key=f"q_{i}_correct")
-
-            questions_data.append({
+    tab1, tab2 = st.tabs(["Enter Questions", "Import from File"])
+
+    with tab1:
+        with st.form("create_test_form"):
+            test_name = st.text_input("Test Name", max_chars=100)
+            num_questions = st.number_input("Number of Questions", min_value=1, max_value=50, value=5)
+
+            # Generate dynamic form for questions
+            questions_data = []
+            for i in range(int(num_questions)):
+                st.subheader(f"Question {i + 1}")
+                question = st.text_input(f"Question {i + 1}", key=f"q_{i}")
+                options = [
+                    st.text_input(f"Option 1", key=f"q_{i}_o1"),
+                    st.text_input(f"Option 2", key=f"q_{i}_o2"),
+                    st.text_input(f"Option 3", key=f"q_{i}_o3"),
+                    st.text_input(f"Option 4", key=f"q_{i}_o4")
+                ]
+                correct = st.selectbox(f"Correct Answer", [1, 2, 3, 4], key=f"q_{i}_correct")
+
+                questions_data.append({
+                    'question': question,
+                    'options': options,
+                    'correct': correct
+                })
+
+            submit = st.form_submit_button("Create Test")
+
+            if submit:
+                if not test_name:
+                    st.error("Please enter a test name")
+                elif not all(q['question'] and all(q['options']) for q in questions_data):
+                    st.error("Please fill in all questions and options")
+                else:
+                    success, message = create_new_test(test_name, questions_data)
+                    if success:
+                        st.success(message)
+                        st.session_state.current_page = "view_tests"
+                        st.rerun()
+                    else:
+                        st.error(message)
+
+    with tab2:
+        st.write("Upload a CSV, JSON, JSON Lines or GIFT file of multiple-choice questions. "
+                 "Every row is checked before anything is saved.")
+        uploaded_file = st.file_uploader("Question File", type=["csv", "json", "jsonl", "gift", "txt"])
+        destination = st.radio("Import into:", ["New test", "Question bank"], horizontal=True)
+        if destination == "New test":
+            import_test_name = st.text_input("Test Name", max_chars=100, key="import_test_name")
+            import_tags = ""
+        else:
+            import_test_name = None
+            import_tags = st.text_input("Tags for every question (comma separated)", key="import_tags")
+        skip_invalid = st.checkbox("Import the valid questions even if some rows are invalid")
+
+        if st.button("Import Questions", disabled=uploaded_file is None):
+            if destination == "New test" and not import_test_name:
+                st.error("Please enter a test name")
+            else:
+                report, error = import_question_file(uploaded_file, import_test_name, import_tags, skip_invalid)
+                if error:
+                    st.error(error)
+                else:
+                    if report["committed"]:
+                        st.success(f"Imported {report['imported']} questions")
+                    else:
+                        st.error("Nothing was imported")
+                    if report["invalid"]:
+                        st.warning(f"{report['invalid']} invalid rows" +
+                                   ("" if report["invalid"] == len(report["errors"]) else
+                                    f"; the first {len(report['errors'])} are listed"))
+                        st.dataframe(pd.DataFrame(report["errors"], columns=["Location", "Problem"]),
+                                     use_container_width=True, hide_index=True)
+
+
+@profiled_page
+def render_question_bank_page():
+    import pandas as pd
+
+    st.header("Question Bank")
+
+    st.subheader("Add Question")
+    num_options = st.number_input("Number of Options", min_value=MIN_OPTIONS, max_value=MAX_OPTIONS, value=4)
+    with st.form("bank_question_form", clear_on_submit=True):
+        question = st.text_input("Question", max_chars=200)
+        tags = st.text_input("Tags (comma separated)", max_chars=200)
+        options = [st.text_input(f"Option {i + 1}", max_chars=150, key=f"bank_o{i}") for i in range(int(num_options))]
+        correct = st.selectbox("Correct Answer", range(1, int(num_options) + 1))
+
+        if st.form_submit_button("Add Question"):
+            success, message = add_question_to_bank({
                 'question': question,
                 'options': options,
-                'correct': correct
+                'correct': correct,
+                'tags': tags.split(",")
             })
+            if success:
+                st.success(message)
+            else:
+                st.error(message)
 
-        submit = st.form_submit_button("Create Test")
+    tag_counts = get_tag_counts(get_pool())
+    if not tag_counts:
+        st.info("The question bank is empty")
+        return
 
-        if submit:
+    st.subheader("Create Randomized Test")
+    st.write("Each student gets their own selection of questions, with the options shuffled.")
+    st.dataframe(pd.DataFrame(tag_counts, columns=["Tag", "Questions"]), use_container_width=True, hide_index=True)
+    with st.form("random_test_form"):
+        test_name = st.text_input("Test Name", max_chars=100)
+        sections = [
+            (tag, st.number_input(f"Questions from '{tag}'", min_value=0, max_value=count, value=0, key=f"draw_{tag}"))
+            for tag, count in tag_counts
+        ]
+
+        if st.form_submit_button("Create Randomized Test"):
             if not test_name:
                 st.error("Please enter a test name")
-            elif not all(q['question'] and all(q['options']) for q in questions_data):
-                st.error("Please fill in all questions and options")
             else:
-                success, message = create_new_test(test_name, questions_data)
+                success, message = create_new_random_test(test_name, sections)
                 if success:
                     st.success(message)
                     st.session_state.current_page = "view_tests"
@@ -514,17 +1017,52 @@ def render_create_test_page():
                     st.error(message)
 
 
+def fetch_page(name, fetch, reset_token=None, page_size=CATALOG_PAGE_SIZE):
+    # Keyset pagination: session state keeps a stack of "after" keys per listing,
+    # so every rerun fetches a single bounded page, however deep
+    state = st.session_state.page_cursors.get(name)
+    if state is None or state["token"] != reset_token:
+        state = st.session_state.page_cursors[name] = {"token": reset_token, "stack": [None]}
+    rows = fetch(state["stack"][-1], page_size + 1)
+    return rows[:page_size], len(rows) > page_size
+
+
+def render_pager(name, next_key, has_more, page_count=None):
+    stack = st.session_state.page_cursors[name]["stack"]
+    col1, col2, col3 = st.columns([1, 1, 6])
+    with col1:
+        st.button("Previous", key=f"{name}_previous", disabled=len(stack) == 1, on_click=stack.pop)
+    with col2:
+        st.button("Next", key=f"{name}_next", disabled=not has_more, on_click=stack.append, args=(next_key,))
+    with col3:
+        st.caption(f"Page {len(stack)}" + (f" of {page_count}" if page_count else ""))
+
+
+@profiled_page
 def render_view_tests_page():
+    import pandas as pd
+
     st.header("View Tests")
 
-    tests = get_available_tests()
+    query = st.text_input("Search tests by name or id").strip()
+    tests, has_more = fetch_page("tests", lambda after, limit: search_tests(query, after, limit), reset_token=query)
     if not tests:
-        st.warning("No tests available")
+        st.warning("No tests found" if query else "No tests available")
         return
 
     # Convert to DataFrame for better display
-    tests_df = pd.DataFrame(tests, columns=["Test ID", "Test Name"])
-    st.dataframe(tests_df, use_container_width=True)
+    with get_profiler().span("pandas"):
+        tests_df = pd.DataFrame(tests, columns=["Test ID", "Test Name", "Version"])
+    st.dataframe(tests_df, use_container_width=True, hide_index=True)
+    render_pager("tests", tests[-1][0], has_more)
+
+    pool = get_reporting_pool()
+    st.download_button(
+        label="Download All Results as CSV",
+        data=lambda: export_csv_file(pool),
+        file_name="all_results.csv",
+        mime="text/csv"
+    )
 
     # Select test to view details
     test_options = [f"{test[0]}. {test[1]}" for test in tests]
@@ -533,88 +1071,316 @@ def render_view_tests_page():
                                        format_func=lambda i: test_options[i])
 
     if selected_test_index is not None:
-        selected_test = tests[selected_test_index][1]
+        selected_test_id, selected_test, selected_version = tests[selected_test_index]
+
+        # Only the section that is open is queried, unlike tabs, which render every tab on each rerun
+        section = st.radio("Show:", ["Questions", "Student Results", "Item Analysis", "Schedule"], horizontal=True)
+        if section == "Questions":
+            render_test_questions(selected_test_id, selected_test, selected_version)
+        elif section == "Student Results":
+            render_test_results(selected_test_id, selected_test, selected_version)
+        elif section == "Item Analysis":
+            render_item_analysis(selected_test_id, selected_test, selected_version)
+        else:
+            render_exam_schedule(selected_test_id, selected_test)
 
-        # Create tabs for Questions and Student Results
-        tab1, tab2 = st.tabs(["Questions", "Student Results"])
 
-        with tab1:
-            st.subheader(f"Questions for: {selected_test}")
-            questions = get_test_questions(selected_test)
-            if questions:
-                for i, q in enumerate(questions):
-                    with st.expander(f"Question {q[0]}: {q[1]}"):
-                        st.write(f"Option 1: {q[2]}")
-                        st.write(f"Option 2: {q[3]}")
-                        st.write(f"Option 3: {q[4]}")
-                        st.write(f"Option 4: {q[5]}")
-                        st.write(f"Correct Answer: Option {q[6]}")
+@profiled_page
+def render_exam_schedule(selected_test_id, selected_test):
+    st.subheader(f"Schedule for: {selected_test}")
+    schedule = get_exam_schedules().get(selected_test_id)
+    if schedule is not None:
+        st.info(f"Timed: {schedule.duration // 60} minutes, started between {format_time(schedule.opens_at)} and "
+                f"{format_time(schedule.closes_at)}, with starts staggered over {schedule.stagger // 60} minutes")
+    else:
+        st.info("This test is untimed and always open")
+
+    opens = datetime.datetime.fromtimestamp(schedule.opens_at) if schedule else \
+        datetime.datetime.now().replace(second=0, microsecond=0)
+    closes = datetime.datetime.fromtimestamp(schedule.closes_at) if schedule else opens + datetime.timedelta(hours=1)
+    with st.form("schedule_form"):
+        col1, col2 = st.columns(2)
+        with col1:
+            open_date = st.date_input("Opens on", opens.date())
+            open_time = st.time_input("Opens at", opens.time())
+        with col2:
+            close_date = st.date_input("Closes on", closes.date())
+            close_time = st.time_input("Closes at", closes.time())
+        duration = st.number_input("Time limit (minutes)", min_value=1, max_value=24 * 60, step=5,
+                                   value=schedule.duration // 60 if schedule else 30)
+        stagger = st.number_input(
+            "Stagger starts over (minutes)", min_value=0, max_value=24 * 60,
+            value=schedule.stagger // 60 if schedule else 0,
+            help="Each student's window is shifted by a fixed amount up to this, so a whole class "
+                 "does not load the test or reach the deadline at the same moment"
+        )
+        if st.form_submit_button("Save Schedule"):
+            success, message = save_exam_schedule(
+                selected_test_id,
+                datetime.datetime.combine(open_date, open_time).timestamp(),
+                datetime.datetime.combine(close_date, close_time).timestamp(),
+                int(duration) * 60,
+                int(stagger) * 60
+            )
+            if success:
+                st.success(message)
             else:
-                st.warning("No questions found for this test")
+                st.error(message)
 
-        with tab2:
-            st.subheader(f"Student Results for: {selected_test}")
-
-            # Check if answer table exists
-            test_ans_table = f"{selected_test.lower()}_ans"
-            if check_table_exists(test_ans_table):
-                # Get student results
-                conn = get_connection()
-                cursor = conn.cursor()
-                cursor.execute(f"SELECT std_nm, marks FROM {test_ans_table}")
-                results = cursor.fetchall()
-                cursor.close()
-
-                if results:
-                    # Get total number of questions
-                    cursor = conn.cursor()
-                    cursor.execute(f"SELECT COUNT(*) FROM {selected_test}")
-                    total_questions = cursor.fetchone()[0]
-                    cursor.close()
-
-                    # Create DataFrame with percentage
-                    results_df = pd.DataFrame(results, columns=["Student Name", "Score"])
-                    results_df["Total Questions"] = total_questions
-                    results_df["Percentage"] = (results_df["Score"] / total_questions * 100).round(2).astype(str) + '%'
+    if schedule is not None and st.button("Remove Schedule"):
+        success, message = remove_exam_schedule(selected_test_id)
+        if success:
+            st.rerun()
+        st.error(message)
+
+
+@profiled_page
+def render_test_questions(selected_test_id, selected_test, selected_version):
+    import pandas as pd
+
+    st.subheader(f"Questions for: {selected_test}")
+    blueprint = get_question_bank().get(selected_test_id, selected_version)
+    if blueprint is not None:
+        st.info(f"Randomized test: every student draws {blueprint.total} questions "
+                "from the question bank, with options in a shuffled order")
+        st.dataframe(
+            pd.DataFrame(
+                [(tag, count, end - start) for tag, count, start, end in blueprint.sections],
+                columns=["Tag", "Questions Drawn", "Pool Size"]
+            ),
+            use_container_width=True, hide_index=True
+        )
+        return
 
-                    # Display with sorting options
-                    st.dataframe(results_df, use_container_width=True,
-                                 hide_index=True)
-
-                    # Download results button
-                    csv = results_df.to_csv(index=False)
-                    st.download_button(
-                        label="Download Results as CSV",
-                        data=csv,
-                        file_name=f"{selected_test}_results.csv",
-                        mime="text/csv"
-                    )
-
-                    # Statistics
-                    st.subheader("Test Statistics")
-                    col1, col2, col3 = st.columns(3)
-                    with col1:
-                        st.metric("Total Attempts", len(results))
-                    with col2:
-                        avg_score = results_df["Score"].mean()
-                        st.metric("Average Score", f"{avg_score:.2f}/{total_questions}")
-                    with col3:
-                        avg_percentage = results_df["Score"].mean() / total_questions * 100
-                        st.metric("Average Percentage", f"{avg_percentage:.2f}%")
-
-                    # Score distribution
-                    score_counts = results_df["Score"].value_counts().sort_index()
-                    if not score_counts.empty:
-                        st.subheader("Score Distribution")
-                        st.bar_chart(score_counts)
-                else:
-                    st.info("No students have attempted this test yet")
+    questions, has_more = fetch_page(
+        "questions", lambda after, limit: get_question_page(selected_test_id, after, limit),
+        reset_token=(selected_test_id, selected_version)
+    )
+    if not questions:
+        st.warning("No questions found for this test")
+        return
+    for q in questions:
+        with st.expander(f"Question {q[0]}: {q[1]}"):
+            st.write(f"Option 1: {q[2]}")
+            st.write(f"Option 2: {q[3]}")
+            st.write(f"Option 3: {q[4]}")
+            st.write(f"Option 4: {q[5]}")
+            st.write(f"Correct Answer: Option {q[6]}")
+    render_pager("questions", questions[-1][0], has_more)
+
+
+@profiled_page
+def render_item_analysis(selected_test_id, selected_test, selected_version):
+    import pandas as pd
+
+    st.subheader(f"Item Analysis for: {selected_test}")
+
+    # One pre-aggregated row per question, maintained as submissions are recorded
+    items = get_item_analysis(get_reporting_pool(), selected_test_id)
+    if not items:
+        st.info("No responses recorded for this test yet")
+        return
+
+    blueprint = get_question_bank().get(selected_test_id, selected_version)
+    if blueprint is not None:
+        texts = dict(zip(blueprint.question_ids.tolist(), blueprint.texts))
+        st.caption("Questions are listed by bank id, and options by their order in the bank rather than the shuffled order")
+    else:
+        texts = {q[0]: q[1] for q in get_test_questions(selected_test_id, selected_version, include_answers=True)}
+    n_options = max([answer for item in items for answer in item["picks"]] + [4])
+
+    with get_profiler().span("pandas"):
+        rows = []
+        for item in items:
+            discrimination = item["discrimination"]
+            if discrimination is not None and discrimination < 0.2:
+                flag = "Review: does not separate strong and weak students"
+            elif item["difficulty"] < 0.3:
+                flag = "Hard"
+            elif item["difficulty"] > 0.9:
+                flag = "Easy"
             else:
-                st.info("No students have attempted this test yet")
+                flag = ""
+            rows.append({
+                "Question": item["q_no"],
+                "Text": texts.get(item["q_no"], ""),
+                "Responses": item["seen"],
+                "% Correct": round(item["difficulty"] * 100, 1),
+                "Discrimination": None if discrimination is None else round(discrimination, 2),
+                "Unanswered": item["picks"].get(0, 0),
+                **{f"Option {n}": item["picks"].get(n, 0) for n in range(1, n_options + 1)},
+                "Flag": flag,
+            })
+        items_df = pd.DataFrame(rows)
+    st.dataframe(items_df, use_container_width=True, hide_index=True)
+    st.caption(
+        "Discrimination is the correlation between answering the question correctly and the score on the rest of "
+        "the test; values below 0.2 suggest a confusing or mis-keyed question."
+    )
+
+
+@profiled_page
+def render_test_results(selected_test_id, selected_test, selected_version):
+    import pandas as pd
+
+    st.subheader(f"Student Results for: {selected_test}")
+
+    # Statistics come from the pre-aggregated score histogram, not from every attempt row
+    summary = get_score_summary(get_reporting_pool(), selected_test_id)
+
+    if summary["count"]:
+        # Get total number of questions
+        total_questions = get_question_count(selected_test_id, selected_version)
+
+        st.subheader("Test Statistics")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Total Attempts", summary["count"])
+        with col2:
+            st.metric("Average Score", f"{summary['mean']:.2f}/{total_questions}")
+        with col3:
+            avg_percentage = summary["mean"] / total_questions * 100 if total_questions else 0
+            st.metric("Average Percentage", f"{avg_percentage:.2f}%")
+        with col4:
+            st.metric("Median Score", f"{summary['median']}/{total_questions}")
+        st.caption(
+            f"Min {summary['min']} · 25th percentile {summary['p25']} · 75th percentile {summary['p75']} · "
+            f"90th percentile {summary['p90']} · Max {summary['max']}"
+        )
+
+        # Score distribution
+        st.subheader("Score Distribution")
+        with get_profiler().span("pandas"):
+            histogram_df = pd.DataFrame(
+                {"Students": [attempts for _, attempts in summary["histogram"]]},
+                index=pd.Index([marks for marks, _ in summary["histogram"]], name="Score")
+            )
+        st.bar_chart(histogram_df)
+
+        # Individual rows are only fetched when asked for, one page at a time
+        if st.toggle("Show individual results"):
+            results, has_more = fetch_page(
+                "results", lambda after, limit: get_test_results(selected_test_id, limit=limit, after=after),
+                reset_token=selected_test_id, page_size=RESULTS_PAGE_SIZE
+            )
+
+            # Create DataFrame with percentage
+            with get_profiler().span("pandas"):
+                results_df = pd.DataFrame(results, columns=["Student Name", "Score"])
+                results_df["Total Questions"] = total_questions
+                if total_questions:
+                    results_df["Percentage"] = (results_df["Score"] / total_questions * 100).round(2).astype(str) + '%'
+            st.dataframe(results_df, use_container_width=True, hide_index=True)
+            if results:
+                render_pager("results", results[-1][0], has_more,
+                             page_count=max(1, -(-summary["count"] // RESULTS_PAGE_SIZE)))
+
+        # Download results button; the export is streamed from the database only when clicked
+        pool = get_reporting_pool()
+        st.download_button(
+            label="Download Results as CSV",
+            data=lambda: export_csv_file(pool, selected_test_id),
+            file_name=f"{selected_test}_results.csv",
+            mime="text/csv"
+        )
+    else:
+        st.info("No students have attempted this test yet")
+
+
+@profiled_page
+def render_diagnostics_page():
+    import pandas as pd
+
+    st.header("Diagnostics")
+    profiler = get_profiler()
+
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        if not PROFILING:
+            st.warning("Query profiling is disabled (QUIZ_PROFILING=0); only page timings are collected")
+    with col2:
+        if st.button("Reset Statistics", use_container_width=True):
+            profiler.reset()
+            st.rerun()
+
+    st.subheader("Connection Pool, Caches and Queues")
+    st.json({
+        "pool": get_pool().stats(),
+        "reporting": get_reporting_pool().stats(),
+        "question_cache": get_question_cache().stats(),
+        "submission_queue": get_submission_queue().stats(),
+        "autosave": get_draft_store().stats(),
+        "state": get_state().stats(),
+        "exam_sweeper": get_exam_sweeper().stats(),
+    }, expanded=False)
+
+    # Submissions that kept failing while the database was reachable; requeue them once the cause is fixed
+    parked = get_submission_queue().parked()
+    if parked:
+        st.subheader("Parked Submissions")
+        st.warning(f"{get_submission_queue().stats()['parked']} submissions are no longer retried")
+        st.dataframe(
+            pd.DataFrame(parked, columns=["Submission Key", "Test ID", "Student", "Deliveries", "Last Error"]),
+            use_container_width=True, hide_index=True
+        )
+        if st.button("Requeue Parked Submissions"):
+            get_submission_queue().requeue_parked()
+            st.rerun()
+
+    st.subheader("Recent Reruns")
+    reruns = profiler.recent_reruns()
+    flagged = [rerun for rerun in reruns if rerun["flags"]]
+    if flagged:
+        st.warning(f"{len(flagged)} recent reruns repeated the same query or helper (possible N+1)")
+        for rerun in flagged[:10]:
+            st.write(f"**{rerun['label']}** ({rerun['total_ms']:.1f} ms): " + "; ".join(rerun["flags"]))
+    st.dataframe(
+        pd.DataFrame(
+            [(r["label"], r["total_ms"], r["db_ms"], r["queries"], r["spans_ms"].get("pandas", 0.0), len(r["flags"]),
+              r["state_bytes"] / 1024 if r["state_bytes"] is not None else None)
+             for r in reruns],
+            columns=["Page", "Total ms", "Database ms", "Queries", "Pandas ms", "N+1 Flags", "Session KB"]
+        ),
+        use_container_width=True, hide_index=True
+    )
+
+    st.subheader("Queries by Total Time")
+    queries = sorted(profiler.query_stats().items(), key=lambda item: item[1]["seconds"], reverse=True)
+    st.dataframe(
+        pd.DataFrame(
+            [(query, stats["count"], stats["seconds"] * 1000, stats["seconds"] / stats["count"] * 1000,
+              stats["max"] * 1000, stats["rows"]) for query, stats in queries],
+            columns=["Query", "Calls", "Total ms", "Mean ms", "Max ms", "Rows"]
+        ),
+        use_container_width=True, hide_index=True
+    )
+
+    st.subheader("Pages and Helpers by Total Time")
+    spans = sorted(profiler.span_stats().items(), key=lambda item: item[1]["seconds"], reverse=True)
+    st.dataframe(
+        pd.DataFrame(
+            [(name, stats["count"], stats["seconds"] * 1000, stats["seconds"] / stats["count"] * 1000,
+              stats["max"] * 1000) for name, stats in spans],
+            columns=["Span", "Calls", "Total ms", "Mean ms", "Max ms"]
+        ),
+        use_container_width=True, hide_index=True
+    )
+
+    st.download_button("Download Prometheus Metrics", data=profiler.prometheus_text(),
+                       file_name="quiz_metrics.prom", mime="text/plain")
 
 
 # Main App Logic
 def main():
+    init_session_state()
+    start_warm_up()
+    restore_session()
+    with get_profiler().rerun(st.session_state.current_page) as rerun:
+        render_page()
+        rerun.state_bytes = deep_sizeof(st.session_state.to_dict())
+
+
+def render_page():
     render_header()
     st.divider()
     render_navigation()
@@ -632,6 +1398,10 @@ def main():
         render_create_test_page()
     elif st.session_state.current_page == "view_tests" and st.session_state.logged_in and st.session_state.user_type == "teacher":
         render_view_tests_page()
+    elif st.session_state.current_page == "question_bank" and st.session_state.logged_in and st.session_state.user_type == "teacher":
+        render_question_bank_page()
+    elif st.session_state.current_page == "diagnostics" and st.session_state.logged_in and st.session_state.user_type == "teacher":
+        render_diagnostics_page()
     else:
         render_home_page()
 
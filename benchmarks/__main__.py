@@ -0,0 +1,141 @@
+"""Load-test the data-access layer and Streamlit page flows.
+
+Usage: python -m benchmarks [--users 50 500 5000] [--concurrency 32] [--startup-runs 5] [--json results.json]
+
+By default everything runs against a throwaway SQLite database (the stand-in
+in database/sqlite_adapter.py), seeded with synthetic tests, students and
+past attempts. Pass --backend mysql to run against the database configured
+for the app instead, for example a local MariaDB; it will be written to.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+from benchmarks.recorder import LatencyRecorder, format_report
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def _quiet_streamlit():
+    # Bare-mode imports of app.py log a warning per Streamlit call
+    for name in list(logging.root.manager.loggerDict):
+        if name.startswith("streamlit"):
+            logging.getLogger(name).setLevel(logging.ERROR)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=["sqlite", "mysql"], default="sqlite")
+    parser.add_argument("--users", type=int, nargs="+", default=[50, 500],
+                        help="simulated test takers per load level")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight at once")
+    parser.add_argument("--tests", type=int, default=10)
+    parser.add_argument("--questions", type=int, default=20)
+    parser.add_argument("--history", type=int, default=200, help="past attempts seeded per test")
+    parser.add_argument("--page-flows", type=int, default=3, help="full AppTest student flows (0 to skip)")
+    parser.add_argument("--session-sizes", type=int, nargs="*", default=[10, 100, 1000],
+                        help="question counts of the tests whose in-progress session state is measured")
+    parser.add_argument("--startup-runs", type=int, default=3,
+                        help="cold starts of the home page, each in a fresh interpreter (0 to skip)")
+    parser.add_argument("--json", help="also write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="quiz-bench-")
+    os.environ["QUIZ_DB_BACKEND"] = args.backend
+    os.environ["QUIZ_SUBMISSION_QUEUE"] = os.path.join(workdir, "submissions.db")
+    if args.backend == "sqlite":
+        os.environ["QUIZ_SQLITE_PATH"] = os.path.join(workdir, "bench.sqlite3")
+
+    # Settings are read at import time, so import only after the environment is set
+    from benchmarks.dataset import seed
+    from benchmarks.flows import run_data_access_load, run_page_flow
+    from database import create_pool, ensure_schema
+
+    setup_pool = create_pool(size=1)
+    ensure_schema(setup_pool)
+    students = sum(args.users) + args.page_flows + len(args.session_sizes)
+    start = time.perf_counter()
+    seed(setup_pool, tests=args.tests, questions=args.questions, students=students, history=args.history)
+    if args.session_sizes:
+        from benchmarks.dataset import make_questions
+        from database import create_tests
+
+        rng = random.Random(0)
+        create_tests(setup_pool, [(f"bench_size_{size}", make_questions(rng, size)) for size in args.session_sizes])
+    setup_pool.close()
+    print(f"Seeded {args.tests} tests x {args.questions} questions, {students} students, "
+          f"{args.history} past attempts per test in {time.perf_counter() - start:.1f}s ({workdir})")
+
+    import streamlit  # noqa: F401  (registers Streamlit's loggers before they are silenced)
+    _quiet_streamlit()
+    import app
+
+    results = {}
+    first_student = 0
+    for users in args.users:
+        recorder = LatencyRecorder()
+        wall, drain = run_data_access_load(app, recorder, users, min(users, args.concurrency), first_student)
+        first_student += users
+        report = recorder.summary()
+        results[f"data_access_{users}"] = {"operations": report, "wall_s": wall, "submission_drain_s": drain}
+        print()
+        print(format_report(f"Data access, {users} users, concurrency {min(users, args.concurrency)} "
+                            f"({users / wall:.1f} students/s)", report))
+        print(f"Submission queue flushed {drain * 1000:.1f} ms after the last submit")
+
+    if args.page_flows:
+        from benchmarks.dataset import student_name
+
+        recorder = LatencyRecorder()
+        for i in range(args.page_flows):
+            run_page_flow(APP_PATH, recorder, student_name("student", first_student + i))
+        report = recorder.summary()
+        results["page_flows"] = report
+        print()
+        print(format_report(f"Streamlit page flows (AppTest), {args.page_flows} students", report))
+
+    if args.session_sizes:
+        from benchmarks.dataset import student_name
+        from benchmarks.flows import measure_session_state
+
+        sizes = {}
+        for i, size in enumerate(args.session_sizes):
+            student = student_name("student", first_student + args.page_flows + i)
+            sizes[size] = measure_session_state(APP_PATH, student, f"bench_size_{size}")
+        results["session_state_bytes"] = sizes
+        print()
+        print("Session state of a student one question into a test")
+        print(f"{'questions':>10}{'bytes':>12}")
+        for size, state_bytes in sizes.items():
+            print(f"{size:>10}{state_bytes:>12}")
+
+    if args.startup_runs:
+        from benchmarks.startup import HEAVY_MODULES, measure_cold_start
+
+        recorder = LatencyRecorder()
+        for _ in range(args.startup_runs):
+            loaded = measure_cold_start(APP_PATH, recorder)
+        report = recorder.summary()
+        heavy = [name for name in HEAVY_MODULES if name in loaded]
+        results["startup"] = {"operations": report, "heavy_modules": heavy}
+        print()
+        print(format_report(f"Cold start of the home page, {args.startup_runs} fresh processes", report))
+        print(f"Heavy modules loaded for the login form: {', '.join(heavy) or 'none'}")
+
+    app.get_draft_store().stop()
+    app.get_submission_queue().stop()
+    app.get_pool().close()
+
+    if args.json:
+        with open(args.json, "w") as out:
+            json.dump({"args": vars(args), "results": results}, out, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
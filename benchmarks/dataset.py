@@ -0,0 +1,51 @@
+"""Synthetic tests, students and past attempts for benchmark runs."""
+import random
+
+from database import PasswordHasher, create_tests, rebuild_histogram
+from database.config import PASSWORD_HASH, PBKDF2_ITERATIONS, SCRYPT_N
+
+PASSWORD = 1234
+
+
+def student_name(prefix, index):
+    return f"{prefix}_{index:06d}"
+
+
+def make_questions(rng, count):
+    return [
+        {
+            "question": f"Synthetic question {i + 1}?",
+            "options": [f"Option {chr(65 + o)} for question {i + 1}" for o in range(4)],
+            "correct": rng.randint(1, 4),
+        }
+        for i in range(count)
+    ]
+
+
+def seed(pool, tests=10, questions=20, students=500, history=200, seed_value=42):
+    """Create `tests` tests, `students` accounts and `history` past attempts per test."""
+    rng = random.Random(seed_value)
+    test_ids = create_tests(pool, [(f"bench_test_{t:04d}", make_questions(rng, questions)) for t in range(tests)])
+    # Hashed once with the app's settings and shared by every account, so logins take the normal verify path
+    # rather than the one-time upgrade of a plaintext password
+    pass_hash = PasswordHasher(PASSWORD_HASH, scrypt_n=SCRYPT_N, pbkdf2_iterations=PBKDF2_ITERATIONS).hash(str(PASSWORD))
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT INTO accounts (name, pass_hash) VALUES (%s, %s)",
+            [(student_name("student", i), pass_hash) for i in range(students)]
+        )
+        # Past attempts give the results and analytics queries realistic row counts
+        cursor.executemany(
+            "INSERT INTO attempts (test_id, student, marks, total) VALUES (%s, %s, %s, %s)",
+            [
+                (test_id, student_name("history", i), rng.randint(0, questions), questions)
+                for test_id in test_ids
+                for i in range(history)
+            ]
+        )
+        conn.commit()
+        cursor.close()
+    rebuild_histogram(pool)
+    return test_ids
@@ -0,0 +1,131 @@
+"""Benchmark workloads: concurrent data-access calls and full Streamlit page flows."""
+import logging
+import random
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.dataset import PASSWORD, student_name
+
+
+def run_data_access_load(app, recorder, users, concurrency, first_student):
+    """Simulate `users` students logging in, opening a test and submitting it, `concurrency` at a time."""
+    tests = app.get_available_tests()
+
+    def virtual_user(i):
+        rng = random.Random(i)
+        name = student_name("student", first_student + i)
+        with recorder.measure("authenticate_user"):
+            app.authenticate_user(name, PASSWORD, "student")
+        with recorder.measure("get_available_tests"):
+            app.get_available_tests()
+        test_id, _, version = tests[i % len(tests)]
+        with recorder.measure("get_test_questions"):
+            questions = app.get_test_questions(test_id, version)
+        answers = [rng.randint(1, 4) for _ in questions]
+        with recorder.measure("submit_test_answers"):
+            app.submit_test_answers(name, test_id, version, answers, uuid.uuid4().hex)
+        # Roughly one teacher results view per ten students
+        if i % 10 == 0:
+            with recorder.measure("get_test_results"):
+                app.get_test_results(test_id)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(virtual_user, range(users)))
+    wall = time.perf_counter() - start
+    for operation in ("authenticate_user", "get_available_tests", "get_test_questions",
+                      "submit_test_answers", "get_test_results"):
+        recorder.set_wall_time(operation, wall)
+
+    # Time until the write-behind queue has written the remaining submissions to the database
+    queue = app.get_submission_queue()
+    start = time.perf_counter()
+    while queue.stats()["pending"]:
+        time.sleep(0.01)
+    return wall, time.perf_counter() - start
+
+
+def _button(at, label):
+    for button in at.button:
+        if button.label == label or button.label.startswith(label):
+            return button
+    raise LookupError(f"No button labelled {label!r}")
+
+
+def _text_input(at, label, index=0):
+    return [widget for widget in at.text_input if widget.label == label][index]
+
+
+def run_page_flow(app_path, recorder, student, timeout=60):
+    """Drive one student through login, test selection, every question and submission via AppTest."""
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(app_path, default_timeout=timeout)
+    with recorder.measure("page:home"):
+        at.run()
+
+    at.radio[0].set_value("Student")
+    _text_input(at, "Username").input(student)
+    _text_input(at, "Password").input(str(PASSWORD))
+    _button(at, "Login").click()
+    with recorder.measure("page:login"):
+        at.run()
+
+    _button(at, "Available Tests").click()
+    with recorder.measure("page:tests"):
+        at.run()
+
+    _button(at, "Take Test:").click()
+    with recorder.measure("page:start_test"):
+        at.run()
+
+    rng = random.Random(student)
+    while True:
+        at.radio[0].set_value(rng.randint(1, 4))
+        labels = [button.label for button in at.button]
+        if "Next" in labels:
+            _button(at, "Next").click()
+            with recorder.measure("page:next_question"):
+                at.run()
+        elif "Submit Test" in labels:
+            _button(at, "Submit Test").click()
+            with recorder.measure("page:submit"):
+                at.run()
+            break
+        else:
+            raise RuntimeError(f"Unexpected page state, buttons: {labels}")
+
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+
+
+def measure_session_state(app_path, student, test_name, timeout=60):
+    """Start `test_name` as `student` via AppTest, answer its first question and return the session state's size."""
+    from streamlit.testing.v1 import AppTest
+
+    from database import deep_sizeof
+
+    at = AppTest.from_file(app_path, default_timeout=timeout).run()
+    at.radio[0].set_value("Student")
+    _text_input(at, "Username").input(student)
+    _text_input(at, "Password").input(str(PASSWORD))
+    _button(at, "Login").click()
+    at.run()
+    _button(at, "Available Tests").click()
+    at.run()
+
+    options = at.selectbox[0].options
+    at.selectbox[0].set_value(next(i for i, option in enumerate(options) if f". {test_name}" in option))
+    # The button is labelled with the selected test, so it only exists after a rerun
+    at.run()
+    _button(at, "Take Test:").click()
+    at.run()
+    at.radio[0].set_value(1)
+    _button(at, "Next").click()
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    # Reading session state outside a run logs a bare-mode warning; AppTest has reset the log levels by now
+    logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").setLevel(logging.ERROR)
+    return deep_sizeof(at.session_state.to_dict())
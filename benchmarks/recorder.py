@@ -0,0 +1,64 @@
+"""Latency recording and percentile reporting for benchmark runs."""
+import threading
+import time
+from contextlib import contextmanager
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._wall = {}
+
+    @contextmanager
+    def measure(self, operation):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._samples.setdefault(operation, []).append(elapsed)
+
+    def record(self, operation, elapsed):
+        with self._lock:
+            self._samples.setdefault(operation, []).append(elapsed)
+
+    def set_wall_time(self, operation, seconds):
+        # Wall-clock time of the phase an operation ran in, used for throughput
+        with self._lock:
+            self._wall[operation] = seconds
+
+    def summary(self):
+        with self._lock:
+            samples = {operation: sorted(values) for operation, values in self._samples.items()}
+            wall = dict(self._wall)
+        report = {}
+        for operation, values in samples.items():
+            seconds = wall.get(operation) or sum(values)
+            report[operation] = {
+                "count": len(values),
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+                "max_ms": values[-1] * 1000,
+                "throughput_per_s": len(values) / seconds if seconds else 0.0,
+            }
+        return report
+
+
+def format_report(title, report):
+    lines = [title, f"{'operation':<32}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'ops/s':>10}"]
+    for operation, row in sorted(report.items()):
+        lines.append(
+            f"{operation:<32}{row['count']:>8}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+            f"{row['p99_ms']:>10.2f}{row['max_ms']:>10.2f}{row['throughput_per_s']:>10.1f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,65 @@
+"""Cold-start benchmark: import time and time to first paint of the home page.
+
+Imports are paid once per process, so every run starts a fresh interpreter
+(with -X importtime). Streamlit's own lazy imports are triggered first by a
+one-line script, so the numbers only cover what app.py adds.
+"""
+import json
+import os
+import subprocess
+import sys
+
+# Modules that should not be needed to show the login form
+HEAVY_MODULES = ("pandas", "pyarrow", "starlette")
+
+_CHILD = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+
+AppTest.from_string("import streamlit as st\\nst.write('warm-up')").run()
+print("--first-paint--", file=sys.stderr, flush=True)
+before = set(sys.modules)
+start = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=60).run()
+first_paint = time.perf_counter() - start
+start = time.perf_counter()
+at.run()
+rerun = time.perf_counter() - start
+print(json.dumps({
+    "first_paint": first_paint,
+    "rerun": rerun,
+    "errors": [e.value for e in at.exception],
+    "loaded": sorted(name for name in sys.modules if name not in before and "." not in name),
+}))
+"""
+
+
+def _import_seconds(stderr):
+    # Sum the cumulative time of top-level imports made while the app ran; nested ones are included in those
+    total = 0
+    started = False
+    for line in stderr.splitlines():
+        if line.startswith("--first-paint--"):
+            started = True
+        elif started and line.startswith("import time:"):
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit() and len(name) - len(name.lstrip()) == 1:
+                total += int(cumulative)
+    return total / 1e6
+
+
+def measure_cold_start(app_path, recorder):
+    """Run the home page once in a fresh interpreter; return the top-level modules it loaded."""
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _CHILD, app_path],
+        capture_output=True, text=True, env=os.environ.copy(), cwd=os.path.dirname(app_path), timeout=300
+    )
+    if process.returncode != 0:
+        raise RuntimeError(f"Cold-start run failed:\n{process.stderr[-2000:]}")
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    if result["errors"]:
+        raise RuntimeError(f"Home page raised: {result['errors'][0]}")
+    recorder.record("startup:imports", _import_seconds(process.stderr))
+    recorder.record("startup:first_paint", result["first_paint"])
+    recorder.record("startup:rerun", result["rerun"])
+    return result["loaded"]
@@ -0,0 +1,21 @@
+from database.analytics import (
+    get_item_analysis, get_score_summary, rebuild_histogram, rebuild_item_stats, record_item_stats, record_scores
+)
+from database.answer_keys import AnswerKey, AnswerKeyCache
+from database.authoring import TestCreationError, create_tests
+from database.bank import add_bank_questions, create_random_test, get_tag_counts
+from database.catalog import SchemaCatalog, find_tests
+from database.credentials import AccountStore, PasswordHasher, SessionTokens
+from database.drafts import Draft, DraftStore
+from database.exams import (
+    ExamSession, ExamSweeper, ExamWindowError, Schedule, clear_schedule, finish_exam, get_schedules, set_schedule,
+    start_exam, student_window
+)
+from database.papers import Blueprint, Paper, QuestionBank
+from database.pool import ConnectionPool, PoolTimeout, create_pool, create_replica_pool
+from database.profiling import Profiler, deep_sizeof, fingerprint
+from database.question_cache import QuestionCache, QuestionSet
+from database.routing import ReportingRouter, create_reporting_router
+from database.schema import ensure_schema
+from database.state import MemoryState, RedisState, SQLiteState, create_state, read_through
+from database.submissions import SubmissionQueue
@@ -0,0 +1,188 @@
+"""Results analytics computed from pre-aggregated tables instead of raw attempt rows.
+
+Scores go into a per-test histogram, and every response updates additive
+per-question counters: how often the question was seen and answered
+correctly, how often each option was picked, and sums of the attempt's marks.
+These are the sufficient statistics for each question's difficulty and its
+point-biserial correlation with the rest of the test, so item analysis reads
+one row per question however many attempts there are.
+"""
+import math
+from collections import Counter, defaultdict
+
+
+def record_scores(cursor, score_counts):
+    # Adds {(test_id, marks): attempts}; called inside the submission transaction so the histogram never drifts
+    cursor.executemany(
+        "INSERT INTO score_histogram (test_id, marks, attempts) VALUES (%s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE attempts = attempts + VALUES(attempts)",
+        [(test_id, marks, attempts) for (test_id, marks), attempts in score_counts.items()]
+    )
+
+
+def record_item_stats(cursor, attempts):
+    """Add (test_id, marks, responses) attempts to the item counters; responses are (q_no, answer, correct)."""
+    stats = defaultdict(lambda: [0, 0, 0, 0, 0])
+    picks = Counter()
+    for test_id, marks, responses in attempts:
+        for q_no, answer, correct in responses:
+            if correct is None:
+                continue
+            item = stats[(test_id, q_no)]
+            item[0] += 1
+            item[1] += correct
+            item[2] += marks
+            item[3] += marks * marks
+            item[4] += marks * correct
+            picks[(test_id, q_no, answer or 0)] += 1
+    if not stats:
+        return
+    cursor.executemany(
+        "INSERT INTO item_stats (test_id, q_no, seen, correct, sum_marks, sum_marks_sq, sum_marks_correct) "
+        "VALUES (%s, %s, %s, %s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE seen = seen + VALUES(seen), correct = correct + VALUES(correct), "
+        "sum_marks = sum_marks + VALUES(sum_marks), sum_marks_sq = sum_marks_sq + VALUES(sum_marks_sq), "
+        "sum_marks_correct = sum_marks_correct + VALUES(sum_marks_correct)",
+        [(test_id, q_no, *item) for (test_id, q_no), item in sorted(stats.items())]
+    )
+    cursor.executemany(
+        "INSERT INTO item_options (test_id, q_no, answer, picks) VALUES (%s, %s, %s, %s) "
+        "ON DUPLICATE KEY UPDATE picks = picks + VALUES(picks)",
+        [(test_id, q_no, answer, count) for (test_id, q_no, answer), count in sorted(picks.items())]
+    )
+
+
+def rebuild_histogram(pool, test_id=None):
+    # Backfill from attempts, e.g. after migrating legacy tables
+    where = "WHERE test_id = %s" if test_id is not None else ""
+    params = (test_id,) if test_id is not None else ()
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(f"DELETE FROM score_histogram {where}", params)
+            cursor.execute(
+                f"INSERT INTO score_histogram (test_id, marks, attempts) "
+                f"SELECT test_id, marks, COUNT(*) FROM attempts {where} GROUP BY test_id, marks",
+                params
+            )
+            conn.commit()
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            cursor.close()
+            raise
+
+
+def rebuild_item_stats(pool, test_id=None):
+    # Backfill the item counters from stored responses; responses recorded without a correct flag are skipped
+    where = "AND a.test_id = %s" if test_id is not None else ""
+    params = (test_id,) if test_id is not None else ()
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            for table in ("item_stats", "item_options"):
+                cursor.execute(f"DELETE FROM {table} {'WHERE test_id = %s' if test_id is not None else ''}", params)
+            cursor.execute(
+                f"INSERT INTO item_stats (test_id, q_no, seen, correct, sum_marks, sum_marks_sq, sum_marks_correct) "
+                f"SELECT a.test_id, r.q_no, COUNT(*), SUM(r.correct), SUM(a.marks), SUM(a.marks * a.marks), "
+                f"SUM(a.marks * r.correct) "
+                f"FROM responses r JOIN attempts a ON a.attempt_id = r.attempt_id "
+                f"WHERE r.correct IS NOT NULL {where} GROUP BY a.test_id, r.q_no",
+                params
+            )
+            cursor.execute(
+                f"INSERT INTO item_options (test_id, q_no, answer, picks) "
+                f"SELECT a.test_id, r.q_no, COALESCE(r.answer, 0), COUNT(*) "
+                f"FROM responses r JOIN attempts a ON a.attempt_id = r.attempt_id "
+                f"WHERE r.correct IS NOT NULL {where} GROUP BY a.test_id, r.q_no, COALESCE(r.answer, 0)",
+                params
+            )
+            conn.commit()
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            cursor.close()
+            raise
+
+
+def _percentile(histogram, count, fraction):
+    # Nearest-rank percentile over (marks, attempts) pairs sorted by marks
+    rank = max(1, math.ceil(fraction * count))
+    seen = 0
+    for marks, attempts in histogram:
+        seen += attempts
+        if seen >= rank:
+            return marks
+    return histogram[-1][0]
+
+
+def get_score_summary(pool, test_id):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT marks, attempts FROM score_histogram WHERE test_id = %s AND attempts > 0 ORDER BY marks",
+            (test_id,)
+        )
+        histogram = [(int(marks), int(attempts)) for marks, attempts in cursor.fetchall()]
+        cursor.close()
+
+    count = sum(attempts for _, attempts in histogram)
+    if not count:
+        return {"count": 0, "histogram": []}
+    return {
+        "count": count,
+        "mean": sum(marks * attempts for marks, attempts in histogram) / count,
+        "min": histogram[0][0],
+        "max": histogram[-1][0],
+        "p25": _percentile(histogram, count, 0.25),
+        "median": _percentile(histogram, count, 0.5),
+        "p75": _percentile(histogram, count, 0.75),
+        "p90": _percentile(histogram, count, 0.9),
+        "histogram": histogram,
+    }
+
+
+def _rest_correlation(seen, correct, sum_marks, sum_marks_sq, sum_marks_correct):
+    # Point-biserial correlation between the item and the rest score (marks minus this item),
+    # so the item is not correlated with itself; x is 0/1, so x*x == x
+    sum_rest = sum_marks - correct
+    sum_rest_sq = sum_marks_sq - 2 * sum_marks_correct + correct
+    sum_item_rest = sum_marks_correct - correct
+    spread = (seen * correct - correct * correct) * (seen * sum_rest_sq - sum_rest * sum_rest)
+    if spread <= 0:
+        return None
+    return (seen * sum_item_rest - correct * sum_rest) / math.sqrt(spread)
+
+
+def get_item_analysis(pool, test_id):
+    """Per-question difficulty, discrimination and option picks, ordered by q_no.
+
+    For randomized tests q_no is the bank question id and options are numbered
+    by their position in the bank, not the shuffled position a student saw.
+    """
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT q_no, seen, correct, sum_marks, sum_marks_sq, sum_marks_correct "
+            "FROM item_stats WHERE test_id = %s ORDER BY q_no",
+            (test_id,)
+        )
+        rows = cursor.fetchall()
+        cursor.execute("SELECT q_no, answer, picks FROM item_options WHERE test_id = %s", (test_id,))
+        picks = defaultdict(dict)
+        for q_no, answer, count in cursor.fetchall():
+            picks[q_no][int(answer)] = int(count)
+        cursor.close()
+
+    items = []
+    for q_no, *sums in rows:
+        seen, correct, sum_marks, sum_marks_sq, sum_marks_correct = map(int, sums)
+        items.append({
+            "q_no": q_no,
+            "seen": seen,
+            "correct": correct,
+            "difficulty": correct / seen if seen else None,
+            "discrimination": _rest_correlation(seen, correct, sum_marks, sum_marks_sq, sum_marks_correct),
+            "picks": picks[q_no],
+        })
+    return items
@@ -0,0 +1,79 @@
+"""Process-wide cache of compact answer keys used to score submissions."""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from database.state import read_through
+
+
+class AnswerKey:
+    __slots__ = ("test_id", "version", "q_nos", "correct")
+
+    def __init__(self, test_id, version, q_nos, correct):
+        self.test_id = test_id
+        self.version = version
+        self.q_nos = q_nos
+        self.correct = correct
+
+    def __len__(self):
+        return len(self.correct)
+
+    def _given(self, answers):
+        # Unanswered questions are padded with 0, which never matches an option number
+        given = np.zeros(len(self.correct), dtype=np.int8)
+        answers = answers[:len(self.correct)]
+        given[:len(answers)] = answers
+        return given
+
+    def score(self, answers):
+        return int(np.count_nonzero(self._given(answers) == self.correct))
+
+    def responses(self, answers):
+        # (q_no, answer, correct) for every question, with 0 for unanswered ones
+        given = self._given(answers)
+        return list(zip(self.q_nos.tolist(), given.tolist(), (given == self.correct).astype(int).tolist()))
+
+
+class AnswerKeyCache:
+    def __init__(self, pool, max_entries=1024, shared=None, shared_ttl=None):
+        self._pool = pool
+        self.max_entries = max_entries
+        # Optional state backend through which other worker processes reuse loaded keys
+        self._shared = shared
+        self.shared_ttl = shared_ttl
+        self._lock = threading.Lock()
+        self._keys = OrderedDict()
+
+    def _load(self, test_id):
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM tests WHERE test_id = %s", (test_id,))
+            row = cursor.fetchone()
+            if row is None:
+                cursor.close()
+                raise KeyError(f"Unknown test id {test_id}")
+            cursor.execute("SELECT q_no, correct_ansr FROM questions WHERE test_id = %s ORDER BY q_no", (test_id,))
+            rows = cursor.fetchall()
+            cursor.close()
+        q_nos = np.array([r[0] for r in rows], dtype=np.int32)
+        correct = np.array([r[1] for r in rows], dtype=np.int8)
+        q_nos.flags.writeable = False
+        correct.flags.writeable = False
+        return AnswerKey(test_id, row[0], q_nos, correct)
+
+    def get(self, test_id, version):
+        with self._lock:
+            key = self._keys.get(test_id)
+            if key is not None and key.version == version:
+                self._keys.move_to_end(test_id)
+                return key
+
+        key = read_through(self._shared, "answer_key", test_id, version, lambda: self._load(test_id),
+                           lambda k: k.version, self.shared_ttl)
+        with self._lock:
+            self._keys[test_id] = key
+            self._keys.move_to_end(test_id)
+            while len(self._keys) > self.max_entries:
+                self._keys.popitem(last=False)
+        return key
@@ -0,0 +1,359 @@
+"""Read-only JSON API over tests, results and aggregates, for LMS integrations and bulk syncs.
+
+Usage: python -m database.api [--host HOST] [--port PORT] [--workers N]
+
+Runs beside the Streamlit app on the same database and reads through the
+reporting router (capped connections, read replica when fresh), so syncs
+never go through Streamlit's per-session reruns. Needs the starlette and
+uvicorn packages, and a bearer token in QUIZ_API_TOKEN.
+
+    GET /tests?q=&cursor=&limit=             tests by id, optionally searched by name or id
+    GET /tests/{id}/results?cursor=&limit=   one test's results by student name
+    GET /tests/{id}/summary                  score distribution
+    GET /tests/{id}/items                    per-question item analysis
+    GET /results?cursor=&limit=              all results in recording order, for incremental syncs
+
+Pages hold `items` and `next_cursor`; pass the cursor back for the next page,
+null means there are no more. Every response has a weak ETag and honours
+If-None-Match. Identical requests within QUIZ_API_CACHE_TTL seconds share one
+query, and bodies over 1 KB are gzipped for clients that accept it.
+"""
+import argparse
+import asyncio
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import sys
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.gzip import GZipMiddleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+from database.analytics import get_item_analysis, get_score_summary
+from database.catalog import find_tests
+from database.config import API_CACHE_TTL, API_PAGE_SIZE, API_TOKEN
+from database.pool import PoolTimeout
+from database.routing import create_reporting_router
+
+MAX_PAGE_SIZE = 5000
+CACHE_ENTRIES = 1024
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, kind):
+    # Cursors are opaque to clients: the last key of the previous page, as base64 JSON
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError):
+        raise ApiError(400, "Invalid cursor")
+    if not isinstance(key, kind) or isinstance(key, bool):
+        raise ApiError(400, "Invalid cursor")
+    return key
+
+
+def _limit(value, default):
+    if value is None:
+        return default
+    if not value.isdigit() or not 1 <= int(value) <= MAX_PAGE_SIZE:
+        raise ApiError(400, f"limit must be between 1 and {MAX_PAGE_SIZE}")
+    return int(value)
+
+
+def _page(rows, limit, last_key):
+    # One row more than the page is fetched to tell whether another page follows
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(last_key(rows[limit - 1]))
+    return rows, None
+
+
+def _timestamp(value):
+    # DATETIME from MySQL, text from the SQLite stand-in
+    return value.isoformat(sep=" ") if hasattr(value, "isoformat") else value
+
+
+def _get_test(cursor, test_id):
+    cursor.execute("SELECT test_id, test_name, version FROM tests WHERE test_id = %s", (test_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ApiError(404, f"No test with id {test_id}")
+    return {"test_id": row[0], "name": row[1], "version": row[2]}
+
+
+def list_tests(pool, query="", after=None, limit=API_PAGE_SIZE):
+    # Same search as the app's test list; one extra row tells whether there is a next page
+    rows, next_cursor = _page(find_tests(pool, query, after, limit + 1), limit, lambda row: row[0])
+    return {
+        "items": [{"test_id": test_id, "name": name, "version": version} for test_id, name, version in rows],
+        "next_cursor": next_cursor,
+    }
+
+
+def list_test_results(pool, test_id, after=None, limit=API_PAGE_SIZE):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            test = _get_test(cursor, test_id)
+            # Keyset pagination on the (test_id, student) unique index
+            cursor.execute(
+                "SELECT student, marks, total, submitted_at FROM attempts "
+                "WHERE test_id = %s AND student > %s ORDER BY student LIMIT %s",
+                (test_id, after or "", limit + 1)
+            )
+            rows = cursor.fetchall()
+        finally:
+            cursor.close()
+    rows, next_cursor = _page(rows, limit, lambda row: row[0])
+    return {
+        "test": test,
+        "items": [
+            {
+                "student": student,
+                "marks": marks,
+                "total": total,
+                "percentage": round(marks / total * 100, 2) if total else 0.0,
+                "submitted_at": _timestamp(submitted_at),
+            }
+            for student, marks, total, submitted_at in rows
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+def list_results(pool, after=None, limit=API_PAGE_SIZE):
+    # Attempt ids grow as submissions are recorded, so a sync can resume from its last cursor. Batches
+    # from different app processes can commit slightly out of id order; re-reading from a cursor a few
+    # seconds old picks up any stragglers, and results are keyed by (test_id, student) for deduplication.
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT attempt_id, test_id, student, marks, total, submitted_at FROM attempts "
+            "WHERE attempt_id > %s ORDER BY attempt_id LIMIT %s",
+            (after or 0, limit + 1)
+        )
+        rows = cursor.fetchall()
+        cursor.close()
+    rows, next_cursor = _page(rows, limit, lambda row: row[0])
+    return {
+        "items": [
+            {
+                "attempt_id": attempt_id,
+                "test_id": test_id,
+                "student": student,
+                "marks": marks,
+                "total": total,
+                "submitted_at": _timestamp(submitted_at),
+            }
+            for attempt_id, test_id, student, marks, total, submitted_at in rows
+        ],
+        "next_cursor": next_cursor,
+    }
+
+
+def get_test_summary(pool, test_id):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            test = _get_test(cursor, test_id)
+        finally:
+            cursor.close()
+    return {"test": test, "summary": get_score_summary(pool, test_id)}
+
+
+def get_test_items(pool, test_id):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            test = _get_test(cursor, test_id)
+        finally:
+            cursor.close()
+    return {"test": test, "items": get_item_analysis(pool, test_id)}
+
+
+def _unauthorized():
+    return JSONResponse({"error": "Missing or invalid bearer token"}, status_code=401,
+                        headers={"WWW-Authenticate": "Bearer"})
+
+
+class ResultsApi:
+    """Request handling shared by the routes: authentication, response cache, ETags and errors."""
+
+    def __init__(self, pool, token, cache_ttl=1.0, page_size=API_PAGE_SIZE):
+        self.pool = pool
+        self._token = token.encode()
+        self.cache_ttl = cache_ttl
+        self.page_size = page_size
+        # (path, query) -> (expires_at, etag, body); only touched on the event loop, so no lock is needed
+        self._cache = OrderedDict()
+        self._inflight = {}
+
+        # Metrics
+        self._requests = 0
+        self._hits = 0
+        self._shared = 0
+        self._not_modified = 0
+
+    def authorized(self, request):
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), self._token)
+
+    async def _compute(self, key, load):
+        data = await run_in_threadpool(load)
+        body = json.dumps(data, separators=(",", ":")).encode()
+        etag = 'W/"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        if self.cache_ttl > 0:
+            self._cache[key] = (time.monotonic() + self.cache_ttl, etag, body)
+            self._cache.move_to_end(key)
+            while len(self._cache) > CACHE_ENTRIES:
+                self._cache.popitem(last=False)
+        return etag, body
+
+    async def _load(self, key, load):
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self._hits += 1
+            return entry[1], entry[2]
+        # A burst of identical requests waits on the first one's query instead of each running its own
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._compute(key, load))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self._shared += 1
+        # Shielded so one client disconnecting does not cancel the query for the others
+        return await asyncio.shield(task)
+
+    async def respond(self, request, load):
+        self._requests += 1
+        if not self.authorized(request):
+            return _unauthorized()
+        try:
+            etag, body = await self._load((request.url.path, request.url.query), load)
+        except ApiError as e:
+            return JSONResponse({"error": str(e)}, status_code=e.status)
+        except PoolTimeout:
+            return JSONResponse({"error": "Reporting is busy, try again shortly"}, status_code=503,
+                                headers={"Retry-After": "1"})
+
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in (tag.strip() for tag in if_none_match.split(",")) or if_none_match.strip() == "*":
+            self._not_modified += 1
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    def stats(self):
+        return {
+            "requests": self._requests,
+            "cache_hits": self._hits,
+            "shared_queries": self._shared,
+            "not_modified": self._not_modified,
+            "cached_responses": len(self._cache),
+            "reporting": self.pool.stats(),
+        }
+
+
+def create_app(pool=None, token=API_TOKEN, cache_ttl=API_CACHE_TTL, page_size=API_PAGE_SIZE):
+    if not token:
+        raise RuntimeError("Set QUIZ_API_TOKEN to the bearer token API clients must send")
+    # Without a pool given, the app owns a reporting router and closes it on shutdown
+    owned = pool is None
+    api = ResultsApi(pool or create_reporting_router(), token, cache_ttl, page_size)
+
+    def params(request):
+        return request.query_params.get("cursor"), _limit(request.query_params.get("limit"), api.page_size)
+
+    async def tests(request):
+        def load():
+            cursor, limit = params(request)
+            return list_tests(api.pool, request.query_params.get("q", "").strip(), decode_cursor(cursor, int), limit)
+        return await api.respond(request, load)
+
+    async def test_results(request):
+        def load():
+            cursor, limit = params(request)
+            return list_test_results(api.pool, request.path_params["test_id"], decode_cursor(cursor, str), limit)
+        return await api.respond(request, load)
+
+    async def summary(request):
+        return await api.respond(request, lambda: get_test_summary(api.pool, request.path_params["test_id"]))
+
+    async def items(request):
+        return await api.respond(request, lambda: get_test_items(api.pool, request.path_params["test_id"]))
+
+    async def results(request):
+        def load():
+            cursor, limit = params(request)
+            return list_results(api.pool, decode_cursor(cursor, int), limit)
+        return await api.respond(request, load)
+
+    async def stats(request):
+        if not api.authorized(request):
+            return _unauthorized()
+        return JSONResponse(await run_in_threadpool(api.stats))
+
+    @asynccontextmanager
+    async def lifespan(app):
+        if owned:
+            api.pool.start()
+        yield
+        if owned:
+            api.pool.close()
+
+    app = Starlette(
+        routes=[
+            Route("/tests", tests),
+            Route("/tests/{test_id:int}/results", test_results),
+            Route("/tests/{test_id:int}/summary", summary),
+            Route("/tests/{test_id:int}/items", items),
+            Route("/results", results),
+            Route("/stats", stats),
+        ],
+        middleware=[Middleware(GZipMiddleware, minimum_size=1000)],
+        lifespan=lifespan,
+    )
+    app.state.api = api
+    return app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=1, help="worker processes, each with its own connections")
+    args = parser.parse_args(argv)
+
+    if not API_TOKEN:
+        print("Set QUIZ_API_TOKEN to the bearer token API clients must send", file=sys.stderr)
+        return 1
+    try:
+        import uvicorn
+    except ImportError:
+        print("The results API needs the uvicorn package (pip install uvicorn starlette)", file=sys.stderr)
+        return 1
+    uvicorn.run("database.api:create_app", factory=True, host=args.host, port=args.port, workers=args.workers,
+                access_log=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
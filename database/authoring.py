@@ -0,0 +1,93 @@
+"""Test creation with batched inserts, for single tests and bulk imports alike."""
+from collections import Counter
+
+# Rows per multi-row INSERT, kept well below MySQL's default max_allowed_packet
+INSERT_CHUNK = 1000
+
+
+class TestCreationError(Exception):
+    pass
+
+
+def _chunks(rows, size):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def validate_test_name(test_name):
+    test_name = test_name.strip()
+    if not test_name:
+        raise TestCreationError("Test name must not be empty")
+    if len(test_name) > 100:
+        raise TestCreationError("Test name must be at most 100 characters")
+    return test_name
+
+
+def validate_question(q):
+    # Questions of fixed tests have exactly four options, one of which is correct
+    question = (q.get('question') or "").strip()
+    options = [(option or "").strip() for option in q.get('options') or []]
+    if not question:
+        raise TestCreationError("Question text must not be empty")
+    if len(question) > 200:
+        raise TestCreationError(f"Question is longer than 200 characters: {question[:40]}...")
+    if len(options) != 4:
+        raise TestCreationError(f"Questions need exactly 4 options, got {len(options)}: {question}")
+    if not all(options) or any(len(option) > 150 for option in options):
+        raise TestCreationError(f"Options must be non-empty and at most 150 characters: {question}")
+    if q.get('correct') not in (1, 2, 3, 4):
+        raise TestCreationError(f"Correct answer must be an option number from 1 to 4: {question}")
+    return {'question': question, 'options': options, 'correct': q['correct']}
+
+
+def _insert_questions(cursor, question_rows):
+    # Rows are (test_id, q_no, quest, o1, o2, o3, o4, correct_ansr)
+    for chunk in _chunks(question_rows, INSERT_CHUNK):
+        cursor.executemany(
+            "INSERT INTO questions (test_id, q_no, quest, o1, o2, o3, o4, correct_ansr) "
+            "VALUES (%s, %s, %s, %s, %s, %s, %s, %s)",
+            chunk
+        )
+
+
+def create_tests(pool, tests):
+    """Create every (test_name, questions_data) pair in one transaction and return their test_ids."""
+    names = [validate_test_name(name) for name, _ in tests]
+    # Validate every question up front, so nothing is inserted for a batch with a bad question in it
+    tests = [(name, [validate_question(q) for q in questions_data]) for name, (_, questions_data) in zip(names, tests)]
+    duplicates = [name for name, count in Counter(names).items() if count > 1]
+    if duplicates:
+        raise TestCreationError(f"Duplicate test names in batch: {', '.join(sorted(duplicates))}")
+    if not names:
+        return []
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            placeholders = ", ".join(["%s"] * len(names))
+            cursor.execute(f"SELECT test_name FROM tests WHERE test_name IN ({placeholders})", names)
+            existing = [row[0] for row in cursor.fetchall()]
+            if existing:
+                raise TestCreationError(f"Test name already exists: {', '.join(existing)}")
+
+            # ids come from AUTO_INCREMENT, so concurrent creators never collide
+            cursor.executemany("INSERT INTO tests (test_name) VALUES (%s)", [(name,) for name in names])
+            cursor.execute(f"SELECT test_name, test_id FROM tests WHERE test_name IN ({placeholders})", names)
+            test_ids = dict(cursor.fetchall())
+
+            question_rows = [
+                (test_ids[name], i + 1, q['question'], *q['options'], q['correct'])
+                for name, questions_data in tests
+                for i, q in enumerate(questions_data)
+            ]
+            _insert_questions(cursor, question_rows)
+
+            conn.commit()
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            cursor.close()
+            raise
+
+    return [test_ids[name] for name in names]
+
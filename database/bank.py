@@ -0,0 +1,146 @@
+"""Question bank: tagged, reusable questions with any number of options, and randomized tests drawn from it."""
+import uuid
+
+from database.authoring import INSERT_CHUNK, TestCreationError, _chunks, validate_test_name
+
+MIN_OPTIONS = 2
+MAX_OPTIONS = 8
+
+
+def validate_bank_question(q):
+    question = (q.get('question') or "").strip()
+    options = [(option or "").strip() for option in q.get('options') or []]
+    tags = sorted({tag.strip().lower() for tag in q.get('tags') or [] if tag.strip()})
+    if not question:
+        raise TestCreationError("Question text must not be empty")
+    if len(question) > 200:
+        raise TestCreationError(f"Question is longer than 200 characters: {question[:40]}...")
+    if not MIN_OPTIONS <= len(options) <= MAX_OPTIONS:
+        raise TestCreationError(f"Questions need between {MIN_OPTIONS} and {MAX_OPTIONS} options: {question}")
+    if not all(options) or any(len(option) > 150 for option in options):
+        raise TestCreationError(f"Options must be non-empty and at most 150 characters: {question}")
+    if not isinstance(q.get('correct'), int) or not 1 <= q['correct'] <= len(options):
+        raise TestCreationError(f"Correct answer must be an option number from 1 to {len(options)}: {question}")
+    if not tags:
+        raise TestCreationError(f"Questions need at least one tag: {question}")
+    if any(len(tag) > 50 for tag in tags):
+        raise TestCreationError("Tags must be at most 50 characters")
+    return {'question': question, 'options': options, 'correct': q['correct'], 'tags': tags}
+
+
+def _insert_bank_questions(cursor, questions):
+    # Client-side keys let one multi-row INSERT be matched back to its AUTO_INCREMENT ids
+    keys = [uuid.uuid4().hex for _ in questions]
+    question_ids = {}
+    for chunk in _chunks(list(zip(keys, questions)), INSERT_CHUNK):
+        cursor.executemany(
+            "INSERT INTO bank_questions (question_key, quest, correct_option) VALUES (%s, %s, %s)",
+            [(key, q['question'], q['correct']) for key, q in chunk]
+        )
+        chunk_keys = [key for key, _ in chunk]
+        cursor.execute(
+            f"SELECT question_key, question_id FROM bank_questions "
+            f"WHERE question_key IN ({', '.join(['%s'] * len(chunk_keys))})",
+            chunk_keys
+        )
+        question_ids.update(cursor.fetchall())
+
+    option_rows = [
+        (question_ids[key], i + 1, option)
+        for key, q in zip(keys, questions)
+        for i, option in enumerate(q['options'])
+    ]
+    for chunk in _chunks(option_rows, INSERT_CHUNK):
+        cursor.executemany("INSERT INTO bank_options (question_id, option_no, option_text) VALUES (%s, %s, %s)", chunk)
+    tag_rows = [(tag, question_ids[key]) for key, q in zip(keys, questions) for tag in q['tags']]
+    for chunk in _chunks(tag_rows, INSERT_CHUNK):
+        cursor.executemany("INSERT INTO bank_tags (tag, question_id) VALUES (%s, %s)", chunk)
+    return [question_ids[key] for key in keys]
+
+
+def add_bank_questions(pool, questions):
+    """Add {'question', 'options', 'correct', 'tags'} dicts to the bank in one transaction and return their ids."""
+    questions = [validate_bank_question(q) for q in questions]
+    if not questions:
+        return []
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            question_ids = _insert_bank_questions(cursor, questions)
+            conn.commit()
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            cursor.close()
+            raise
+    return question_ids
+
+
+def get_tag_counts(pool):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT tag, COUNT(*) FROM bank_tags GROUP BY tag ORDER BY tag")
+        counts = cursor.fetchall()
+        cursor.close()
+    return counts
+
+
+def create_random_test(pool, test_name, sections):
+    """Create a test that draws `count` questions per (tag, count) section for each student.
+
+    The eligible questions of every section are snapshotted into `test_pool`, so
+    later bank additions do not change papers already being taken. A question
+    with several of the chosen tags goes to the section with the smallest pool,
+    so no paper contains the same question twice.
+    """
+    test_name = validate_test_name(test_name)
+    sections = [(tag.strip().lower(), int(count)) for tag, count in sections if int(count) > 0]
+    if not sections:
+        raise TestCreationError("Choose at least one tag to draw questions from")
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT test_name FROM tests WHERE test_name = %s", (test_name,))
+            if cursor.fetchall():
+                raise TestCreationError(f"Test name already exists: {test_name}")
+
+            tagged = {}
+            for tag, _ in sections:
+                cursor.execute("SELECT question_id FROM bank_tags WHERE tag = %s ORDER BY question_id", (tag,))
+                tagged[tag] = [row[0] for row in cursor.fetchall()]
+
+            taken = set()
+            pool_rows = []
+            for section_no, (tag, count) in sorted(enumerate(sections, start=1), key=lambda s: len(tagged[s[1][0]])):
+                eligible = [question_id for question_id in tagged[tag] if question_id not in taken]
+                if len(eligible) < count:
+                    raise TestCreationError(
+                        f"Tag '{tag}' has {len(eligible)} questions not used by other sections, "
+                        f"fewer than the {count} requested"
+                    )
+                taken.update(eligible)
+                pool_rows += [(section_no, question_id) for question_id in eligible]
+
+            cursor.execute("INSERT INTO tests (test_name) VALUES (%s)", (test_name,))
+            cursor.execute("SELECT test_id FROM tests WHERE test_name = %s", (test_name,))
+            test_id = cursor.fetchone()[0]
+            cursor.executemany(
+                "INSERT INTO test_sections (test_id, section_no, tag, draw_count) VALUES (%s, %s, %s, %s)",
+                [(test_id, section_no, tag, count) for section_no, (tag, count) in enumerate(sections, start=1)]
+            )
+            for chunk in _chunks(pool_rows, INSERT_CHUNK):
+                cursor.executemany(
+                    "INSERT INTO test_pool (test_id, section_no, question_id) VALUES (%s, %s, %s)",
+                    [(test_id, section_no, question_id) for section_no, question_id in chunk]
+                )
+
+            conn.commit()
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            cursor.close()
+            raise
+
+    return test_id
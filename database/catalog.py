@@ -0,0 +1,78 @@
+"""Catalog lookups: an in-process cache of the table names in the quiz database, and the test search."""
+import threading
+import time
+
+from database.config import CATALOG_PAGE_SIZE
+
+
+class SchemaCatalog:
+    def __init__(self, pool, ttl=300.0):
+        self._pool = pool
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._tables = None
+        self._loaded_at = 0.0
+
+    def _load(self):
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SHOW TABLES")
+            tables = {table[0] for table in cursor.fetchall()}
+            cursor.close()
+        return tables
+
+    def _current(self):
+        with self._lock:
+            if self._tables is not None and time.monotonic() - self._loaded_at < self.ttl:
+                return self._tables
+        # Load outside the lock so a slow SHOW TABLES doesn't serialize every lookup
+        tables = self._load()
+        with self._lock:
+            self._tables = tables
+            self._loaded_at = time.monotonic()
+            return self._tables
+
+    def exists(self, table_name):
+        return table_name in self._current()
+
+    def add(self, table_name):
+        with self._lock:
+            if self._tables is not None:
+                self._tables.add(table_name)
+
+    def discard(self, table_name):
+        with self._lock:
+            if self._tables is not None:
+                self._tables.discard(table_name)
+
+    def refresh(self):
+        # Explicit hook for when another process changed the schema
+        with self._lock:
+            self._tables = None
+        return self._current()
+
+
+def find_tests(pool, query="", after=None, limit=CATALOG_PAGE_SIZE):
+    """Return up to `limit` (test_id, test_name, version) rows after test id `after` whose name contains `query`.
+
+    Keyset pagination on test_id; a numeric query also matches the test id.
+    """
+    sql = "SELECT test_id, test_name, version FROM tests WHERE test_id > %s"
+    params = [after or 0]
+    if query:
+        pattern = "%" + query.replace("!", "!!").replace("%", "!%").replace("_", "!_") + "%"
+        if query.isdigit():
+            sql += " AND (test_id = %s OR test_name LIKE %s ESCAPE '!')"
+            params += [int(query), pattern]
+        else:
+            sql += " AND test_name LIKE %s ESCAPE '!'"
+            params.append(pattern)
+    sql += " ORDER BY test_id LIMIT %s"
+    params.append(limit)
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        tests = cursor.fetchall()
+        cursor.close()
+    return tests
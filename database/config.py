@@ -0,0 +1,74 @@
+"""Settings shared by the Streamlit app and the command-line tools.
+
+Each QUIZ_* setting is read from the environment, then from the [quiz]
+section of the file named by QUIZ_CONFIG_FILE (default quiz.ini, if present)
+under its name without the prefix, e.g. `db_host = db.internal`.
+"""
+import configparser
+import os
+
+_file = configparser.ConfigParser(interpolation=None)
+_file.read(os.environ.get("QUIZ_CONFIG_FILE", "quiz.ini"))
+
+
+def _setting(name, default=None):
+    if name in os.environ:
+        return os.environ[name]
+    return _file.get("quiz", name.removeprefix("QUIZ_").lower(), fallback=default)
+
+
+# "mysql", or "sqlite" for the local stand-in in database/sqlite_adapter.py
+DB_BACKEND = _setting("QUIZ_DB_BACKEND", "mysql")
+SQLITE_PATH = _setting("QUIZ_SQLITE_PATH", "quiz.sqlite3")
+DB_CONFIG = {
+    "host": _setting("QUIZ_DB_HOST", "localhost"),
+    "port": int(_setting("QUIZ_DB_PORT", "3306")),
+    "user": _setting("QUIZ_DB_USER", "root"),
+    "password": _setting("QUIZ_DB_PASSWORD", "charan"),
+    "database": _setting("QUIZ_DB_NAME", "quiz"),
+}
+# Read replica for teacher reporting; unset QUIZ_REPLICA_HOST (or QUIZ_REPLICA_SQLITE_PATH) means none
+REPLICA_CONFIG = {
+    "host": _setting("QUIZ_REPLICA_HOST"),
+    "port": int(_setting("QUIZ_REPLICA_PORT", str(DB_CONFIG["port"]))),
+    "user": _setting("QUIZ_REPLICA_USER", DB_CONFIG["user"]),
+    "password": _setting("QUIZ_REPLICA_PASSWORD", DB_CONFIG["password"]),
+    "database": _setting("QUIZ_REPLICA_NAME", DB_CONFIG["database"]),
+}
+REPLICA_SQLITE_PATH = _setting("QUIZ_REPLICA_SQLITE_PATH")
+REPLICA_MAX_LAG = float(_setting("QUIZ_REPLICA_MAX_LAG", "30"))
+REPORTING_CONCURRENCY = int(_setting("QUIZ_REPORTING_CONCURRENCY", "3"))
+REPORTING_TIMEOUT = float(_setting("QUIZ_REPORTING_TIMEOUT", "30"))
+POOL_SIZE = int(_setting("QUIZ_DB_POOL_SIZE", "10"))
+POOL_TIMEOUT = float(_setting("QUIZ_DB_POOL_TIMEOUT", "30"))
+CATALOG_TTL = float(_setting("QUIZ_SCHEMA_CACHE_TTL", "300"))
+QUESTION_CACHE_ENTRIES = int(_setting("QUIZ_QUESTION_CACHE_ENTRIES", "256"))
+QUESTION_CACHE_BYTES = int(_setting("QUIZ_QUESTION_CACHE_MB", "64")) * 1024 * 1024
+RESULTS_PAGE_SIZE = int(_setting("QUIZ_RESULTS_PAGE_SIZE", "50"))
+CATALOG_PAGE_SIZE = int(_setting("QUIZ_CATALOG_PAGE_SIZE", "25"))
+SUBMISSION_QUEUE_PATH = _setting("QUIZ_SUBMISSION_QUEUE", "submissions.db")
+SUBMISSION_BATCH_SIZE = int(_setting("QUIZ_SUBMISSION_BATCH_SIZE", "200"))
+AUTOSAVE_INTERVAL = float(_setting("QUIZ_AUTOSAVE_INTERVAL", "2"))
+PROFILING = _setting("QUIZ_PROFILING", "1") == "1"
+PROFILE_PROMETHEUS_PATH = _setting("QUIZ_PROFILE_PROMETHEUS")
+PROFILE_JSON_LOG = _setting("QUIZ_PROFILE_JSON_LOG")
+# "scrypt" or "pbkdf2_sha256"; stored hashes made with other settings are upgraded at the next login
+PASSWORD_HASH = _setting("QUIZ_PASSWORD_HASH", "scrypt")
+SCRYPT_N = int(_setting("QUIZ_SCRYPT_N", "16384"))
+PBKDF2_ITERATIONS = int(_setting("QUIZ_PBKDF2_ITERATIONS", "600000"))
+HASH_WORKERS = int(_setting("QUIZ_HASH_WORKERS", "4"))
+SESSION_TTL = float(_setting("QUIZ_SESSION_TTL", "1800"))
+# Expired timed attempts are auto-submitted every EXAM_SWEEP_INTERVAL seconds, EXAM_GRACE seconds after
+# the deadline; the grace must exceed QUIZ_AUTOSAVE_INTERVAL so the last answers are in the draft
+EXAM_SWEEP_INTERVAL = float(_setting("QUIZ_EXAM_SWEEP_INTERVAL", "5"))
+EXAM_GRACE = float(_setting("QUIZ_EXAM_GRACE", "10"))
+# Read-only results API (python -m database.api); clients send QUIZ_API_TOKEN as a bearer token
+API_TOKEN = _setting("QUIZ_API_TOKEN")
+API_CACHE_TTL = float(_setting("QUIZ_API_CACHE_TTL", "1"))
+API_PAGE_SIZE = int(_setting("QUIZ_API_PAGE_SIZE", "500"))
+# Where session tokens, live attempt progress and shared test caches are kept: "memory" (this process only),
+# or "sqlite" / "redis" to share them between app processes
+STATE_BACKEND = _setting("QUIZ_STATE_BACKEND", "memory")
+STATE_PATH = _setting("QUIZ_STATE_PATH", "state.sqlite3")
+REDIS_URL = _setting("QUIZ_REDIS_URL", "redis://localhost:6379/0")
+SHARED_CACHE_TTL = float(_setting("QUIZ_SHARED_CACHE_TTL", "3600"))
@@ -0,0 +1,153 @@
+"""Salted password hashes, account verification and short-lived session tokens.
+
+Passwords are stored as self-describing strings such as
+`scrypt$16384$8$1$<salt>$<hash>` or `pbkdf2_sha256$600000$<salt>$<hash>`, so
+the cost can be raised later: a hash made with older settings is replaced the
+next time its owner logs in. Accounts created before hashing keep their
+plaintext `pass` until that first login, when it is hashed and cleared.
+"""
+import base64
+import hashlib
+import hmac
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+SCHEMES = ("scrypt", "pbkdf2_sha256")
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+class PasswordHasher:
+    """Hashes and verifies passwords on a bounded thread pool.
+
+    hashlib releases the GIL while hashing, so hashes run in parallel, and the
+    pool size caps the CPU (and, for scrypt, memory) a login spike can take.
+    """
+
+    def __init__(self, scheme="scrypt", scrypt_n=2 ** 14, scrypt_r=8, scrypt_p=1, pbkdf2_iterations=600_000,
+                 workers=4):
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown password hash scheme {scheme!r}; expected one of {', '.join(SCHEMES)}")
+        self.scheme = scheme
+        self.scrypt_params = (scrypt_n, scrypt_r, scrypt_p)
+        self.pbkdf2_iterations = pbkdf2_iterations
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+    def _derive(self, password, salt, scheme, params):
+        if scheme == "scrypt":
+            n, r, p = params
+            return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=256 * r * n * p, dklen=32)
+        return hashlib.pbkdf2_hmac("sha256", password.encode(), salt, params[0], dklen=32)
+
+    def _hash(self, password):
+        salt = secrets.token_bytes(16)
+        params = self.scrypt_params if self.scheme == "scrypt" else (self.pbkdf2_iterations,)
+        derived = self._derive(password, salt, self.scheme, params)
+        return "$".join([self.scheme, *map(str, params), _b64(salt), _b64(derived)])
+
+    def _verify(self, password, encoded):
+        scheme, *fields = encoded.split("$")
+        if scheme not in SCHEMES:
+            return False
+        params, salt, expected = tuple(map(int, fields[:-2])), base64.b64decode(fields[-2]), fields[-1]
+        return hmac.compare_digest(_b64(self._derive(password, salt, scheme, params)), expected)
+
+    def hash(self, password):
+        return self._executor.submit(self._hash, password).result()
+
+    def verify(self, password, encoded):
+        return self._executor.submit(self._verify, password, encoded).result()
+
+    def needs_rehash(self, encoded):
+        scheme, *fields = encoded.split("$")
+        params = self.scrypt_params if self.scheme == "scrypt" else (self.pbkdf2_iterations,)
+        return scheme != self.scheme or tuple(map(int, fields[:-2])) != params
+
+
+class AccountStore:
+    def __init__(self, pool, hasher):
+        self._pool = pool
+        self.hasher = hasher
+        # Verified against when a name is unknown, so unknown names take as long as wrong passwords
+        self._dummy_hash = hasher.hash(secrets.token_hex(8))
+
+    def register(self, username, password):
+        # Returns False if the name is taken; the unique index on accounts.name also guards concurrent sign-ups
+        encoded = self.hasher.hash(password)
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute("SELECT 1 FROM accounts WHERE name = %s LIMIT 1", (username,))
+                if cursor.fetchall():
+                    cursor.close()
+                    return False
+                cursor.execute("INSERT INTO accounts (name, pass_hash) VALUES (%s, %s)", (username, encoded))
+                conn.commit()
+                cursor.close()
+            except Exception:
+                conn.rollback()
+                cursor.close()
+                raise
+        return True
+
+    def authenticate(self, username, password):
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pass, pass_hash FROM accounts WHERE name = %s", (username,))
+            rows = cursor.fetchall()
+            cursor.close()
+
+        if not rows:
+            self.hasher.verify(password, self._dummy_hash)
+            return False
+        # Legacy data may hold several accounts with one name; any matching password logs in
+        for legacy_pass, pass_hash in rows:
+            if pass_hash:
+                if self.hasher.verify(password, pass_hash):
+                    if self.hasher.needs_rehash(pass_hash):
+                        self._store_hash(username, password, "pass_hash", pass_hash)
+                    return True
+            elif legacy_pass is not None and hmac.compare_digest(str(legacy_pass), password):
+                self._store_hash(username, password, "pass", legacy_pass)
+                return True
+        return False
+
+    def _store_hash(self, username, password, column, old_value):
+        encoded = self.hasher.hash(password)
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"UPDATE accounts SET pass_hash = %s, pass = NULL WHERE name = %s AND {column} = %s",
+                (encoded, username, old_value)
+            )
+            conn.commit()
+            cursor.close()
+
+
+class SessionTokens:
+    """Random tokens for verified logins, so a refreshed page can resume without re-hashing a password.
+
+    Tokens live in a state backend (see database/state.py), so with a shared
+    backend a token issued by one worker process is accepted by the others.
+    """
+
+    def __init__(self, state, ttl=1800.0):
+        self._state = state
+        self.ttl = ttl
+
+    def issue(self, username, user_type):
+        token = secrets.token_urlsafe(24)
+        self._state.set(f"session:{token}", (username, user_type), self.ttl)
+        return token
+
+    def verify(self, token):
+        # Returns (username, user_type) and extends the token's lifetime, or None once it has expired
+        entry = self._state.get(f"session:{token}")
+        if entry is not None:
+            self._state.set(f"session:{token}", entry, self.ttl)
+        return entry
+
+    def revoke(self, token):
+        self._state.delete(f"session:{token}")
@@ -0,0 +1,168 @@
+"""Autosaved, resumable test attempts.
+
+Answer changes and question moves are coalesced in memory per (test, student)
+and written by a background thread as batched upserts, so a whole class
+autosaving at once costs one transaction per flush interval rather than one
+per click. Submitting an attempt removes its draft.
+"""
+import logging
+import threading
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+Draft = namedtuple("Draft", ["version", "submission_key", "current_question", "responses"])
+
+# Pending entry that deletes the stored draft instead of updating it
+_DISCARD = object()
+
+
+class DraftStore:
+    def __init__(self, pool, flush_interval=2.0, batch_size=500):
+        self._pool = pool
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self._flushes = 0
+        self._saved = 0
+
+    def save(self, test_id, student, version, submission_key, current_question, responses=None):
+        # `responses` maps q_no to answer for the questions changed since the last save
+        with self._lock:
+            entry = self._pending.get((test_id, student))
+            if entry is None or entry is _DISCARD or entry["version"] != version:
+                # A replaced discard or version change must also clear the stored answers
+                entry = self._pending[(test_id, student)] = {"responses": {}, "reset": entry is not None}
+            entry.update(version=version, submission_key=submission_key, current_question=current_question)
+            if responses:
+                entry["responses"].update(responses)
+
+    def discard(self, test_id, student):
+        with self._lock:
+            self._pending[(test_id, student)] = _DISCARD
+
+    def load(self, test_id, student):
+        # Write out anything still buffered so the stored draft is current
+        self.flush()
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT version, submission_key, current_question FROM attempt_drafts WHERE test_id = %s AND student = %s",
+                (test_id, student)
+            )
+            row = cursor.fetchone()
+            if row is None:
+                cursor.close()
+                return None
+            cursor.execute(
+                "SELECT q_no, answer FROM draft_responses WHERE test_id = %s AND student = %s",
+                (test_id, student)
+            )
+            responses = dict(cursor.fetchall())
+            cursor.close()
+        return Draft(row[0], row[1], row[2], responses)
+
+    def in_progress(self, student):
+        self.flush()
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT test_id FROM attempt_drafts WHERE student = %s", (student,))
+            test_ids = {row[0] for row in cursor.fetchall()}
+            cursor.close()
+        return test_ids
+
+    def _write(self, entries):
+        discarded = [key for key, entry in entries if entry is _DISCARD]
+        reset = [key for key, entry in entries if entry is not _DISCARD and entry["reset"]]
+        saved = [(key, entry) for key, entry in entries if entry is not _DISCARD]
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                if discarded:
+                    cursor.executemany("DELETE FROM draft_responses WHERE test_id = %s AND student = %s", discarded)
+                    cursor.executemany("DELETE FROM attempt_drafts WHERE test_id = %s AND student = %s", discarded)
+                if reset:
+                    cursor.executemany("DELETE FROM draft_responses WHERE test_id = %s AND student = %s", reset)
+                if saved:
+                    cursor.executemany(
+                        "INSERT INTO attempt_drafts (test_id, student, version, submission_key, current_question) "
+                        "VALUES (%s, %s, %s, %s, %s) "
+                        "ON DUPLICATE KEY UPDATE version = VALUES(version), submission_key = VALUES(submission_key), "
+                        "current_question = VALUES(current_question), updated_at = CURRENT_TIMESTAMP",
+                        [(test_id, student, entry["version"], entry["submission_key"], entry["current_question"])
+                         for (test_id, student), entry in saved]
+                    )
+                    response_rows = [
+                        (test_id, student, q_no, answer)
+                        for (test_id, student), entry in saved
+                        for q_no, answer in entry["responses"].items()
+                    ]
+                    if response_rows:
+                        cursor.executemany(
+                            "INSERT INTO draft_responses (test_id, student, q_no, answer) VALUES (%s, %s, %s, %s) "
+                            "ON DUPLICATE KEY UPDATE answer = VALUES(answer)",
+                            response_rows
+                        )
+                conn.commit()
+                cursor.close()
+            except Exception:
+                conn.rollback()
+                cursor.close()
+                raise
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                entries = list(self._pending.items())
+                self._pending.clear()
+            for start in range(0, len(entries), self.batch_size):
+                batch = entries[start:start + self.batch_size]
+                try:
+                    self._write(batch)
+                except Exception:
+                    # Put the unwritten changes back without overwriting anything newer
+                    with self._lock:
+                        for key, entry in entries[start:]:
+                            newer = self._pending.get(key)
+                            if newer is None:
+                                self._pending[key] = entry
+                            elif newer is _DISCARD or newer["reset"]:
+                                continue
+                            elif entry is _DISCARD or entry["version"] != newer["version"]:
+                                newer["reset"] = True
+                            else:
+                                newer["responses"] = {**entry["responses"], **newer["responses"]}
+                                newer["reset"] = entry["reset"]
+                    raise
+                self._flushes += 1
+                self._saved += len(batch)
+        return len(entries)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Draft autosave failed, will retry: %s", e)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="draft-autosave", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return {"pending": pending, "flushes": self._flushes, "saved": self._saved}
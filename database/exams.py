@@ -0,0 +1,288 @@
+"""Timed exams: start windows, server-side deadlines, staggered starts and auto-submission.
+
+A schedule gives a test a window and a duration. Each student gets a fixed
+offset within the schedule's stagger, derived from a hash of the test and
+their name, and their whole window moves by it. The class then opens the
+test, loads questions and hits the hard close spread over that many seconds
+instead of all at once. A student's deadline is set on the server when they
+start: the earlier of start plus duration and their window's close. It is
+stored in `exam_sessions`, so refreshing or switching devices never resets
+the clock.
+
+Attempts still open after their deadline are submitted by ExamSweeper from
+their autosaved drafts, in batches, through the submission queue.
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict, namedtuple
+
+from database.authoring import TestCreationError
+
+logger = logging.getLogger(__name__)
+
+# Times are Unix timestamps and durations seconds, as measured on the app servers
+Schedule = namedtuple("Schedule", ["test_id", "opens_at", "closes_at", "duration", "stagger"])
+ExamSession = namedtuple("ExamSession", ["started_at", "deadline", "finished"])
+
+
+class ExamWindowError(Exception):
+    pass
+
+
+def start_offset(test_id, student, stagger):
+    # Stable per student, so their window is the same on every worker and after every refresh
+    if stagger <= 0:
+        return 0.0
+    digest = hashlib.blake2b(f"{test_id}:{student}".encode(), digest_size=8, person=b"exam-stagger").digest()
+    return int.from_bytes(digest, "big") / 2 ** 64 * stagger
+
+
+def student_window(schedule, student):
+    offset = start_offset(schedule.test_id, student, schedule.stagger)
+    return schedule.opens_at + offset, schedule.closes_at + offset
+
+
+def set_schedule(pool, test_id, opens_at, closes_at, duration, stagger=0):
+    if duration <= 0:
+        raise TestCreationError("The time limit must be positive")
+    if closes_at <= opens_at:
+        raise TestCreationError("The window must close after it opens")
+    if stagger < 0 or stagger >= closes_at - opens_at:
+        raise TestCreationError("The start stagger must be shorter than the window")
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "INSERT INTO test_schedules (test_id, opens_at, closes_at, duration, stagger) VALUES (%s, %s, %s, %s, %s) "
+            "ON DUPLICATE KEY UPDATE opens_at = VALUES(opens_at), closes_at = VALUES(closes_at), "
+            "duration = VALUES(duration), stagger = VALUES(stagger)",
+            (test_id, opens_at, closes_at, duration, stagger)
+        )
+        conn.commit()
+        cursor.close()
+
+
+def clear_schedule(pool, test_id):
+    # Makes the test untimed, including attempts already under way
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM exam_sessions WHERE test_id = %s AND finished = 0", (test_id,))
+            cursor.execute("DELETE FROM test_schedules WHERE test_id = %s", (test_id,))
+            conn.commit()
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            cursor.close()
+            raise
+
+
+def get_schedules(pool):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT test_id, opens_at, closes_at, duration, stagger FROM test_schedules")
+        schedules = {
+            row[0]: Schedule(row[0], float(row[1]), float(row[2]), int(row[3]), int(row[4]))
+            for row in cursor.fetchall()
+        }
+        cursor.close()
+    return schedules
+
+
+def _get_session(cursor, test_id, student):
+    cursor.execute(
+        "SELECT started_at, deadline, finished FROM exam_sessions WHERE test_id = %s AND student = %s",
+        (test_id, student)
+    )
+    row = cursor.fetchone()
+    return None if row is None else ExamSession(float(row[0]), float(row[1]), bool(row[2]))
+
+
+def start_exam(pool, schedule, student, now=None):
+    """Start a student's timed attempt, or return the one already started."""
+    now = time.time() if now is None else now
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            session = _get_session(cursor, schedule.test_id, student)
+            if session is None:
+                opens_at, closes_at = student_window(schedule, student)
+                if now < opens_at:
+                    raise ExamWindowError("This test has not opened for you yet")
+                if now >= closes_at:
+                    raise ExamWindowError("This test has closed")
+                session = ExamSession(now, min(now + schedule.duration, closes_at), False)
+                try:
+                    cursor.execute(
+                        "INSERT INTO exam_sessions (test_id, student, started_at, deadline, finished) "
+                        "VALUES (%s, %s, %s, %s, 0)",
+                        (schedule.test_id, student, session.started_at, session.deadline)
+                    )
+                    conn.commit()
+                except Exception:
+                    # Started at the same moment from another session: theirs stands
+                    conn.rollback()
+                    session = _get_session(cursor, schedule.test_id, student)
+                    if session is None:
+                        raise
+            cursor.close()
+        except Exception:
+            cursor.close()
+            raise
+    return session
+
+
+def finish_exam(pool, test_id, student):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE exam_sessions SET finished = 1 WHERE test_id = %s AND student = %s AND finished = 0",
+            (test_id, student)
+        )
+        conn.commit()
+        cursor.close()
+
+
+class ExamSweeper:
+    """Background worker that submits timed attempts left open past their deadline.
+
+    `grace` should exceed the draft autosave interval of every app process, so
+    answers given just before the deadline are in the draft when it is read.
+    """
+
+    def __init__(self, pool, submissions, answer_keys, question_bank, drafts, interval=5.0, grace=10.0,
+                 batch_size=200):
+        self._pool = pool
+        self._submissions = submissions
+        self._answer_keys = answer_keys
+        self._question_bank = question_bank
+        self._drafts = drafts
+        self.interval = interval
+        self.grace = grace
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = None
+        self._sweeps = 0
+        self._submitted = 0
+        self._unscored = 0
+
+    def _expired(self, cursor, now):
+        cursor.execute(
+            "SELECT e.test_id, e.student FROM exam_sessions e "
+            "LEFT JOIN attempts a ON a.test_id = e.test_id AND a.student = e.student "
+            "WHERE e.finished = 0 AND e.deadline < %s AND a.attempt_id IS NULL "
+            "ORDER BY e.deadline LIMIT %s",
+            (now - self.grace, self.batch_size)
+        )
+        return cursor.fetchall()
+
+    def _load_drafts(self, cursor, test_id, students):
+        marks = ", ".join(["%s"] * len(students))
+        cursor.execute(
+            f"SELECT student, version, submission_key FROM attempt_drafts WHERE test_id = %s AND student IN ({marks})",
+            (test_id, *students)
+        )
+        drafts = {student: (version, key, {}) for student, version, key in cursor.fetchall()}
+        cursor.execute(
+            f"SELECT student, q_no, answer FROM draft_responses WHERE test_id = %s AND student IN ({marks})",
+            (test_id, *students)
+        )
+        for student, q_no, answer in cursor.fetchall():
+            if student in drafts:
+                drafts[student][2][q_no] = answer
+        return drafts
+
+    def _answer_key(self, test_id, version, student):
+        blueprint = self._question_bank.get(test_id, version)
+        if blueprint is not None:
+            return blueprint.assemble(student)
+        return self._answer_keys.get(test_id, version)
+
+    def sweep_once(self, now=None):
+        now = time.time() if now is None else now
+        # Answers buffered in this process must be in the drafts before they are read
+        self._drafts.flush()
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            expired = self._expired(cursor, now)
+            if not expired:
+                cursor.close()
+                return 0
+            by_test = defaultdict(list)
+            for test_id, student in expired:
+                by_test[test_id].append(student)
+            drafts = {test_id: self._load_drafts(cursor, test_id, students) for test_id, students in by_test.items()}
+            cursor.execute(
+                f"SELECT test_id, version FROM tests WHERE test_id IN ({', '.join(['%s'] * len(by_test))})",
+                list(by_test)
+            )
+            versions = dict(cursor.fetchall())
+            cursor.close()
+
+        finished = []
+        unscored = 0
+        for test_id, students in by_test.items():
+            for student in students:
+                if test_id not in versions:
+                    # The test was deleted; nothing left to score against
+                    finished.append((test_id, student))
+                    continue
+                version, key, responses = drafts[test_id].get(
+                    student, (versions[test_id], f"expired:{test_id}:{student}", {})
+                )
+                try:
+                    answer_key = self._answer_key(test_id, version, student)
+                    if answer_key.version != version:
+                        # The test changed since the draft was saved, so its answers belong to other questions;
+                        # like the app, refuse to score them, but close the attempt so it is not swept again
+                        logger.warning("Not scoring the expired attempt of %s on test %s: draft is for version %s, "
+                                       "the test is at version %s", student, test_id, version, answer_key.version)
+                        finished.append((test_id, student))
+                        unscored += 1
+                        continue
+                    answers = [responses.get(q_no, 0) for q_no in answer_key.q_nos.tolist()]
+                    self._submissions.submit(key, test_id, student, answer_key.score(answers), len(answer_key),
+                                             answer_key.responses(answers))
+                except Exception as e:
+                    logger.error("Could not auto-submit the expired attempt of %s on test %s: %s", student, test_id, e)
+                    continue
+                self._drafts.discard(test_id, student)
+                finished.append((test_id, student))
+
+        if finished:
+            with self._pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(
+                    "UPDATE exam_sessions SET finished = 1 WHERE test_id = %s AND student = %s", finished
+                )
+                conn.commit()
+                cursor.close()
+        self._sweeps += 1
+        self._submitted += len(finished) - unscored
+        self._unscored += unscored
+        return len(finished)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                # A full batch means more may be waiting, so keep going until the backlog is cleared
+                while self.sweep_once() == self.batch_size and not self._stop.is_set():
+                    pass
+            except Exception as e:
+                logger.warning("Exam sweep failed, will retry: %s", e)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="exam-sweeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        return {"sweeps": self._sweeps, "auto_submitted": self._submitted, "unscored": self._unscored}
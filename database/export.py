@@ -0,0 +1,147 @@
+"""Stream test results out of MySQL into CSV or Parquet with bounded memory.
+
+Usage: python -m database.export [--test NAME] [--format csv|parquet] [--output PATH]
+
+Rows are read from an unbuffered cursor in chunks and written out as they
+arrive, so exporting every attempt of every test never holds more than one
+chunk in memory. Without --test all tests are exported. CSV goes to stdout
+unless --output is given; Parquet needs --output and the pyarrow package.
+With a read replica configured (QUIZ_REPLICA_HOST) the export runs against it.
+"""
+import argparse
+import csv
+import io
+import sys
+import tempfile
+
+from database.routing import create_reporting_router
+
+COLUMNS = ["Test Name", "Student Name", "Score", "Total Questions", "Percentage", "Submitted At"]
+CHUNK_SIZE = 5000
+
+
+def iter_result_chunks(pool, test_id=None, chunk_size=CHUNK_SIZE):
+    where = "WHERE a.test_id = %s" if test_id is not None else ""
+    params = (test_id,) if test_id is not None else ()
+    with pool.connection() as conn:
+        # Unbuffered: rows stay on the server until fetched
+        cursor = conn.cursor(buffered=False)
+        try:
+            cursor.execute(
+                "SELECT t.test_name, a.student, a.marks, a.total, a.submitted_at "
+                "FROM attempts a JOIN tests t ON t.test_id = a.test_id "
+                f"{where} ORDER BY a.test_id, a.student",
+                params
+            )
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield [
+                    (test_name, student, marks, total,
+                     round(marks / total * 100, 2) if total else 0.0, submitted_at)
+                    for test_name, student, marks, total, submitted_at in rows
+                ]
+        finally:
+            cursor.close()
+
+
+def write_csv(chunks, out):
+    writer = csv.writer(out)
+    writer.writerow(COLUMNS)
+    count = 0
+    for rows in chunks:
+        writer.writerows(rows)
+        count += len(rows)
+    return count
+
+
+def write_parquet(chunks, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs the pyarrow package (pip install pyarrow)")
+
+    schema = pa.schema([
+        ("test_name", pa.string()),
+        ("student", pa.string()),
+        ("score", pa.int32()),
+        ("total_questions", pa.int32()),
+        ("percentage", pa.float64()),
+        ("submitted_at", pa.timestamp("s")),
+    ])
+    count = 0
+    with pq.ParquetWriter(path, schema) as writer:
+        # One row group per chunk
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+            ))
+            count += len(rows)
+    return count
+
+
+def export_csv_file(pool, test_id=None):
+    """Write the CSV export to an anonymous temporary file and return it rewound, for the download button.
+
+    Rows are encoded chunk by chunk straight to disk, so the only full copy in
+    memory is the one the download button reads back. The file is unbuffered
+    (a raw file object), which is what st.download_button accepts.
+    """
+    raw = tempfile.TemporaryFile(buffering=0)
+    try:
+        out = io.TextIOWrapper(io.BufferedWriter(raw), encoding="utf-8", newline="")
+        write_csv(iter_result_chunks(pool, test_id), out)
+        out.detach().detach()
+        raw.seek(0)
+    except Exception:
+        raw.close()
+        raise
+    return raw
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--test", help="name of the test to export (default: all tests)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--output", "-o", help="output file (default: stdout for CSV)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    if args.format == "parquet" and not args.output:
+        parser.error("--output is required for Parquet exports")
+
+    # Reads from the read replica when one is configured and fresh enough, like the app's reporting views
+    pool = create_reporting_router(concurrency=1).start()
+    try:
+        test_id = None
+        if args.test:
+            with pool.connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT test_id FROM tests WHERE test_name = %s", (args.test,))
+                row = cursor.fetchone()
+                cursor.close()
+            if row is None:
+                print(f"Unknown test: {args.test}", file=sys.stderr)
+                return 1
+            test_id = row[0]
+
+        chunks = iter_result_chunks(pool, test_id, args.chunk_size)
+        if args.format == "parquet":
+            count = write_parquet(chunks, args.output)
+        elif args.output:
+            with open(args.output, "w", newline="", encoding="utf-8") as out:
+                count = write_csv(chunks, out)
+        else:
+            count = write_csv(chunks, sys.stdout)
+    finally:
+        pool.close()
+
+    print(f"Exported {count} rows", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,404 @@
+"""Bulk-import questions from CSV, JSON, JSON Lines or GIFT files into the question bank or a new test.
+
+Usage: python -m database.importer FILE [--format csv|json|jsonl|gift] [--test NAME] [--tags a,b] [--skip-invalid]
+
+The file is read as a stream and validated in chunks, and valid rows are
+inserted with batched INSERTs as they arrive. All of it happens in a single
+transaction. By default any invalid row rolls the whole import back and is
+reported with its line or item number. With --skip-invalid the valid rows
+are kept. Without --test questions go to the question bank; with --test they
+become a new fixed test, which needs exactly four options per question.
+
+CSV files need a header with `question`, `option1`..`option8` (or `o1`..),
+`correct` (option number or letter) and optionally `tags` (separated by `;`).
+JSON files hold an array of objects with `question`, `options`, `correct`
+and `tags`; JSON Lines files hold one such object per line. GIFT files may
+contain multiple-choice questions only; `$CATEGORY:` lines become tags.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import re
+import sys
+
+from database.authoring import (
+    INSERT_CHUNK, TestCreationError, _insert_questions, validate_question, validate_test_name
+)
+from database.bank import _insert_bank_questions, validate_bank_question
+from database.pool import create_pool
+
+FORMATS = ("csv", "json", "jsonl", "gift")
+MAX_REPORTED_ERRORS = 100
+
+_OPTION_COLUMN = re.compile(r"^(?:option|o)(\d+)$")
+_TAG_SEPARATOR = re.compile(r"[;,]")
+
+
+class RowError(ValueError):
+    pass
+
+
+def detect_format(filename):
+    extension = os.path.splitext(filename)[1].lower().lstrip(".")
+    if extension in ("txt", "gift"):
+        return "gift"
+    if extension in FORMATS:
+        return extension
+    raise ValueError(f"Cannot tell the format of {filename}; pass one of {', '.join(FORMATS)}")
+
+
+def _parse_correct(value):
+    value = str(value).strip()
+    if len(value) == 1 and value.isalpha():
+        return ord(value.upper()) - ord("A") + 1
+    try:
+        return int(value)
+    except ValueError:
+        raise RowError(f"Correct answer must be an option number or letter, got {value!r}")
+
+
+def _split_tags(tags):
+    if isinstance(tags, str):
+        tags = _TAG_SEPARATOR.split(tags)
+    return [tag for tag in (tags or []) if isinstance(tag, str)]
+
+
+class _LineCounter:
+    """Iterates over `stream`, noting the line on which the current CSV record started.
+
+    csv.reader.line_num is the line a record ends on, which is not where a
+    quoted multi-line question should be reported.
+    """
+
+    def __init__(self, stream):
+        self._lines = iter(stream)
+        self.number = 0
+        self.record_start = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self._lines)
+        self.number += 1
+        # Blank lines between records are skipped by the reader, so they don't start one
+        if self.record_start is None and line.strip():
+            self.record_start = self.number
+        return line
+
+
+def iter_csv(stream):
+    lines = _LineCounter(stream)
+    reader = csv.DictReader(lines)
+    header = [name.strip().lower() for name in reader.fieldnames or []]
+    reader.fieldnames = header
+    option_columns = sorted(
+        (int(match.group(1)), name) for name in header for match in [_OPTION_COLUMN.match(name)] if match
+    )
+    if "question" not in header or "correct" not in header or not option_columns:
+        raise ValueError("CSV header must have question, option1..optionN and correct columns")
+
+    lines.record_start = None
+    for row in reader:
+        location = f"line {lines.record_start}"
+        lines.record_start = None
+        options = [row.get(name) or "" for _, name in option_columns]
+        # Columns for more options than this question has are left empty
+        while options and not options[-1].strip():
+            options.pop()
+        try:
+            yield location, {
+                'question': row.get("question"),
+                'options': options,
+                'correct': _parse_correct(row.get("correct") or ""),
+                'tags': _split_tags(row.get("tags") or ""),
+            }
+        except RowError as e:
+            yield location, e
+
+
+def _json_question(item):
+    if not isinstance(item, dict):
+        raise RowError("Expected an object with question, options and correct")
+    options = item.get("options")
+    if not isinstance(options, list) or not all(isinstance(option, str) for option in options):
+        raise RowError("options must be a list of strings")
+    return {
+        'question': item.get("question") if isinstance(item.get("question"), str) else "",
+        'options': options,
+        'correct': _parse_correct(item.get("correct", "")),
+        'tags': _split_tags(item.get("tags")),
+    }
+
+
+def iter_jsonl(stream):
+    for number, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        location = f"line {number}"
+        try:
+            yield location, _json_question(json.loads(line))
+        except (RowError, json.JSONDecodeError) as e:
+            yield location, RowError(str(e))
+
+
+def iter_json(stream, read_size=1 << 16):
+    # Decode one array element at a time so the whole file is never held in memory
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+
+    def fill():
+        nonlocal buffer, pos, eof
+        chunk = stream.read(read_size)
+        buffer, pos, eof = buffer[pos:] + chunk, 0, not chunk
+
+    def skip(separators):
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in separators:
+                pos += 1
+            if pos < len(buffer) or eof:
+                return
+            fill()
+
+    fill()
+    skip(" \t\r\n")
+    if buffer[pos:pos + 1] != "[":
+        raise ValueError("JSON file must contain an array of questions")
+    pos += 1
+
+    number = 0
+    while True:
+        skip(" \t\r\n,")
+        if pos >= len(buffer):
+            raise ValueError("JSON array is not closed")
+        if buffer[pos] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError as e:
+            if eof:
+                raise ValueError(f"Invalid JSON after item {number}: {e}")
+            fill()
+            continue
+        pos = end
+        number += 1
+        try:
+            yield f"item {number}", _json_question(item)
+        except RowError as e:
+            yield f"item {number}", e
+
+
+_GIFT_SPECIAL = re.compile(r"\\([~=#{}:])")
+_GIFT_ANSWER = re.compile(r"(?<!\\)([=~])")
+_GIFT_FEEDBACK = re.compile(r"(?<!\\)#")
+_GIFT_WEIGHT = re.compile(r"^%(-?\d+(?:\.\d+)?)%")
+_GIFT_TITLE = re.compile(r"^::(.*?)(?<!\\)::")
+_GIFT_MARKUP = re.compile(r"^\[(?:html|moodle|plain|markdown)\]", re.I)
+
+
+def _gift_unescape(text):
+    return _GIFT_SPECIAL.sub(r"\1", text).strip()
+
+
+def _find_unescaped(text, char, start=0):
+    index = text.find(char, start)
+    while index > 0 and text[index - 1] == "\\":
+        index = text.find(char, index + 1)
+    return index
+
+
+def _gift_question(text, tags):
+    text = _GIFT_TITLE.sub("", text.strip()).strip()
+    text = _GIFT_MARKUP.sub("", text).strip()
+    start = _find_unescaped(text, "{")
+    end = _find_unescaped(text, "}", start + 1) if start >= 0 else -1
+    if start < 0 or end < 0:
+        raise RowError("Question has no {answers} block")
+
+    before, body, after = text[:start], text[start + 1:end].strip(), text[end + 1:]
+    question = _gift_unescape(before) + (" _____ " + _gift_unescape(after) if after.strip() else "")
+    if "->" in body or body.upper() in ("T", "F", "TRUE", "FALSE") or body.startswith("#") \
+            or not _GIFT_ANSWER.search(body) or "~" not in body:
+        raise RowError("Only multiple-choice GIFT questions can be imported")
+
+    options, correct = [], []
+    parts = _GIFT_ANSWER.split(body)
+    for marker, answer in zip(parts[1::2], parts[2::2]):
+        answer = _GIFT_FEEDBACK.split(answer)[0].strip()
+        weight = _GIFT_WEIGHT.match(answer)
+        if weight:
+            answer = answer[weight.end():]
+        options.append(_gift_unescape(answer))
+        if marker == "=" or (weight and float(weight.group(1)) >= 100):
+            correct.append(len(options))
+    if len(correct) != 1:
+        raise RowError(f"Multiple-choice questions need exactly one correct answer, found {len(correct)}")
+    return {'question': question, 'options': options, 'correct': correct[0], 'tags': list(tags)}
+
+
+def iter_gift(stream):
+    tags = []
+    block = []
+
+    def flush():
+        # `block` holds (line number, text) pairs; a question is reported at its own first line
+        nonlocal tags
+        lines = block
+        if lines and lines[0][1].lstrip().startswith("$CATEGORY:"):
+            category = lines.pop(0)[1].split(":", 1)[1].strip()
+            tags = [segment for segment in category.split("/") if segment and segment != "$course$"][-1:]
+        if lines:
+            location = f"line {lines[0][0]}"
+            try:
+                return location, _gift_question(" ".join(line.strip() for _, line in lines), tags)
+            except RowError as e:
+                return location, e
+        return None
+
+    for number, line in enumerate(stream, start=1):
+        stripped = line.strip()
+        if stripped.startswith("//"):
+            continue
+        if not stripped:
+            result = flush()
+            block = []
+            if result:
+                yield result
+            continue
+        block.append((number, line.rstrip("\n")))
+    result = flush()
+    if result:
+        yield result
+
+
+_READERS = {"csv": iter_csv, "json": iter_json, "jsonl": iter_jsonl, "gift": iter_gift}
+
+
+def import_questions(pool, stream, fmt, test_name=None, tags=(), skip_invalid=False, chunk_size=INSERT_CHUNK):
+    """Import every question in `stream` in one transaction and return a report.
+
+    The report has `imported` and `invalid` counts, up to MAX_REPORTED_ERRORS
+    (location, message) pairs in `errors`, `committed`, and `test_id` when
+    importing into a new test.
+    """
+    if fmt not in _READERS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    if test_name is not None:
+        test_name = validate_test_name(test_name)
+    extra_tags = [tag for tag in tags if tag.strip()]
+    report = {"imported": 0, "invalid": 0, "errors": [], "committed": False, "test_id": None}
+
+    def validate(raw):
+        if isinstance(raw, Exception):
+            raise raw
+        if test_name is not None:
+            return validate_question(raw)
+        return validate_bank_question({**raw, 'tags': raw['tags'] + extra_tags})
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            if test_name is not None:
+                cursor.execute("SELECT test_name FROM tests WHERE test_name = %s", (test_name,))
+                if cursor.fetchall():
+                    raise TestCreationError(f"Test name already exists: {test_name}")
+                cursor.execute("INSERT INTO tests (test_name) VALUES (%s)", (test_name,))
+                cursor.execute("SELECT test_id FROM tests WHERE test_name = %s", (test_name,))
+                report["test_id"] = cursor.fetchone()[0]
+
+            rows = _READERS[fmt](stream)
+            while True:
+                try:
+                    chunk = [row for _, row in zip(range(chunk_size), rows)]
+                except (ValueError, csv.Error, UnicodeDecodeError) as e:
+                    raise TestCreationError(f"Cannot read {fmt.upper()} file: {e}")
+                if not chunk:
+                    break
+
+                valid = []
+                for location, raw in chunk:
+                    try:
+                        valid.append(validate(raw))
+                    except (TestCreationError, RowError) as e:
+                        report["invalid"] += 1
+                        if len(report["errors"]) < MAX_REPORTED_ERRORS:
+                            report["errors"].append((location, str(e)))
+
+                # Once a row is invalid and nothing will be kept, only validate the rest for the report
+                if valid and (skip_invalid or not report["invalid"]):
+                    if test_name is not None:
+                        first = report["imported"] + 1
+                        _insert_questions(cursor, [
+                            (report["test_id"], first + i, q['question'], *q['options'], q['correct'])
+                            for i, q in enumerate(valid)
+                        ])
+                    else:
+                        _insert_bank_questions(cursor, valid)
+                    report["imported"] += len(valid)
+
+            if report["imported"] and (skip_invalid or not report["invalid"]):
+                conn.commit()
+                report["committed"] = True
+            else:
+                conn.rollback()
+                report["imported"] = 0
+                report["test_id"] = None
+            cursor.close()
+        except Exception:
+            conn.rollback()
+            cursor.close()
+            raise
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file", help="file to import, or - for stdin")
+    parser.add_argument("--format", choices=FORMATS, help="file format (default: from the file extension)")
+    parser.add_argument("--test", help="create a new test with this name instead of adding to the question bank")
+    parser.add_argument("--tags", default="", help="comma-separated tags added to every bank question")
+    parser.add_argument("--skip-invalid", action="store_true", help="import the valid rows even if some are invalid")
+    parser.add_argument("--chunk-size", type=int, default=INSERT_CHUNK)
+    args = parser.parse_args(argv)
+
+    if args.format:
+        fmt = args.format
+    elif args.file == "-":
+        parser.error("--format is required when reading from stdin")
+    else:
+        try:
+            fmt = detect_format(args.file)
+        except ValueError as e:
+            parser.error(str(e))
+
+    stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="") if args.file == "-" \
+        else open(args.file, encoding="utf-8-sig", newline="")
+    pool = create_pool(size=1)
+    try:
+        with stream:
+            report = import_questions(pool, stream, fmt, test_name=args.test, tags=args.tags.split(","),
+                                      skip_invalid=args.skip_invalid, chunk_size=args.chunk_size)
+    except TestCreationError as e:
+        print(e, file=sys.stderr)
+        return 1
+    finally:
+        pool.close()
+
+    for location, message in report["errors"]:
+        print(f"{location}: {message}", file=sys.stderr)
+    if report["invalid"] > len(report["errors"]):
+        print(f"... and {report['invalid'] - len(report['errors'])} more invalid rows", file=sys.stderr)
+    if not report["committed"]:
+        print(f"Nothing imported: {report['invalid']} invalid rows", file=sys.stderr)
+        return 1
+    target = f"test {args.test}" if args.test else "the question bank"
+    print(f"Imported {report['imported']} questions into {target} ({report['invalid']} invalid rows skipped)",
+          file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
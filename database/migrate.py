@@ -0,0 +1,126 @@
+"""Move tests from the legacy per-test tables into the shared schema.
+
+Usage: python -m database.migrate [--drop-legacy]
+
+Each test listed in `tests_available` is copied in its own transaction: its
+`<test>` table becomes rows in `questions` and its `<test>_ans` table becomes
+rows in `attempts`. Tests that already exist in `tests` are skipped, so the
+command can be re-run safely. The score histogram used by the results
+dashboard is rebuilt from `attempts` afterwards.
+"""
+import argparse
+import re
+import sys
+
+from database.analytics import rebuild_histogram
+from database.catalog import SchemaCatalog
+from database.config import CATALOG_TTL
+from database.pool import create_pool
+from database.schema import ensure_schema
+
+LEGACY_NAME = re.compile(r"^[A-Za-z][A-Za-z0-9_]*$")
+
+
+def migrate_test(pool, catalog, s_no, test_name):
+    questions_table = test_name
+    ans_table = f"{test_name.lower()}_ans"
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT 1 FROM tests WHERE test_name = %s", (test_name,))
+            if cursor.fetchone():
+                cursor.close()
+                return "skipped (already migrated)"
+
+            cursor.execute("INSERT INTO tests (test_id, test_name) VALUES (%s, %s)", (s_no, test_name))
+
+            total = 0
+            if catalog.exists(questions_table):
+                cursor.execute(
+                    f"INSERT IGNORE INTO questions (test_id, q_no, quest, o1, o2, o3, o4, correct_ansr) "
+                    f"SELECT %s, Q_no, quest, o1, o2, o3, o4, correct_ansr FROM `{questions_table}`",
+                    (s_no,)
+                )
+                total = cursor.rowcount
+
+            attempts = 0
+            if catalog.exists(ans_table):
+                # The legacy table had no key, so keep each student's best score
+                cursor.execute(
+                    f"INSERT INTO attempts (test_id, student, marks, total) "
+                    f"SELECT %s, std_nm, MAX(marks), %s FROM `{ans_table}` GROUP BY std_nm",
+                    (s_no, total)
+                )
+                attempts = cursor.rowcount
+
+            conn.commit()
+            cursor.close()
+            return f"{total} questions, {attempts} attempts"
+        except Exception:
+            conn.rollback()
+            cursor.close()
+            raise
+
+
+def drop_legacy(pool, catalog, test_name):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        for table in (test_name, f"{test_name.lower()}_ans"):
+            if catalog.exists(table):
+                cursor.execute(f"DROP TABLE `{table}`")
+                catalog.discard(table)
+        cursor.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--drop-legacy", action="store_true",
+                        help="drop the per-test tables and tests_available after a successful migration")
+    args = parser.parse_args(argv)
+
+    pool = create_pool(size=1)
+    catalog = SchemaCatalog(pool, ttl=CATALOG_TTL)
+    ensure_schema(pool)
+
+    if not catalog.exists("tests_available"):
+        print("No tests_available table found, nothing to migrate")
+        rebuild_histogram(pool)
+        pool.close()
+        return 0
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT s_no, test_name FROM tests_available ORDER BY s_no")
+        legacy_tests = cursor.fetchall()
+        cursor.close()
+
+    failures = 0
+    for s_no, test_name in legacy_tests:
+        if not LEGACY_NAME.match(test_name):
+            print(f"{test_name}: skipped (not a valid table name)")
+            failures += 1
+            continue
+        try:
+            print(f"{test_name}: {migrate_test(pool, catalog, s_no, test_name)}")
+        except Exception as e:
+            print(f"{test_name}: failed ({e})")
+            failures += 1
+
+    rebuild_histogram(pool)
+
+    if args.drop_legacy and not failures:
+        for _, test_name in legacy_tests:
+            drop_legacy(pool, catalog, test_name)
+        with pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DROP TABLE tests_available")
+            cursor.close()
+        print("Dropped legacy tables")
+
+    pool.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+"""Per-student papers for randomized tests: deterministic sampling, option shuffling and scoring."""
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from database.answer_keys import AnswerKey
+from database.state import read_through
+
+
+def student_seed(test_id, version, student):
+    # Stable across processes and restarts, unlike hash()
+    digest = hashlib.blake2b(f"{test_id}:{version}:{student}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class Paper(AnswerKey):
+    """Answer key for one student's paper; `correct` holds the shuffled position of each right option."""
+    __slots__ = ("perms", "student_rows")
+
+    def __init__(self, test_id, version, q_nos, correct, perms, student_rows):
+        super().__init__(test_id, version, q_nos, correct)
+        self.perms = perms
+        self.student_rows = student_rows
+
+    def responses(self, answers):
+        # Map each shown option back to its position in the bank, so responses are comparable across students
+        given = self._given(answers)
+        shown = np.maximum(given.astype(np.intp) - 1, 0)
+        original = np.where(given > 0, self.perms[np.arange(len(given)), shown] + 1, 0)
+        return list(zip(self.q_nos.tolist(), original.tolist(), (given == self.correct).astype(int).tolist()))
+
+
+class Blueprint:
+    """A randomized test's question pools, held as arrays so a paper is drawn without touching the database."""
+
+    def __init__(self, test_id, version, sections, question_ids, texts, options, correct):
+        self.test_id = test_id
+        self.version = version
+        # (tag, draw_count, start, end), where start:end indexes this section's pool
+        self.sections = sections
+        self.question_ids = question_ids
+        self.texts = texts
+        self.options = options
+        self.n_options = np.array([len(o) for o in options], dtype=np.int8)
+        self.correct = correct
+        self.total = sum(count for _, count, _, _ in sections)
+
+    def assemble(self, student):
+        rng = np.random.default_rng(student_seed(self.test_id, self.version, student))
+        picks = np.concatenate([
+            start + rng.choice(end - start, size=count, replace=False)
+            for _, count, start, end in self.sections
+        ])
+
+        # Shuffle every question's options at once: sorting random keys gives a permutation,
+        # and padding slots beyond a question's option count sort last
+        n_options = self.n_options[picks]
+        width = int(n_options.max())
+        sort_keys = rng.random((len(picks), width))
+        sort_keys[np.arange(width) >= n_options[:, None]] = 2.0
+        perms = np.argsort(sort_keys, axis=1).astype(np.int8)
+        correct = (np.argmax(perms == (self.correct[picks] - 1)[:, None], axis=1) + 1).astype(np.int8)
+
+        q_nos = self.question_ids[picks]
+        student_rows = [
+            (int(q_no), self.texts[i], *[self.options[i][p] for p in perm[:n]])
+            for q_no, i, perm, n in zip(q_nos, picks.tolist(), perms, n_options.tolist())
+        ]
+        for array in (q_nos, correct, perms):
+            array.flags.writeable = False
+        return Paper(self.test_id, self.version, q_nos, correct, perms, student_rows)
+
+
+class QuestionBank:
+    """Process-wide cache of blueprints keyed by test id and version; fixed tests are cached as None."""
+
+    def __init__(self, pool, max_entries=256, shared=None, shared_ttl=None):
+        self._pool = pool
+        self.max_entries = max_entries
+        self._shared = shared
+        self.shared_ttl = shared_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def _load(self, test_id):
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM tests WHERE test_id = %s", (test_id,))
+            row = cursor.fetchone()
+            if row is None:
+                cursor.close()
+                raise KeyError(f"Unknown test id {test_id}")
+            version = row[0]
+            cursor.execute(
+                "SELECT section_no, tag, draw_count FROM test_sections WHERE test_id = %s ORDER BY section_no",
+                (test_id,)
+            )
+            section_rows = cursor.fetchall()
+            if not section_rows:
+                cursor.close()
+                return version, None
+
+            cursor.execute(
+                "SELECT p.section_no, q.question_id, q.quest, q.correct_option "
+                "FROM test_pool p JOIN bank_questions q ON q.question_id = p.question_id "
+                "WHERE p.test_id = %s ORDER BY p.section_no, q.question_id",
+                (test_id,)
+            )
+            pool_rows = cursor.fetchall()
+            cursor.execute(
+                "SELECT o.question_id, o.option_text FROM test_pool p "
+                "JOIN bank_options o ON o.question_id = p.question_id "
+                "WHERE p.test_id = %s ORDER BY o.question_id, o.option_no",
+                (test_id,)
+            )
+            options = {}
+            for question_id, text in cursor.fetchall():
+                options.setdefault(question_id, []).append(text)
+            cursor.close()
+
+        sizes = Counter(r[0] for r in pool_rows)
+        sections = []
+        start = 0
+        for section_no, tag, count in section_rows:
+            end = start + sizes[section_no]
+            sections.append((tag, count, start, end))
+            start = end
+        blueprint = Blueprint(
+            test_id, version, sections,
+            np.array([r[1] for r in pool_rows], dtype=np.int32),
+            [r[2] for r in pool_rows],
+            [tuple(options[r[1]]) for r in pool_rows],
+            np.array([r[3] for r in pool_rows], dtype=np.int8)
+        )
+        return version, blueprint
+
+    def get(self, test_id, version):
+        with self._lock:
+            entry = self._entries.get(test_id)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(test_id)
+                return entry[1]
+
+        entry = read_through(self._shared, "blueprint", test_id, version, lambda: self._load(test_id),
+                             lambda e: e[0], self.shared_ttl)
+        with self._lock:
+            self._entries[test_id] = entry
+            self._entries.move_to_end(test_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry[1]
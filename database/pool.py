@@ -0,0 +1,195 @@
+"""Thread-safe MySQL connection pool shared by every Streamlit session."""
+import threading
+import time
+from contextlib import contextmanager
+
+import mysql.connector as cs
+
+from database.config import (
+    DB_BACKEND, DB_CONFIG, POOL_SIZE, POOL_TIMEOUT, REPLICA_CONFIG, REPLICA_SQLITE_PATH, SQLITE_PATH
+)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, size=10, timeout=30.0, health_check_interval=30.0, connect=None, profiler=None, **db_config):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._connect = connect or cs.connect
+        self.profiler = profiler
+        self._db_config = db_config
+
+        # Idle connections as (connection, last_returned, suspect) entries, most recently used last.
+        # Waiters sleep on the condition and are woken whenever a connection or a free slot comes back
+        self._idle = []
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._created = 0
+        self._in_use = 0
+
+        # Metrics
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._reconnects = 0
+        self._discarded = 0
+
+    def _open(self):
+        conn = self._connect(**self._db_config)
+        if not conn.is_connected():
+            raise cs.InterfaceError("Connection could not be established")
+        return conn
+
+    def _release_slot(self, discarded=True):
+        # The slot can be used to open a new connection, so one waiter is woken to take it
+        with self._available:
+            self._created -= 1
+            if discarded:
+                self._discarded += 1
+            self._available.notify()
+
+    def _healthy(self, conn, last_returned, suspect):
+        # Ping connections that failed during their last use, or sat idle long enough to have been dropped
+        if not suspect and time.monotonic() - last_returned < self.health_check_interval:
+            return True
+        try:
+            return conn.is_connected()
+        except Exception:
+            return False
+
+    def _take(self, deadline):
+        # Returns an idle (connection, last_returned, suspect) entry, or None after reserving a slot for a new one
+        with self._available:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    return None
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._available.wait(remaining)
+
+    def _acquire(self):
+        start = time.monotonic()
+        entry = self._take(start + self.timeout)
+        while True:
+            if entry is None:
+                try:
+                    conn = self._open()
+                except Exception:
+                    self._release_slot(discarded=False)
+                    raise
+                break
+
+            conn, last_returned, suspect = entry
+            if self._healthy(conn, last_returned, suspect):
+                break
+            # Dead connection: drop it and open a replacement in the same slot
+            self._close_quietly(conn)
+            try:
+                conn = self._open()
+                with self._lock:
+                    self._reconnects += 1
+                break
+            except Exception:
+                self._release_slot()
+                raise
+
+        waited = time.monotonic() - start
+        with self._lock:
+            self._in_use += 1
+            self._checkouts += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        return conn
+
+    def _release(self, conn, failed):
+        with self._lock:
+            self._in_use -= 1
+        try:
+            # Never hand the next session a half-finished transaction or stale snapshot
+            if failed or conn.in_transaction:
+                conn.rollback()
+            if not failed or conn.is_connected():
+                with self._available:
+                    # After an error the connection is pinged again before it is handed out
+                    self._idle.append((conn, time.monotonic(), failed))
+                    self._available.notify()
+                return
+        except Exception:
+            pass
+        self._close_quietly(conn)
+        self._release_slot()
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        conn = self._acquire()
+        failed = False
+        try:
+            yield self.profiler.wrap(conn) if self.profiler is not None else conn
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            self._release(conn, failed)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "avg_wait_ms": (self._wait_total / self._checkouts * 1000) if self._checkouts else 0.0,
+                "max_wait_ms": self._wait_max * 1000,
+                "timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+                "discarded": self._discarded,
+            }
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for conn, _, _ in idle:
+            self._close_quietly(conn)
+
+
+def create_pool(size=POOL_SIZE, timeout=POOL_TIMEOUT, profiler=None):
+    # Builds a pool for the configured backend
+    if DB_BACKEND == "sqlite":
+        from database import sqlite_adapter
+        return ConnectionPool(size=size, timeout=timeout, connect=sqlite_adapter.connect, profiler=profiler,
+                              database=SQLITE_PATH)
+    return ConnectionPool(size=size, timeout=timeout, profiler=profiler, **DB_CONFIG)
+
+
+def create_replica_pool(size, timeout=POOL_TIMEOUT, profiler=None):
+    # Builds a pool for the configured read replica, or returns None if there is none
+    if DB_BACKEND == "sqlite":
+        if not REPLICA_SQLITE_PATH:
+            return None
+        from database import sqlite_adapter
+        return ConnectionPool(size=size, timeout=timeout, connect=sqlite_adapter.connect, profiler=profiler,
+                              database=REPLICA_SQLITE_PATH)
+    if not REPLICA_CONFIG["host"]:
+        return None
+    return ConnectionPool(size=size, timeout=timeout, profiler=profiler, **REPLICA_CONFIG)
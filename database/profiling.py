@@ -0,0 +1,273 @@
+"""Query and page profiling: fingerprints, latencies, row counts and per-rerun totals."""
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+
+_STRING = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\?")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    # Statements that differ only in literals or IN-list length share a fingerprint
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _IN_LIST.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+def deep_sizeof(value):
+    """Approximate bytes held by `value` and the containers it references, counting each object once.
+
+    Objects that are also referenced elsewhere, such as cached question rows, are counted too: this is
+    what `value` keeps alive, not what it alone allocated.
+    """
+    seen = set()
+    stack = [value]
+    size = 0
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+    return size
+
+
+class _Rerun:
+    __slots__ = ("label", "started", "queries", "db_seconds", "spans", "fingerprints", "calls", "flags", "total",
+                 "state_bytes")
+
+    def __init__(self, label):
+        self.label = label
+        self.started = time.time()
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.spans = {}
+        self.fingerprints = Counter()
+        self.calls = Counter()
+        self.flags = []
+        self.total = 0.0
+        # Size of the session's state at the end of the rerun, if the caller measured it
+        self.state_bytes = None
+
+
+class ProfilingCursor:
+    def __init__(self, cursor, profiler):
+        self._cursor = cursor
+        self._profiler = profiler
+        self._fingerprint = None
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def _timed(self, method, sql, params):
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            self._fingerprint = fingerprint(sql)
+            self._profiler.record_query(self._fingerprint, time.perf_counter() - start)
+
+    def execute(self, sql, params=()):
+        return self._timed(self._cursor.execute, sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self._timed(self._cursor.executemany, sql, seq_of_params)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._profiler.record_rows(self._fingerprint, 1)
+        return row
+
+    def fetchmany(self, size=1):
+        rows = self._cursor.fetchmany(size)
+        self._profiler.record_rows(self._fingerprint, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._profiler.record_rows(self._fingerprint, len(rows))
+        return rows
+
+
+class ProfilingConnection:
+    def __init__(self, conn, profiler):
+        self._conn = conn
+        self._profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self, *args, **kwargs):
+        return ProfilingCursor(self._conn.cursor(*args, **kwargs), self._profiler)
+
+
+class Profiler:
+    def __init__(self, n_plus_one_threshold=5, history=100, prometheus_path=None, json_log_path=None,
+                 export_interval=10.0):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.prometheus_path = prometheus_path
+        self.json_log_path = json_log_path
+        self.export_interval = export_interval
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._queries = {}
+        self._spans = {}
+        self._reruns = deque(maxlen=history)
+        self._last_export = 0.0
+
+    def wrap(self, conn):
+        return ProfilingConnection(conn, self)
+
+    def _current(self):
+        return getattr(self._local, "rerun", None)
+
+    def in_rerun(self):
+        return self._current() is not None
+
+    def record_query(self, query_fingerprint, seconds):
+        with self._lock:
+            stats = self._queries.setdefault(query_fingerprint, {"count": 0, "seconds": 0.0, "max": 0.0, "rows": 0})
+            stats["count"] += 1
+            stats["seconds"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+        rerun = self._current()
+        if rerun is not None:
+            rerun.queries += 1
+            rerun.db_seconds += seconds
+            rerun.fingerprints[query_fingerprint] += 1
+
+    def record_rows(self, query_fingerprint, rows):
+        if query_fingerprint is None:
+            return
+        with self._lock:
+            stats = self._queries.get(query_fingerprint)
+            if stats is not None:
+                stats["rows"] += rows
+
+    def count_call(self, name):
+        rerun = self._current()
+        if rerun is not None:
+            rerun.calls[name] += 1
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            with self._lock:
+                stats = self._spans.setdefault(name, {"count": 0, "seconds": 0.0, "max": 0.0})
+                stats["count"] += 1
+                stats["seconds"] += seconds
+                stats["max"] = max(stats["max"], seconds)
+            rerun = self._current()
+            if rerun is not None:
+                rerun.spans[name] = rerun.spans.get(name, 0.0) + seconds
+
+    @contextmanager
+    def rerun(self, label):
+        rerun = self._local.rerun = _Rerun(label)
+        start = time.perf_counter()
+        try:
+            yield rerun
+        finally:
+            rerun.total = time.perf_counter() - start
+            self._local.rerun = None
+            # Repeating the same statement or helper many times in one rerun is usually an N+1 loop
+            for query_fingerprint, count in rerun.fingerprints.items():
+                if count >= self.n_plus_one_threshold:
+                    rerun.flags.append(f"{count}x query: {query_fingerprint}")
+            for name, count in rerun.calls.items():
+                if count >= self.n_plus_one_threshold:
+                    rerun.flags.append(f"{count}x call: {name}")
+            with self._lock:
+                self._reruns.append(rerun)
+            self._export(rerun)
+
+    def query_stats(self):
+        with self._lock:
+            return {key: dict(value) for key, value in self._queries.items()}
+
+    def span_stats(self):
+        with self._lock:
+            return {key: dict(value) for key, value in self._spans.items()}
+
+    def recent_reruns(self):
+        with self._lock:
+            reruns = list(self._reruns)
+        return [
+            {
+                "label": rerun.label,
+                "started": rerun.started,
+                "total_ms": rerun.total * 1000,
+                "db_ms": rerun.db_seconds * 1000,
+                "queries": rerun.queries,
+                "spans_ms": {name: seconds * 1000 for name, seconds in rerun.spans.items()},
+                "flags": list(rerun.flags),
+                "state_bytes": rerun.state_bytes,
+            }
+            for rerun in reversed(reruns)
+        ]
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self._spans.clear()
+            self._reruns.clear()
+
+    def prometheus_text(self):
+        lines = [
+            "# TYPE quiz_query_seconds_total counter",
+            "# TYPE quiz_query_calls_total counter",
+            "# TYPE quiz_query_rows_total counter",
+        ]
+        for query_fingerprint, stats in sorted(self.query_stats().items()):
+            label = query_fingerprint.replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'quiz_query_seconds_total{{query="{label}"}} {stats["seconds"]:.6f}')
+            lines.append(f'quiz_query_calls_total{{query="{label}"}} {stats["count"]}')
+            lines.append(f'quiz_query_rows_total{{query="{label}"}} {stats["rows"]}')
+        lines += ["# TYPE quiz_span_seconds_total counter", "# TYPE quiz_span_calls_total counter"]
+        for name, stats in sorted(self.span_stats().items()):
+            lines.append(f'quiz_span_seconds_total{{span="{name}"}} {stats["seconds"]:.6f}')
+            lines.append(f'quiz_span_calls_total{{span="{name}"}} {stats["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def _export(self, rerun):
+        if self.json_log_path:
+            record = {
+                "label": rerun.label,
+                "started": rerun.started,
+                "total_ms": round(rerun.total * 1000, 3),
+                "db_ms": round(rerun.db_seconds * 1000, 3),
+                "queries": rerun.queries,
+                "spans_ms": {name: round(seconds * 1000, 3) for name, seconds in rerun.spans.items()},
+                "flags": rerun.flags,
+                "state_bytes": rerun.state_bytes,
+            }
+            with self._lock, open(self.json_log_path, "a") as log:
+                log.write(json.dumps(record) + "\n")
+
+        if self.prometheus_path and time.monotonic() - self._last_export >= self.export_interval:
+            self._last_export = time.monotonic()
+            # Write-then-rename so the node exporter never reads a half-written file
+            tmp_path = f"{self.prometheus_path}.tmp"
+            with open(tmp_path, "w") as out:
+                out.write(self.prometheus_text())
+            os.replace(tmp_path, self.prometheus_path)
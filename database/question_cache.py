@@ -0,0 +1,111 @@
+"""LRU, memory-capped cache of question sets shared by every session."""
+import sys
+import threading
+from collections import OrderedDict
+
+from database.state import read_through
+
+
+def _estimate_size(rows):
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class QuestionSet:
+    __slots__ = ("test_id", "version", "rows", "student_rows", "size")
+
+    def __init__(self, test_id, version, rows):
+        self.test_id = test_id
+        self.version = version
+        # (q_no, quest, o1, o2, o3, o4, correct_ansr) rows, and the same rows without the answer
+        self.rows = tuple(tuple(row) for row in rows)
+        self.student_rows = tuple(row[:6] for row in self.rows)
+        self.size = _estimate_size(self.rows) + sys.getsizeof(self.student_rows) + \
+            sum(sys.getsizeof(row) for row in self.student_rows)
+
+
+class QuestionCache:
+    def __init__(self, pool, max_entries=256, max_bytes=64 * 1024 * 1024, shared=None, shared_ttl=None):
+        self._pool = pool
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        # Optional state backend through which other worker processes reuse loaded question sets
+        self._shared = shared
+        self.shared_ttl = shared_ttl
+        self._lock = threading.Lock()
+        self._sets = OrderedDict()
+        self._loading = {}
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _load(self, test_id):
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM tests WHERE test_id = %s", (test_id,))
+            row = cursor.fetchone()
+            if row is None:
+                cursor.close()
+                return QuestionSet(test_id, None, ())
+            cursor.execute(
+                "SELECT q_no, quest, o1, o2, o3, o4, correct_ansr FROM questions WHERE test_id = %s ORDER BY q_no",
+                (test_id,)
+            )
+            rows = cursor.fetchall()
+            cursor.close()
+        return QuestionSet(test_id, row[0], rows)
+
+    def _store(self, question_set):
+        old = self._sets.pop(question_set.test_id, None)
+        if old is not None:
+            self._bytes -= old.size
+        if question_set.version is None or question_set.size > self.max_bytes:
+            return
+        self._sets[question_set.test_id] = question_set
+        self._bytes += question_set.size
+        while self._sets and (len(self._sets) > self.max_entries or self._bytes > self.max_bytes):
+            _, evicted = self._sets.popitem(last=False)
+            self._bytes -= evicted.size
+            self._evictions += 1
+
+    def get(self, test_id, version):
+        while True:
+            with self._lock:
+                question_set = self._sets.get(test_id)
+                if question_set is not None and question_set.version == version:
+                    self._sets.move_to_end(test_id)
+                    self._hits += 1
+                    return question_set
+                loading = self._loading.get(test_id)
+                if loading is None:
+                    # This caller loads; everyone else asking for the same test waits for it
+                    self._misses += 1
+                    loading = self._loading[test_id] = threading.Event()
+                    break
+            loading.wait()
+
+        try:
+            question_set = read_through(self._shared, "questions", test_id, version, lambda: self._load(test_id),
+                                        lambda q: q.version, self.shared_ttl)
+            with self._lock:
+                self._store(question_set)
+            return question_set
+        finally:
+            with self._lock:
+                del self._loading[test_id]
+            loading.set()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._sets),
+                "bytes": self._bytes,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+            }
@@ -0,0 +1,178 @@
+"""Routing of read-only reporting queries away from exam traffic.
+
+Teacher reporting (test listings, results, score and item statistics,
+exports) goes through a ReportingRouter instead of the main pool, so a heavy
+results view can never take the connections that logins and submissions
+need. The router caps reporting concurrency and sends queries to a read
+replica while the replica is fresh enough. It falls back to its own small
+pool on the primary when no replica is configured, or when the replica is
+down or lagging.
+
+Replica lag is measured with a heartbeat: every app process regularly writes
+the current time into `replica_heartbeat` on the primary, and the router
+reads it back from the replica. Any replication setup works, and a replica
+that stops replicating shows up as stale even if the server is still
+reachable.
+"""
+import logging
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from database.config import REPLICA_MAX_LAG, REPORTING_CONCURRENCY, REPORTING_TIMEOUT
+from database.pool import PoolTimeout, create_pool, create_replica_pool
+
+logger = logging.getLogger(__name__)
+
+
+class ReportingRouter:
+    def __init__(self, primary, replica=None, max_lag=30.0, concurrency=3, timeout=30.0,
+                 heartbeat_interval=1.0, check_interval=2.0):
+        # `primary` should be a pool reserved for reporting, one connection larger than `concurrency`
+        # so the heartbeat never waits behind a long report
+        self._primary = primary
+        self._replica = replica
+        self.max_lag = max_lag
+        self.timeout = timeout
+        self.heartbeat_interval = heartbeat_interval
+        self.check_interval = check_interval
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self.concurrency = concurrency
+
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._lag = None
+        self._replica_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Metrics
+        self._routed = {"replica": 0, "primary": 0}
+        self._fallbacks = 0
+        self._waits = 0
+
+    def beat(self):
+        with self._primary.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO replica_heartbeat (id, beat_at) VALUES (1, %s) "
+                "ON DUPLICATE KEY UPDATE beat_at = VALUES(beat_at)",
+                (time.time(),)
+            )
+            conn.commit()
+            cursor.close()
+
+    def _measure_lag(self):
+        with self._replica.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT beat_at FROM replica_heartbeat WHERE id = 1")
+            row = cursor.fetchone()
+            cursor.close()
+        # No heartbeat has replicated yet, so nothing is known about the replica's freshness
+        return None if row is None else max(0.0, time.time() - float(row[0]))
+
+    def _replica_usable(self):
+        if self._replica is None:
+            return False
+        with self._lock:
+            fresh = self._checked_at is not None and time.monotonic() - self._checked_at < self.check_interval
+            if fresh:
+                return self._replica_error is None and self._lag is not None and self._lag <= self.max_lag
+            # Claim the check so concurrent callers use the previous result instead of piling onto the replica
+            self._checked_at = time.monotonic()
+
+        try:
+            lag, error = self._measure_lag(), None
+        except Exception as e:
+            lag, error = None, e
+        with self._lock:
+            if error is not None and self._replica_error is None:
+                logger.warning("Read replica unavailable, reporting falls back to the primary: %s", error)
+            self._lag, self._replica_error = lag, error
+            return error is None and lag is not None and lag <= self.max_lag
+
+    def _mark_replica_failed(self, error):
+        with self._lock:
+            if self._replica_error is None:
+                logger.warning("Read replica unavailable, reporting falls back to the primary: %s", error)
+            self._replica_error = error
+            self._checked_at = time.monotonic()
+
+    @contextmanager
+    def connection(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._waits += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                raise PoolTimeout(f"No reporting slot available after {self.timeout}s")
+        try:
+            with ExitStack() as stack:
+                conn = None
+                if self._replica_usable():
+                    try:
+                        conn = stack.enter_context(self._replica.connection())
+                        route = "replica"
+                    except Exception as e:
+                        self._mark_replica_failed(e)
+                if conn is None:
+                    conn = stack.enter_context(self._primary.connection())
+                    route = "primary"
+                with self._lock:
+                    self._routed[route] += 1
+                    if route == "primary" and self._replica is not None:
+                        self._fallbacks += 1
+                yield conn
+        finally:
+            self._slots.release()
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.beat()
+            except Exception as e:
+                logger.warning("Replica heartbeat failed: %s", e)
+
+    def start(self):
+        # Without a replica there is no lag to measure, so no heartbeat is written
+        if self._replica is not None and self._thread is None:
+            self.beat()
+            self._thread = threading.Thread(target=self._run, name="replica-heartbeat", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "replica": "none" if self._replica is None else ("error" if self._replica_error else "ok"),
+                "replica_lag_s": self._lag,
+                "max_lag_s": self.max_lag,
+                "concurrency": self.concurrency,
+                "routed_replica": self._routed["replica"],
+                "routed_primary": self._routed["primary"],
+                "fallbacks": self._fallbacks,
+                "slot_waits": self._waits,
+            }
+        stats["primary_pool"] = self._primary.stats()
+        if self._replica is not None:
+            stats["replica_pool"] = self._replica.stats()
+        return stats
+
+    def close(self):
+        self.stop()
+        self._primary.close()
+        if self._replica is not None:
+            self._replica.close()
+
+
+def create_reporting_router(concurrency=REPORTING_CONCURRENCY, max_lag=REPLICA_MAX_LAG, timeout=REPORTING_TIMEOUT,
+                            profiler=None):
+    # Builds a router over a reporting pool on the configured primary and, if one is configured, the replica
+    primary = create_pool(size=concurrency + 1, timeout=timeout, profiler=profiler)
+    replica = create_replica_pool(size=concurrency, timeout=timeout, profiler=profiler)
+    return ReportingRouter(primary, replica, max_lag=max_lag, concurrency=concurrency, timeout=timeout)
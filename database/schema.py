@@ -0,0 +1,237 @@
+"""Shared tables used by every test, replacing the per-test `<test>` and `<test>_ans` tables."""
+import logging
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS accounts (
+        name VARCHAR(100),
+        pass INT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tests (
+        test_id INT AUTO_INCREMENT PRIMARY KEY,
+        test_name VARCHAR(100) NOT NULL,
+        version INT NOT NULL DEFAULT 1,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (test_name)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS questions (
+        test_id INT NOT NULL,
+        q_no INT NOT NULL,
+        quest VARCHAR(200) NOT NULL,
+        o1 VARCHAR(150),
+        o2 VARCHAR(150),
+        o3 VARCHAR(150),
+        o4 VARCHAR(150),
+        correct_ansr INT NOT NULL,
+        PRIMARY KEY (test_id, q_no),
+        FOREIGN KEY (test_id) REFERENCES tests (test_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS attempts (
+        attempt_id INT AUTO_INCREMENT PRIMARY KEY,
+        test_id INT NOT NULL,
+        student VARCHAR(100) NOT NULL,
+        marks INT NOT NULL,
+        total INT NOT NULL,
+        submitted_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        submission_key VARCHAR(64),
+        UNIQUE (test_id, student),
+        FOREIGN KEY (test_id) REFERENCES tests (test_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS responses (
+        attempt_id INT NOT NULL,
+        q_no INT NOT NULL,
+        answer INT,
+        PRIMARY KEY (attempt_id, q_no),
+        FOREIGN KEY (attempt_id) REFERENCES attempts (attempt_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS score_histogram (
+        test_id INT NOT NULL,
+        marks INT NOT NULL,
+        attempts INT NOT NULL,
+        PRIMARY KEY (test_id, marks),
+        FOREIGN KEY (test_id) REFERENCES tests (test_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS item_stats (
+        test_id INT NOT NULL,
+        q_no INT NOT NULL,
+        seen INT NOT NULL,
+        correct INT NOT NULL,
+        sum_marks BIGINT NOT NULL,
+        sum_marks_sq BIGINT NOT NULL,
+        sum_marks_correct BIGINT NOT NULL,
+        PRIMARY KEY (test_id, q_no),
+        FOREIGN KEY (test_id) REFERENCES tests (test_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS item_options (
+        test_id INT NOT NULL,
+        q_no INT NOT NULL,
+        answer INT NOT NULL,
+        picks INT NOT NULL,
+        PRIMARY KEY (test_id, q_no, answer),
+        FOREIGN KEY (test_id) REFERENCES tests (test_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS test_schedules (
+        test_id INT PRIMARY KEY,
+        opens_at DOUBLE NOT NULL,
+        closes_at DOUBLE NOT NULL,
+        duration INT NOT NULL,
+        stagger INT NOT NULL DEFAULT 0,
+        FOREIGN KEY (test_id) REFERENCES tests (test_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS exam_sessions (
+        test_id INT NOT NULL,
+        student VARCHAR(100) NOT NULL,
+        started_at DOUBLE NOT NULL,
+        deadline DOUBLE NOT NULL,
+        finished TINYINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (test_id, student),
+        FOREIGN KEY (test_id) REFERENCES tests (test_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS replica_heartbeat (
+        id INT PRIMARY KEY,
+        beat_at DOUBLE NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bank_questions (
+        question_id INT AUTO_INCREMENT PRIMARY KEY,
+        question_key VARCHAR(64) NOT NULL,
+        quest VARCHAR(200) NOT NULL,
+        correct_option INT NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (question_key)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bank_options (
+        question_id INT NOT NULL,
+        option_no INT NOT NULL,
+        option_text VARCHAR(150) NOT NULL,
+        PRIMARY KEY (question_id, option_no),
+        FOREIGN KEY (question_id) REFERENCES bank_questions (question_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bank_tags (
+        tag VARCHAR(50) NOT NULL,
+        question_id INT NOT NULL,
+        PRIMARY KEY (tag, question_id),
+        FOREIGN KEY (question_id) REFERENCES bank_questions (question_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS test_sections (
+        test_id INT NOT NULL,
+        section_no INT NOT NULL,
+        tag VARCHAR(50) NOT NULL,
+        draw_count INT NOT NULL,
+        PRIMARY KEY (test_id, section_no),
+        FOREIGN KEY (test_id) REFERENCES tests (test_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS test_pool (
+        test_id INT NOT NULL,
+        section_no INT NOT NULL,
+        question_id INT NOT NULL,
+        PRIMARY KEY (test_id, section_no, question_id),
+        FOREIGN KEY (test_id) REFERENCES tests (test_id) ON DELETE CASCADE,
+        FOREIGN KEY (question_id) REFERENCES bank_questions (question_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS attempt_drafts (
+        test_id INT NOT NULL,
+        student VARCHAR(100) NOT NULL,
+        version INT NOT NULL,
+        submission_key VARCHAR(64) NOT NULL,
+        current_question INT NOT NULL DEFAULT 0,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (test_id, student),
+        FOREIGN KEY (test_id) REFERENCES tests (test_id) ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS draft_responses (
+        test_id INT NOT NULL,
+        student VARCHAR(100) NOT NULL,
+        q_no INT NOT NULL,
+        answer INT NOT NULL,
+        PRIMARY KEY (test_id, student, q_no),
+        FOREIGN KEY (test_id) REFERENCES tests (test_id) ON DELETE CASCADE
+    )
+    """,
+]
+
+
+# Columns added after a table was first released, as (table, column, definition)
+UPGRADES = [
+    ("tests", "version", "INT NOT NULL DEFAULT 1"),
+    ("attempts", "submission_key", "VARCHAR(64)"),
+    ("accounts", "pass_hash", "VARCHAR(255)"),
+    ("responses", "correct", "TINYINT"),
+]
+
+# Secondary indexes, as (table, index name, columns, unique)
+INDEXES = [
+    ("attempts", "idx_attempts_student", "student, test_id", False),
+    ("attempts", "idx_attempts_submission_key", "submission_key", True),
+    ("accounts", "idx_accounts_name", "name", True),
+    ("exam_sessions", "idx_exam_sessions_deadline", "finished, deadline", False),
+]
+
+
+def _columns(cursor, table):
+    cursor.execute(f"SELECT * FROM {table} LIMIT 0")
+    cursor.fetchall()
+    return {column[0].lower() for column in cursor.description}
+
+
+def _indexes(cursor, table):
+    cursor.execute(f"SHOW INDEX FROM {table}")
+    return {row[2] for row in cursor.fetchall()}
+
+
+def ensure_schema(pool):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        for statement in SCHEMA:
+            cursor.execute(statement)
+        for table, column, definition in UPGRADES:
+            if column not in _columns(cursor, table):
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        for table, index, columns, unique in INDEXES:
+            if index in _indexes(cursor, table):
+                continue
+            try:
+                cursor.execute(f"CREATE {'UNIQUE ' if unique else ''}INDEX {index} ON {table} ({columns})")
+            except Exception as e:
+                if not unique:
+                    raise
+                # Existing duplicate rows block a unique index; index the columns anyway so lookups stay fast
+                logger.warning("Could not create unique index %s on %s, creating a plain index: %s", index, table, e)
+                cursor.execute(f"CREATE INDEX {index} ON {table} ({columns})")
+        conn.commit()
+        cursor.close()
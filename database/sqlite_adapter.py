@@ -0,0 +1,100 @@
+"""SQLite stand-in exposing the subset of the mysql.connector API the app uses.
+
+Lets benchmarks and local development run without a MySQL server
+(QUIZ_DB_BACKEND=sqlite). Only the MySQL constructs that appear in this
+code base are translated; it is not a general MySQL emulator.
+"""
+import re
+import sqlite3
+
+_TRANSLATIONS = [
+    (re.compile(r"\bINT AUTO_INCREMENT PRIMARY KEY\b", re.I), "INTEGER PRIMARY KEY AUTOINCREMENT"),
+    (re.compile(r"\bINSERT IGNORE\b", re.I), "INSERT OR IGNORE"),
+    (re.compile(r"\bON DUPLICATE KEY UPDATE\b", re.I), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\bVALUES\((\w+)\)", re.I), r"excluded.\1"),
+    (re.compile(r"^\s*SHOW TABLES\s*$", re.I), "SELECT name FROM sqlite_master WHERE type = 'table'"),
+    (re.compile(r"^\s*SHOW INDEX FROM (\w+)\s*$", re.I),
+     r"SELECT tbl_name, 0, name FROM sqlite_master WHERE type = 'index' AND tbl_name = '\1'"),
+    (re.compile(r"`"), '"'),
+    (re.compile(r"%s"), "?"),
+]
+
+
+def translate(sql):
+    for pattern, replacement in _TRANSLATIONS:
+        sql = pattern.sub(replacement, sql)
+    return sql
+
+
+class SQLiteCursor:
+    def __init__(self, conn):
+        self._cursor = conn.cursor()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, sql, params=()):
+        self._cursor.execute(translate(sql), tuple(params))
+
+    def executemany(self, sql, seq_of_params):
+        self._cursor.executemany(translate(sql), [tuple(params) for params in seq_of_params])
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchmany(self, size=1):
+        return self._cursor.fetchmany(size)
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def close(self):
+        self._cursor.close()
+
+
+class SQLiteConnection:
+    def __init__(self, database, timeout=30.0):
+        self._conn = sqlite3.connect(
+            database, timeout=timeout, check_same_thread=False, detect_types=sqlite3.PARSE_DECLTYPES
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._open = True
+
+    def cursor(self, buffered=None):
+        return SQLiteCursor(self._conn)
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def is_connected(self):
+        return self._open
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if not self._open:
+            raise sqlite3.ProgrammingError("Connection is closed")
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._open = False
+        self._conn.close()
+
+
+def connect(database, **_ignored):
+    # host/user/password are accepted and ignored so the same DB_CONFIG shape works
+    return SQLiteConnection(database)
@@ -0,0 +1,154 @@
+"""Key-value state shared by app workers: session tokens, live attempt progress and cached test data.
+
+The default in-memory backend keeps everything inside one process. With the
+SQLite backend (one host) or a Redis-compatible server (any number of hosts),
+several app processes can sit behind a load balancer. A refresh or reconnect
+can then be served by any worker, and a test loaded by one worker is reused
+by the others. Values are pickled, so only point this at a store the app
+alone can write to.
+"""
+import pickle
+import sqlite3
+import threading
+import time
+
+# Expired entries are swept after this many writes
+_PURGE_EVERY = 1000
+
+
+class MemoryState:
+    shared = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._writes = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[0]
+
+    def set(self, key, value, ttl=None):
+        with self._lock:
+            self._entries[key] = (value, None if ttl is None else time.monotonic() + ttl)
+            self._writes += 1
+            if self._writes % _PURGE_EVERY == 0:
+                now = time.monotonic()
+                for stale in [k for k, (_, expires) in self._entries.items() if expires is not None and expires < now]:
+                    del self._entries[stale]
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"backend": "memory", "entries": len(self._entries)}
+
+
+class SQLiteState:
+    """State in a local SQLite (WAL) file, shared by every worker process on the host."""
+    shared = True
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS state (
+                key TEXT PRIMARY KEY,
+                value BLOB NOT NULL,
+                expires_at REAL
+            )
+        """)
+        self._writes = 0
+
+    def get(self, key):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT value FROM state WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, data, None if ttl is None else time.time() + ttl)
+            )
+            self._writes += 1
+            if self._writes % _PURGE_EVERY == 0:
+                self._db.execute("DELETE FROM state WHERE expires_at < ?", (time.time(),))
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def stats(self):
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM state").fetchone()[0]
+        return {"backend": "sqlite", "entries": entries}
+
+
+class RedisState:
+    """State in Redis or a compatible server (Valkey, KeyDB, ...), shared by workers on any host."""
+    shared = True
+
+    def __init__(self, url, namespace="quiz:"):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("The redis state backend needs the redis package (pip install redis)")
+        self._client = redis.Redis.from_url(url)
+        self.namespace = namespace
+
+    def get(self, key):
+        data = self._client.get(self.namespace + key)
+        return None if data is None else pickle.loads(data)
+
+    def set(self, key, value, ttl=None):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._client.set(self.namespace + key, data, px=None if ttl is None else max(1, int(ttl * 1000)))
+
+    def delete(self, key):
+        self._client.delete(self.namespace + key)
+
+    def stats(self):
+        return {"backend": "redis", "entries": self._client.dbsize()}
+
+
+def create_state(backend="memory", path="state.sqlite3", url="redis://localhost:6379/0"):
+    if backend == "memory":
+        return MemoryState()
+    if backend == "sqlite":
+        return SQLiteState(path)
+    if backend == "redis":
+        return RedisState(url)
+    raise ValueError(f"Unknown state backend {backend!r}; expected memory, sqlite or redis")
+
+
+def read_through(shared, namespace, test_id, version, load, version_of, ttl=None):
+    """Return a test's cached data for `version` from `shared`, or `load()` it and share it.
+
+    Entries are keyed by test id and version, and a version's content never
+    changes, so workers cannot see stale data. `shared` may be None.
+    """
+    if shared is None:
+        return load()
+    value = shared.get(f"{namespace}:{test_id}:{version}")
+    if value is None:
+        value = load()
+        loaded_version = version_of(value)
+        if loaded_version is not None:
+            shared.set(f"{namespace}:{test_id}:{loaded_version}", value, ttl)
+    return value
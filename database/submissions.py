@@ -0,0 +1,260 @@
+"""Write-behind queue that absorbs exam-end submission bursts.
+
+Submissions are scored and appended to a local SQLite (WAL) file, which is
+the acknowledgement the student sees. A background worker then moves them to
+MySQL in batches, one transaction per batch. Every submission carries an
+idempotency key stored in `attempts.submission_key`, so a retried batch, a
+double click or a restarted worker never records a score twice.
+
+A delivery only counts against a submission when the database was reachable
+and rejected it; during an outage the queue backs off and keeps everything.
+Submissions that keep failing are parked and can be requeued once fixed.
+"""
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+import mysql.connector as cs
+
+from database.analytics import record_item_stats, record_scores
+from database.pool import PoolTimeout
+
+logger = logging.getLogger(__name__)
+
+# After this many failed deliveries a submission is parked for manual inspection
+MAX_DELIVERY_ATTEMPTS = 10
+
+# Errors that say the database is down, saturated or dropped the connection, not that a submission is bad
+UNAVAILABLE_ERRORS = (PoolTimeout, cs.InterfaceError, cs.OperationalError, sqlite3.OperationalError)
+
+
+class SubmissionQueue:
+    def __init__(self, pool, path, batch_size=200, flush_interval=0.5, retry_delay=2.0):
+        self._pool = pool
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS pending (
+                submission_key TEXT PRIMARY KEY,
+                test_id INTEGER NOT NULL,
+                student TEXT NOT NULL,
+                marks INTEGER NOT NULL,
+                total INTEGER NOT NULL,
+                responses TEXT NOT NULL,
+                enqueued_at REAL NOT NULL,
+                deliveries INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        """)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._delivered = 0
+        self._batches = 0
+
+    def submit(self, submission_key, test_id, student, marks, total, responses):
+        # Durable once this returns; a repeated key is ignored so retries are harmless
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO pending (submission_key, test_id, student, marks, total, responses, enqueued_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (submission_key, test_id, student, marks, total, json.dumps(responses), time.time())
+            )
+            queued = cursor.rowcount == 1
+        self._wake.set()
+        return queued
+
+    def _next_batch(self, limit):
+        with self._lock:
+            return self._db.execute(
+                "SELECT submission_key, test_id, student, marks, total, responses FROM pending "
+                "WHERE deliveries < ? ORDER BY enqueued_at LIMIT ?",
+                (MAX_DELIVERY_ATTEMPTS, limit)
+            ).fetchall()
+
+    def _remove(self, keys):
+        with self._lock:
+            self._db.executemany("DELETE FROM pending WHERE submission_key = ?", [(key,) for key in keys])
+
+    def _mark_failed(self, keys, error):
+        with self._lock:
+            self._db.executemany(
+                "UPDATE pending SET deliveries = deliveries + 1, last_error = ? WHERE submission_key = ?",
+                [(str(error), key) for key in keys]
+            )
+
+    def _deliver(self, batch):
+        keys = [row[0] for row in batch]
+        key_marks = ", ".join(["%s"] * len(keys))
+        students = sorted({row[2] for row in batch})
+        student_marks = ", ".join(["%s"] * len(students))
+
+        with self._pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                # Skip anything already recorded, by key or by (test, student)
+                cursor.execute(f"SELECT submission_key FROM attempts WHERE submission_key IN ({key_marks})", keys)
+                done_keys = {row[0] for row in cursor.fetchall()}
+                cursor.execute(f"SELECT test_id, student FROM attempts WHERE student IN ({student_marks})", students)
+                done_pairs = set(cursor.fetchall())
+
+                new_rows = []
+                for row in batch:
+                    pair = (row[1], row[2])
+                    if row[0] in done_keys or pair in done_pairs:
+                        continue
+                    done_pairs.add(pair)
+                    new_rows.append(row)
+
+                if new_rows:
+                    cursor.executemany(
+                        "INSERT INTO attempts (test_id, student, marks, total, submission_key) VALUES (%s, %s, %s, %s, %s)",
+                        [(test_id, student, marks, total, key) for key, test_id, student, marks, total, _ in new_rows]
+                    )
+                    new_keys = [row[0] for row in new_rows]
+                    cursor.execute(
+                        f"SELECT submission_key, attempt_id FROM attempts "
+                        f"WHERE submission_key IN ({', '.join(['%s'] * len(new_keys))})",
+                        new_keys
+                    )
+                    attempt_ids = dict(cursor.fetchall())
+
+                    # Submissions queued before correctness was recorded hold (q_no, answer) pairs
+                    parsed = [
+                        (row, [(q_no, answer, (flag or [None])[0]) for q_no, answer, *flag in json.loads(row[5])])
+                        for row in new_rows
+                    ]
+                    response_rows = [
+                        (attempt_ids[row[0]], q_no, answer, correct)
+                        for row, responses in parsed
+                        for q_no, answer, correct in responses
+                    ]
+                    if response_rows:
+                        cursor.executemany(
+                            "INSERT INTO responses (attempt_id, q_no, answer, correct) VALUES (%s, %s, %s, %s)",
+                            response_rows
+                        )
+                    record_scores(cursor, Counter((test_id, marks) for _, test_id, _, marks, _, _ in new_rows))
+                    record_item_stats(cursor, [(row[1], row[3], responses) for row, responses in parsed])
+                    # A recorded attempt no longer needs its autosaved draft
+                    pairs = [(test_id, student) for _, test_id, student, _, _, _ in new_rows]
+                    cursor.executemany("DELETE FROM draft_responses WHERE test_id = %s AND student = %s", pairs)
+                    cursor.executemany("DELETE FROM attempt_drafts WHERE test_id = %s AND student = %s", pairs)
+
+                conn.commit()
+                cursor.close()
+            except Exception:
+                conn.rollback()
+                cursor.close()
+                raise
+        return keys
+
+    def drain_once(self):
+        batch = self._next_batch(self.batch_size)
+        if not batch:
+            return 0
+        try:
+            delivered = self._deliver(batch)
+        except UNAVAILABLE_ERRORS as e:
+            # Nothing is wrong with the submissions, so the attempt is not counted against them
+            logger.warning("Database unavailable, %d submissions wait for the next retry: %s", len(batch), e)
+            self._stop.wait(self.retry_delay)
+            return 0
+        except Exception as e:
+            logger.warning("Submission batch of %d failed, retrying one by one: %s", len(batch), e)
+            # Isolate the failing submission so it cannot hold back the rest of the batch
+            delivered = []
+            for row in batch:
+                try:
+                    delivered += self._deliver([row])
+                except UNAVAILABLE_ERRORS as row_error:
+                    logger.warning("Database unavailable, submissions wait for the next retry: %s", row_error)
+                    break
+                except Exception as row_error:
+                    logger.error("Submission %s failed: %s", row[0], row_error)
+                    self._mark_failed([row[0]], row_error)
+        self._remove(delivered)
+        self._delivered += len(delivered)
+        self._batches += 1
+        if len(delivered) < len(batch):
+            # Back off instead of spinning on submissions that just failed
+            self._stop.wait(self.retry_delay)
+        return len(delivered)
+
+    def parked(self, limit=100):
+        """Return up to `limit` parked submissions as (submission_key, test_id, student, deliveries, last_error)."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT submission_key, test_id, student, deliveries, last_error FROM pending "
+                "WHERE deliveries >= ? ORDER BY enqueued_at LIMIT ?",
+                (MAX_DELIVERY_ATTEMPTS, limit)
+            ).fetchall()
+
+    def requeue_parked(self, keys=None):
+        """Give parked submissions (all of them, or those in `keys`) a fresh set of delivery attempts."""
+        with self._lock:
+            if keys is None:
+                cursor = self._db.execute(
+                    "UPDATE pending SET deliveries = 0 WHERE deliveries >= ?", (MAX_DELIVERY_ATTEMPTS,)
+                )
+                requeued = cursor.rowcount
+            else:
+                requeued = 0
+                for key in keys:
+                    requeued += self._db.execute(
+                        "UPDATE pending SET deliveries = 0 WHERE submission_key = ? AND deliveries >= ?",
+                        (key, MAX_DELIVERY_ATTEMPTS)
+                    ).rowcount
+        self._wake.set()
+        return requeued
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                while self.drain_once() and not self._stop.is_set():
+                    pass
+            except Exception:
+                logger.exception("Submission worker error")
+                self._stop.wait(self.retry_delay)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="submission-writer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, drain=True):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if drain:
+            self._stop.clear()
+            while self.drain_once():
+                pass
+
+    def stats(self):
+        with self._lock:
+            pending, parked = self._db.execute(
+                "SELECT COALESCE(SUM(deliveries < ?), 0), COALESCE(SUM(deliveries >= ?), 0) FROM pending",
+                (MAX_DELIVERY_ATTEMPTS, MAX_DELIVERY_ATTEMPTS)
+            ).fetchone()
+        return {
+            "pending": pending,
+            "parked": parked,
+            "delivered": self._delivered,
+            "batches": self._batches,
+        }
@@ -0,0 +1,15 @@
+import pytest
+
+from database import sqlite_adapter
+from database.pool import ConnectionPool
+from database.schema import ensure_schema
+
+
+@pytest.fixture
+def pool(tmp_path):
+    # A fresh SQLite stand-in database per test, so no MySQL server is needed
+    pool = ConnectionPool(size=2, timeout=5.0, connect=sqlite_adapter.connect,
+                          database=str(tmp_path / "quiz.sqlite3"))
+    ensure_schema(pool)
+    yield pool
+    pool.close()
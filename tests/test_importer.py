@@ -0,0 +1,170 @@
+import io
+import json
+
+import pytest
+
+from database.importer import RowError, detect_format, import_questions, iter_csv, iter_gift, iter_json, iter_jsonl
+
+
+def parse(reader, text, **kwargs):
+    return list(reader(io.StringIO(text), **kwargs))
+
+
+def test_detect_format():
+    assert detect_format("questions.CSV") == "csv"
+    assert detect_format("moodle.txt") == "gift"
+    assert detect_format("dump.jsonl") == "jsonl"
+    with pytest.raises(ValueError):
+        detect_format("questions.xlsx")
+
+
+# GIFT
+
+def test_gift_escapes_and_title():
+    [(location, question)] = parse(iter_gift, "::Title:: Is 1\\=1 \\{really\\}\\: yes? {=Yes #right ~No ~Maybe}\n")
+    assert location == "line 1"
+    assert question == {'question': "Is 1=1 {really}: yes?", 'options': ["Yes", "No", "Maybe"], 'correct': 1,
+                        'tags': []}
+
+
+def test_gift_escaped_answer_markers_stay_in_the_option():
+    [(_, question)] = parse(iter_gift, "Pick one {~a\\=b =c\\~d ~e\\#f}\n")
+    assert question['options'] == ["a=b", "c~d", "e#f"]
+    assert question['correct'] == 2
+
+
+def test_gift_weights_mark_the_correct_answer():
+    [(_, question)] = parse(iter_gift, "Weighted {~%0%A ~%100%B ~%-50%C}\n")
+    assert question['options'] == ["A", "B", "C"]
+    assert question['correct'] == 2
+
+
+def test_gift_multi_line_question_and_fill_in_text():
+    text = "// a comment\nThe capital of France\n{\n  =Paris\n  ~Lyon\n} is on the Seine.\n"
+    [(location, question)] = parse(iter_gift, text)
+    assert location == "line 2"
+    assert question['question'] == "The capital of France _____ is on the Seine."
+    assert question['options'] == ["Paris", "Lyon"]
+
+
+def test_gift_category_becomes_the_tag_of_following_questions():
+    text = (
+        "$CATEGORY: $course$/Science/Physics\n\n"
+        "Q1 {=a ~b}\n\n"
+        "$CATEGORY: $course$/Maths\n"
+        "Q2 {=a ~b}\n\n"
+        "Q3 {=a ~b}\n"
+    )
+    results = parse(iter_gift, text)
+    assert [(location, q['tags']) for location, q in results] == [
+        ("line 3", ["Physics"]), ("line 6", ["Maths"]), ("line 8", ["Maths"])
+    ]
+
+
+def test_gift_malformed_questions_are_reported_at_their_first_line():
+    text = "No answers here\n\nTrue or false {T}\n\n// skipped\nTwo right {=a =b ~c}\n\nGood {=a ~b}\n"
+    results = parse(iter_gift, text)
+    assert [location for location, _ in results] == ["line 1", "line 3", "line 6", "line 8"]
+    assert [type(result) for _, result in results[:3]] == [RowError] * 3
+    assert "no {answers} block" in str(results[0][1])
+    assert "Only multiple-choice" in str(results[1][1])
+    assert "exactly one correct answer, found 2" in str(results[2][1])
+    assert isinstance(results[3][1], dict)
+
+
+# JSON
+
+def json_items(count):
+    # Quotes, brackets and non-ASCII text inside strings must not confuse the incremental decoder
+    return [
+        {"question": f"Q{i} \"quoted\" ] }} é", "options": ["a", "b", "c"], "correct": "B", "tags": "x;y"}
+        for i in range(1, count + 1)
+    ]
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 7, 64, 1 << 16])
+def test_json_items_split_across_read_chunks(read_size):
+    text = json.dumps(json_items(5), indent=2)
+    results = parse(iter_json, text, read_size=read_size)
+    assert [location for location, _ in results] == [f"item {i}" for i in range(1, 6)]
+    assert results[4][1] == {'question': 'Q5 "quoted" ] } é', 'options': ["a", "b", "c"], 'correct': 2,
+                             'tags': ["x", "y"]}
+
+
+def test_json_invalid_items_keep_their_item_numbers():
+    items = json_items(3)
+    items[1] = ["not", "an", "object"]
+    items[2]["options"] = "abc"
+    results = parse(iter_json, json.dumps(items), read_size=5)
+    assert isinstance(results[0][1], dict)
+    assert results[1][0] == "item 2" and isinstance(results[1][1], RowError)
+    assert results[2][0] == "item 3" and "options must be a list of strings" in str(results[2][1])
+
+
+def test_json_empty_array():
+    assert parse(iter_json, "  \n [ ] ") == []
+
+
+@pytest.mark.parametrize("text, message", [
+    ('{"question": "x"}', "must contain an array"),
+    ('[{"question": "x", "options": ["a"], "correct": 1}', "not closed"),
+    ('[{"question": "x", "options": ["a"], "correct": 1}, {"question" "y"}]', "after item 1"),
+])
+def test_json_malformed_file(text, message):
+    with pytest.raises(ValueError, match=message):
+        parse(iter_json, text, read_size=4)
+
+
+def test_jsonl_reports_line_numbers_and_skips_blank_lines():
+    item = json.dumps({"question": "Q", "options": ["a", "b"], "correct": 1})
+    results = parse(iter_jsonl, f"{item}\n\nnot json\n{item}\n")
+    assert [location for location, _ in results] == ["line 1", "line 3", "line 4"]
+    assert isinstance(results[1][1], RowError)
+
+
+# CSV
+
+def test_csv_columns_letters_and_tags():
+    text = "Question,O1,O2,O3,Correct,Tags\nQ1,a,b,,B,x;y\nQ2,a,b,c,3,\n"
+    assert parse(iter_csv, text) == [
+        ("line 2", {'question': "Q1", 'options': ["a", "b"], 'correct': 2, 'tags': ["x", "y"]}),
+        ("line 3", {'question': "Q2", 'options': ["a", "b", "c"], 'correct': 3, 'tags': [""]}),
+    ]
+
+
+def test_csv_multi_line_records_are_reported_at_their_first_line():
+    text = 'question,option1,option2,correct\n\n"two\nlines",a,b,1\nQ3,a,b,two\n\nQ4,a,b,2\n'
+    results = parse(iter_csv, text)
+    assert [location for location, _ in results] == ["line 3", "line 5", "line 7"]
+    assert results[0][1]['question'] == "two\nlines"
+    assert isinstance(results[1][1], RowError)
+
+
+def test_csv_header_without_required_columns():
+    with pytest.raises(ValueError, match="CSV header"):
+        parse(iter_csv, "text,a,b\nQ,1,2\n")
+
+
+# End to end against the SQLite stand-in
+
+def test_import_report_lists_invalid_rows_and_rolls_back(pool):
+    text = "Good {=a ~b}\n\nNo answers\n\nOnly one option {=a}\n"
+    report = import_questions(pool, io.StringIO(text), "gift", tags=["demo"], chunk_size=1)
+    assert report["committed"] is False
+    assert report["imported"] == 0
+    assert report["invalid"] == 2
+    assert [location for location, _ in report["errors"]] == ["line 3", "line 5"]
+
+
+def test_import_skip_invalid_keeps_the_valid_rows(pool):
+    # Questions of a fixed test need exactly four options
+    text = "question,o1,o2,o3,o4,correct\nQ1,a,b,c,d,1\nQ2,a,b,c,d,9\nQ3,a,b,c,d,2\n"
+    report = import_questions(pool, io.StringIO(text), "csv", test_name="Imported", skip_invalid=True)
+    assert report["committed"] is True
+    assert (report["imported"], report["invalid"]) == (2, 1)
+    assert report["errors"][0][0] == "line 3"
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT q_no, quest FROM questions WHERE test_id = %s ORDER BY q_no", (report["test_id"],))
+        assert cursor.fetchall() == [(1, "Q1"), (2, "Q3")]
+        cursor.close()
@@ -0,0 +1,134 @@
+import pytest
+
+from database import sqlite_adapter
+from database.authoring import create_tests
+from database.pool import ConnectionPool
+from database.submissions import MAX_DELIVERY_ATTEMPTS, SubmissionQueue
+
+QUESTIONS = [{'question': f"Q{i}", 'options': ["a", "b", "c", "d"], 'correct': 1} for i in range(1, 4)]
+RESPONSES = [(1, 1, 1), (2, 2, 0), (3, 0, 0)]
+
+
+@pytest.fixture
+def test_id(pool):
+    return create_tests(pool, [("Queue test", QUESTIONS)])[0]
+
+
+@pytest.fixture
+def queue(pool, tmp_path):
+    # No worker thread: each test drains explicitly, without back-off sleeps
+    queue = SubmissionQueue(pool, str(tmp_path / "submissions.db"), retry_delay=0)
+    yield queue
+    queue._db.close()
+
+
+def fetch(pool, sql, params=()):
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+        cursor.close()
+    return rows
+
+
+def recorded(pool, test_id):
+    return {
+        "attempts": fetch(pool, "SELECT student, marks, submission_key FROM attempts WHERE test_id = %s ORDER BY student",
+                          (test_id,)),
+        "responses": fetch(pool, "SELECT COUNT(*) FROM responses")[0][0],
+        "histogram": fetch(pool, "SELECT marks, attempts FROM score_histogram WHERE test_id = %s", (test_id,)),
+    }
+
+
+def drain(queue):
+    while queue.drain_once():
+        pass
+
+
+def test_submissions_are_delivered_in_one_batch(pool, queue, test_id):
+    assert queue.submit("k1", test_id, "alice", 1, 3, RESPONSES)
+    assert queue.submit("k2", test_id, "bob", 1, 3, RESPONSES)
+    drain(queue)
+    assert recorded(pool, test_id) == {
+        "attempts": [("alice", 1, "k1"), ("bob", 1, "k2")],
+        "responses": 6,
+        "histogram": [(1, 2)],
+    }
+    assert queue.stats() == {"pending": 0, "parked": 0, "delivered": 2, "batches": 1}
+
+
+def test_duplicate_key_is_queued_once(pool, queue, test_id):
+    assert queue.submit("k1", test_id, "alice", 1, 3, RESPONSES)
+    assert not queue.submit("k1", test_id, "alice", 1, 3, RESPONSES)
+    assert queue.stats()["pending"] == 1
+
+
+def test_retried_batch_is_not_recorded_twice(pool, queue, test_id):
+    # The batch was committed but the worker died before removing it from the queue
+    queue.submit("k1", test_id, "alice", 1, 3, RESPONSES)
+    queue._deliver(queue._next_batch(10))
+    drain(queue)
+    assert recorded(pool, test_id) == {"attempts": [("alice", 1, "k1")], "responses": 3, "histogram": [(1, 1)]}
+    assert queue.stats()["pending"] == 0
+
+
+def test_same_key_submitted_again_after_delivery(pool, queue, test_id):
+    queue.submit("k1", test_id, "alice", 1, 3, RESPONSES)
+    drain(queue)
+    queue.submit("k1", test_id, "alice", 1, 3, RESPONSES)
+    drain(queue)
+    assert recorded(pool, test_id)["attempts"] == [("alice", 1, "k1")]
+
+
+def test_same_student_under_a_new_key_keeps_the_first_attempt(pool, queue, test_id):
+    queue.submit("k1", test_id, "alice", 1, 3, RESPONSES)
+    queue.submit("k2", test_id, "alice", 3, 3, RESPONSES)
+    drain(queue)
+    queue.submit("k3", test_id, "alice", 2, 3, RESPONSES)
+    drain(queue)
+    assert recorded(pool, test_id) == {"attempts": [("alice", 1, "k1")], "responses": 3, "histogram": [(1, 1)]}
+    assert queue.stats()["pending"] == 0
+
+
+def test_database_outage_backs_off_without_parking(queue, test_id, tmp_path):
+    queue.submit("k1", test_id, "alice", 1, 3, RESPONSES)
+    # Connecting fails, as it does while the server is down
+    queue._pool = ConnectionPool(size=1, timeout=0.1, connect=sqlite_adapter.connect,
+                                 database=str(tmp_path / "missing" / "quiz.sqlite3"))
+    for _ in range(MAX_DELIVERY_ATTEMPTS + 5):
+        assert queue.drain_once() == 0
+    assert queue.stats()["pending"] == 1
+    assert queue._db.execute("SELECT deliveries FROM pending").fetchall() == [(0,)]
+
+
+def test_exhausted_pool_backs_off_without_parking(pool, tmp_path, test_id):
+    busy = ConnectionPool(size=1, timeout=0.05, connect=sqlite_adapter.connect, database=str(tmp_path / "quiz.sqlite3"))
+    queue = SubmissionQueue(busy, str(tmp_path / "busy.db"), retry_delay=0)
+    queue.submit("k1", test_id, "alice", 1, 3, RESPONSES)
+    with busy.connection():
+        for _ in range(MAX_DELIVERY_ATTEMPTS + 5):
+            assert queue.drain_once() == 0
+    assert queue.stats()["parked"] == 0
+    drain(queue)
+    assert recorded(pool, test_id)["attempts"] == [("alice", 1, "k1")]
+    queue._db.close()
+    busy.close()
+
+
+def test_rejected_submission_is_parked_and_can_be_requeued(pool, queue, test_id):
+    queue.submit("good", test_id, "alice", 1, 3, RESPONSES)
+    # No such test: the database rejects this row, but not the rest of the batch
+    queue.submit("bad", test_id + 100, "bob", 1, 3, RESPONSES)
+    for _ in range(MAX_DELIVERY_ATTEMPTS):
+        queue.drain_once()
+    assert recorded(pool, test_id)["attempts"] == [("alice", 1, "good")]
+    assert queue.stats()["parked"] == 1
+    [(key, _, student, deliveries, error)] = queue.parked()
+    assert (key, student, deliveries) == ("bad", "bob", MAX_DELIVERY_ATTEMPTS)
+    assert error
+
+    # Parked rows are no longer retried until requeued
+    assert queue.drain_once() == 0
+    assert queue.requeue_parked(["unknown"]) == 0
+    assert queue.requeue_parked() == 1
+    assert queue.stats() == {"pending": 1, "parked": 0, "delivered": 1, "batches": MAX_DELIVERY_ATTEMPTS}